@@ -55,6 +55,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "webapp.middleware.CloudFrontSignedCookieMiddleware",
 ]
 
 ROOT_URLCONF = "mykytaso_app.urls"
@@ -76,6 +77,15 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "mykytaso_app.wsgi.application"
+ASGI_APPLICATION = "mykytaso_app.asgi.application"
+
+# Serve the post list and post detail with async views, see README "ASGI Deployment"
+ASYNC_READ_VIEWS = os.getenv("ASYNC_READ_VIEWS", "False") == "True"
+
+# Number of post cards rendered at once on the homepage
+POSTS_PER_PAGE = int(os.getenv("POSTS_PER_PAGE", 12))
+# Number of comments loaded at once below a post
+COMMENTS_PER_PAGE = int(os.getenv("COMMENTS_PER_PAGE", 20))
 
 DATABASES = {
     "default": {
@@ -121,16 +131,30 @@ STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"  # for production
 # STATICFILES_DIRS = [BASE_DIR / "staticfiles"]  # local development
 
+# Anonymous pages pre-rendered by `manage.py export_static_pages`
+STATIC_EXPORT_ROOT = BASE_DIR / "export"
+
 # MEDIA_URL = "/media/"
 # MEDIA_ROOT = BASE_DIR / "media"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 
+# Cache (shared between workers in production, e.g. RedisCache)
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "DJANGO_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("DJANGO_CACHE_LOCATION", ""),
+    }
+}
+
+
 # S3 Bucket for media files
 STORAGES = {
     "default": {
-        "BACKEND": "storages.backends.s3.S3Storage",
+        "BACKEND": "webapp.helpers.storage.CachedSignedURLS3Storage",
     },
     "staticfiles": {
         "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
@@ -142,13 +166,68 @@ AWS_S3_SECRET_ACCESS_KEY = os.getenv("AWS_S3_SECRET_ACCESS_KEY")
 AWS_STORAGE_BUCKET_NAME = os.getenv("AWS_STORAGE_BUCKET_NAME")
 AWS_S3_REGION_NAME = os.getenv("AWS_S3_REGION_NAME")
 
+# Media files are named after their content, see `content_hash_path`, so a
+# name never changes its content and browsers and CloudFront can keep it forever
+AWS_S3_OBJECT_PARAMETERS = {"CacheControl": "public, max-age=31536000, immutable"}
+
+# Images are uploaded by the browser straight to the bucket with a presigned POST,
+# which is valid for DIRECT_UPLOAD_EXPIRE seconds
+DIRECT_UPLOAD_MAX_SIZE = int(os.getenv("DIRECT_UPLOAD_MAX_SIZE", 20 * 1024 * 1024))
+DIRECT_UPLOAD_EXPIRE = int(os.getenv("DIRECT_UPLOAD_EXPIRE", 15 * 60))
+
+# Large block images can be uploaded in chunks of UPLOAD_CHUNK_SIZE bytes, which
+# can be resumed after a failure. On S3 chunks are at least 5 MB multipart parts.
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))
+RESUMABLE_UPLOAD_MAX_SIZE = int(
+    os.getenv("RESUMABLE_UPLOAD_MAX_SIZE", 200 * 1024 * 1024)
+)
+
+# Images of a gallery block are stored on this many threads at once
+GALLERY_UPLOAD_WORKERS = int(os.getenv("GALLERY_UPLOAD_WORKERS", 4))
+
 # AWS Cloud Front settings
 AWS_S3_CUSTOM_DOMAIN = os.getenv("AWS_S3_CUSTOM_DOMAIN")
 AWS_QUERYSTRING_EXPIRE = int(os.getenv("AWS_QUERYSTRING_EXPIRE"))
 AWS_CLOUDFRONT_KEY_ID = os.getenv("AWS_CLOUDFRONT_KEY_ID")
 AWS_CLOUDFRONT_KEY = os.getenv("AWS_CLOUDFRONT_KEY")
 
+# Authorize media with CloudFront signed cookies instead of per-URL signatures.
+# The cookie domain must cover both the site and AWS_S3_CUSTOM_DOMAIN.
+AWS_CLOUDFRONT_SIGNED_COOKIES = (
+    os.getenv("AWS_CLOUDFRONT_SIGNED_COOKIES", "False") == "True"
+)
+AWS_CLOUDFRONT_COOKIE_DOMAIN = os.getenv("AWS_CLOUDFRONT_COOKIE_DOMAIN")
+AWS_QUERYSTRING_AUTH = not AWS_CLOUDFRONT_SIGNED_COOKIES
+
+# Signed media URLs are reused until this many seconds before they expire.
+# It must cover the lifetime of cached pages (twice their timeout, stale included).
+SIGNED_URL_REFRESH_MARGIN = int(
+    os.getenv("SIGNED_URL_REFRESH_MARGIN", AWS_QUERYSTRING_EXPIRE // 2)
+)
+
+# Cached post fragments contain signed media URLs, so they must expire before them.
+# Readers may revalidate a page for what is left of the margin after two page
+# cache timeouts, so conditional GET is disabled when that is not positive.
+POST_FRAGMENT_CACHE_TIMEOUT = int(
+    os.getenv("POST_FRAGMENT_CACHE_TIMEOUT", AWS_QUERYSTRING_EXPIRE // 8)
+)
+ANONYMOUS_PAGE_CACHE_TIMEOUT = int(
+    os.getenv("ANONYMOUS_PAGE_CACHE_TIMEOUT", AWS_QUERYSTRING_EXPIRE // 8)
+)
+
 
 # Telegram Bot configuration
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+# Comments and new users are sent as one summary per window (in seconds), 0 disables it
+TELEGRAM_DIGEST_WINDOW = int(os.getenv("TELEGRAM_DIGEST_WINDOW", 0))
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+TELEGRAM_CONNECT_TIMEOUT = float(os.getenv("TELEGRAM_CONNECT_TIMEOUT", 3.05))
+TELEGRAM_READ_TIMEOUT = float(os.getenv("TELEGRAM_READ_TIMEOUT", 10))
+# The circuit opens after this many consecutive failures and stays open for the timeout
+TELEGRAM_CIRCUIT_FAILURE_THRESHOLD = int(
+    os.getenv("TELEGRAM_CIRCUIT_FAILURE_THRESHOLD", 5)
+)
+TELEGRAM_CIRCUIT_RECOVERY_TIMEOUT = int(
+    os.getenv("TELEGRAM_CIRCUIT_RECOVERY_TIMEOUT", 60)
+)
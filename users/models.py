@@ -8,7 +8,7 @@ from django.dispatch import receiver
 from django.utils.timezone import now
 from django.utils.translation import gettext as _
 
-from webapp.helpers.telegram import send_telegram_message
+from webapp.models import TelegramNotification
 
 
 class UserManager(DjangoUserManager):
@@ -57,6 +57,8 @@ class User(AbstractUser):
 @receiver(post_save, sender=get_user_model())
 def new_user_created_telegram_notification(sender, instance, created, **kwargs):
     if created:
-        send_telegram_message(
-            f"<b>New User</b>\n⏱️{(now() - timedelta(hours=4)).strftime('%Y-%m-%d %H:%M:%S')}\n📧 {instance.email}"
+        TelegramNotification.objects.create(
+            kind=TelegramNotification.Kind.USER,
+            text=f"<b>New User</b>\n⏱️{(now() - timedelta(hours=4)).strftime('%Y-%m-%d %H:%M:%S')}\n📧 {instance.email}",
+            subject=instance.email,
         )
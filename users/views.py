@@ -2,6 +2,7 @@ from django.contrib.auth import login, get_user_model
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import PasswordChangeView
+from django.db import transaction
 from django.urls import reverse_lazy
 from django.views import generic
 
@@ -14,6 +15,7 @@ class RegisterView(generic.CreateView):
     template_name = "registration/register.html"
     success_url = reverse_lazy("users:user-detail")
 
+    @transaction.atomic
     def form_valid(self, form):
         response = super().form_valid(form)
         user = form.save()
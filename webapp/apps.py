@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class WebAppConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "webapp"
+
+    def ready(self):
+        from webapp import checks  # noqa: F401
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+PER_PROCESS_CACHE_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Cached pages and fragments are invalidated by bumping versions stored in
+    the cache, which only reaches every worker if the workers share the cache.
+    """
+    backend = settings.CACHES["default"]["BACKEND"]
+    if backend not in PER_PROCESS_CACHE_BACKENDS:
+        return []
+    return [
+        Error(
+            f"The default cache backend {backend} is not shared between workers, "
+            "so cached pages are only invalidated in the worker that handled a write.",
+            hint="Set DJANGO_CACHE_BACKEND to a shared cache, e.g. "
+            "django.core.cache.backends.redis.RedisCache.",
+            id="webapp.E001",
+        )
+    ]
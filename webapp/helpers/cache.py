@@ -0,0 +1,247 @@
+import asyncio
+import hashlib
+import time
+from typing import Awaitable, Callable, Iterable
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.http import HttpRequest, HttpResponse
+
+POSTS_VERSION_KEY = "webapp:posts:version"
+
+# How long a worker may hold the right to regenerate a stale page
+PAGE_REGENERATION_LOCK_TIMEOUT = 30
+
+# How long, and how often, a request polls for a page that another worker
+# renders for the first time, before it is answered with 503
+PAGE_RENDER_WAIT = 5
+PAGE_RENDER_POLL_INTERVAL = 0.05
+
+# Page cache responses whose body may be older than the current validators,
+# so they must not carry the ETag or Last-Modified of the current content
+UNVALIDATED_PAGE_CACHE_STATUSES = ("STALE", "WAIT")
+
+# Fragment name -> lookups that have to be prefetched to render it
+POST_FRAGMENTS = {
+    "post_tags": ("tags",),
+    "post_blocks": ("blocks", "blocks__gallery_images"),
+}
+
+
+def _post_version_key(post_id: int) -> str:
+    return f"webapp:post:{post_id}:version"
+
+
+def get_post_version(post_id: int) -> int:
+    """
+    Returns the cache version of the post, creating a new one if it is missing.
+    Versions are timestamps, so an evicted version never collides with an old one.
+    """
+    return cache.get_or_set(_post_version_key(post_id), time.time_ns, None)
+
+
+async def aget_post_version(post_id: int) -> int:
+    return await cache.aget_or_set(_post_version_key(post_id), time.time_ns, None)
+
+
+def bump_post_version(post_id: int) -> None:
+    """
+    Invalidates every cached fragment of the post.
+    """
+    cache.set(_post_version_key(post_id), time.time_ns(), None)
+
+
+def post_fragment_key(fragment_name: str, post_id: int, version: int) -> str:
+    """
+    Returns the key used by `{% cache ... fragment_name post.id post_version %}`.
+    """
+    return make_template_fragment_key(fragment_name, [post_id, version])
+
+
+def missing_post_fragments(post_id: int, version: int) -> list[str]:
+    """
+    Returns the names of the post fragments that are not cached yet.
+    """
+    keys = {
+        post_fragment_key(name, post_id, version): name for name in POST_FRAGMENTS
+    }
+    cached = cache.get_many(keys.keys())
+    return [name for key, name in keys.items() if key not in cached]
+
+
+async def amissing_post_fragments(post_id: int, version: int) -> list[str]:
+    keys = {
+        post_fragment_key(name, post_id, version): name for name in POST_FRAGMENTS
+    }
+    cached = await cache.aget_many(keys.keys())
+    return [name for key, name in keys.items() if key not in cached]
+
+
+def get_posts_version() -> int:
+    """
+    Returns the global version of the post list, creating a new one if it is missing.
+    """
+    return cache.get_or_set(POSTS_VERSION_KEY, time.time_ns, None)
+
+
+async def aget_posts_version() -> int:
+    return await cache.aget_or_set(POSTS_VERSION_KEY, time.time_ns, None)
+
+
+def bump_posts_version() -> None:
+    """
+    Invalidates every cached page that lists posts.
+    """
+    cache.set(POSTS_VERSION_KEY, time.time_ns(), None)
+
+
+def _page_cache_key(request: HttpRequest, query_params: Iterable[str]) -> str:
+    """
+    Keys a page on its path and the query parameters the view reads, so other
+    query strings, like `?utm_source=...`, share the cached page.
+    """
+    query = urlencode(
+        [
+            (name, value)
+            for name in sorted(query_params)
+            for value in request.GET.getlist(name)
+        ]
+    )
+    path = f"{request.path}?{query}" if query else request.path
+    path_hash = hashlib.md5(path.encode()).hexdigest()
+    return f"webapp:page:{path_hash}"
+
+
+def _cached_page_response(entry: dict, status: str) -> HttpResponse:
+    response = HttpResponse(entry["content"], content_type=entry["content_type"])
+    response["X-Page-Cache"] = status
+    return response
+
+
+def _page_render_timeout_response() -> HttpResponse:
+    response = HttpResponse("The page is being generated, please retry.", status=503)
+    response["Retry-After"] = "1"
+    response["X-Page-Cache"] = "WAIT"
+    return response
+
+
+def _is_fresh_page(entry: dict | None, posts_version: int) -> bool:
+    return (
+        entry is not None
+        and entry["version"] == posts_version
+        and entry["fresh_until"] > time.time()
+    )
+
+
+def _page_cache_entry(
+    response: HttpResponse, posts_version: int, timeout: int
+) -> dict:
+    return {
+        "content": response.content,
+        "content_type": response["Content-Type"],
+        "version": posts_version,
+        "fresh_until": time.time() + timeout,
+    }
+
+
+def serve_cached_page(
+    request: HttpRequest,
+    render: Callable[[], HttpResponse],
+    timeout: int,
+    query_params: Iterable[str] = (),
+) -> HttpResponse:
+    """
+    Serves a full-page response cached against the global posts version.
+
+    A page is fresh for `timeout` seconds while the posts version is unchanged.
+    A stale page is served to everyone except the single worker that takes
+    the regeneration lock, so a cache miss during a traffic spike renders the
+    page once instead of once per request. When there is no stale page yet,
+    the other requests wait for the page being rendered, and get a 503 with
+    `Retry-After` if it takes longer than `PAGE_RENDER_WAIT` seconds.
+    Only `query_params` are part of the cache key.
+    """
+    key = _page_cache_key(request, query_params)
+    lock_key = f"{key}:lock"
+    posts_version = get_posts_version()
+
+    entry = cache.get(key)
+    if _is_fresh_page(entry, posts_version):
+        return _cached_page_response(entry, "HIT")
+
+    locked = cache.add(lock_key, True, PAGE_REGENERATION_LOCK_TIMEOUT)
+    if not locked:
+        if entry is not None:
+            return _cached_page_response(entry, "STALE")
+
+        deadline = time.monotonic() + PAGE_RENDER_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(PAGE_RENDER_POLL_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return _cached_page_response(entry, "HIT")
+        return _page_render_timeout_response()
+
+    try:
+        response = render()
+        if hasattr(response, "render"):
+            response.render()
+
+        if response.status_code == 200:
+            # Stale pages are kept for one more period to be served during regeneration
+            cache.set(
+                key, _page_cache_entry(response, posts_version, timeout), timeout * 2
+            )
+            response["X-Page-Cache"] = "MISS"
+    finally:
+        cache.delete(lock_key)
+
+    return response
+
+
+async def aserve_cached_page(
+    request: HttpRequest,
+    render: Callable[[], Awaitable[HttpResponse]],
+    timeout: int,
+    query_params: Iterable[str] = (),
+) -> HttpResponse:
+    """
+    Async counterpart of `serve_cached_page`, sharing its cache entries and lock.
+    """
+    key = _page_cache_key(request, query_params)
+    lock_key = f"{key}:lock"
+    posts_version = await aget_posts_version()
+
+    entry = await cache.aget(key)
+    if _is_fresh_page(entry, posts_version):
+        return _cached_page_response(entry, "HIT")
+
+    locked = await cache.aadd(lock_key, True, PAGE_REGENERATION_LOCK_TIMEOUT)
+    if not locked:
+        if entry is not None:
+            return _cached_page_response(entry, "STALE")
+
+        deadline = time.monotonic() + PAGE_RENDER_WAIT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(PAGE_RENDER_POLL_INTERVAL)
+            entry = await cache.aget(key)
+            if entry is not None:
+                return _cached_page_response(entry, "HIT")
+        return _page_render_timeout_response()
+
+    try:
+        response = await render()
+        if hasattr(response, "render"):
+            await sync_to_async(response.render)()
+
+        if response.status_code == 200:
+            await cache.aset(
+                key, _page_cache_entry(response, posts_version, timeout), timeout * 2
+            )
+            response["X-Page-Cache"] = "MISS"
+    finally:
+        await cache.adelete(lock_key)
+
+    return response
@@ -0,0 +1,273 @@
+import base64
+import io
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import Storage, storages
+from django.db import models
+from django.db.models.fields.files import FieldFile
+from PIL import Image as PILImage
+from PIL import ImageOps
+
+# Widths of the derivatives generated for every uploaded image
+DERIVATIVE_WIDTHS = (320, 640, 960, 1280, 1920)
+
+# Derivative format -> Pillow save options, best compression first
+DERIVATIVE_FORMATS = {
+    "avif": {"quality": 60},
+    "webp": {"quality": 80, "method": 4},
+}
+
+# Longest side of the blurred placeholder shown while an image loads
+PLACEHOLDER_SIZE = 16
+
+# Attributes stored next to a `ResponsiveImageField` as `<name>_<attribute>`
+IMAGE_METADATA_DEFAULTS = {
+    "width": None,
+    "height": None,
+    "color": "",
+    "placeholder": "",
+}
+
+# `<original name>.w<width>.<format>`, stored next to the original
+DERIVATIVE_NAME_RE = re.compile(
+    rf"^(?P<original>.+)\.w\d+\.(?:{'|'.join(DERIVATIVE_FORMATS)})$"
+)
+
+
+def derivative_formats() -> list[str]:
+    """
+    Returns the derivative formats the installed Pillow can write.
+    """
+    PILImage.init()
+    return [fmt for fmt in DERIVATIVE_FORMATS if fmt.upper() in PILImage.SAVE]
+
+
+def original_name(name: str) -> str:
+    """
+    Returns the name of the original image of a derivative, or `name` itself.
+    """
+    match = DERIVATIVE_NAME_RE.match(name)
+    return match["original"] if match else name
+
+
+def open_image(content) -> PILImage.Image:
+    """
+    Loads an image upright, as EXIF orientation is dropped from derivatives.
+    """
+    content.seek(0)
+    with PILImage.open(content) as image:
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    content.seek(0)
+    return image
+
+
+def save_derivatives(
+    storage: Storage, name: str, image: PILImage.Image, reuse: bool = False
+) -> list[dict]:
+    """
+    Saves width-stepped derivatives of the image next to `name` and returns
+    them as `{"name", "width", "format"}` dicts, narrowest first. Images are
+    never scaled up, so a narrow image only gets a derivative of its own width.
+    With `reuse`, derivatives that are already stored are not generated again.
+    """
+    image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+    widths = [width for width in DERIVATIVE_WIDTHS if width < image.width]
+    if image.width <= DERIVATIVE_WIDTHS[-1]:
+        widths.append(image.width)
+
+    variants = []
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        resized = None
+        for fmt in derivative_formats():
+            derivative_name = f"{name}.w{width}.{fmt}"
+            if not (reuse and storage.exists(derivative_name)):
+                if resized is None:
+                    resized = image.resize((width, height), PILImage.Resampling.LANCZOS)
+                buffer = io.BytesIO()
+                resized.save(buffer, fmt.upper(), **DERIVATIVE_FORMATS[fmt])
+                derivative_name = storage.save(
+                    derivative_name, ContentFile(buffer.getvalue())
+                )
+            variants.append({"name": derivative_name, "width": width, "format": fmt})
+    return variants
+
+
+def describe_image(image: PILImage.Image) -> dict:
+    """
+    Returns the dimensions of the image, its average color, and a tiny WebP
+    version as a data URI, which is small enough to be inlined in the page.
+    """
+    image = image.convert("RGB")
+    red, green, blue = image.resize((1, 1), PILImage.Resampling.BOX).getpixel((0, 0))
+
+    placeholder = image.copy()
+    placeholder.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    buffer = io.BytesIO()
+    placeholder.save(buffer, "WEBP", quality=40)
+
+    return {
+        "width": image.width,
+        "height": image.height,
+        "color": f"#{red:02x}{green:02x}{blue:02x}",
+        "placeholder": "data:image/webp;base64,"
+        + base64.b64encode(buffer.getvalue()).decode(),
+    }
+
+
+def image_variants(file: FieldFile) -> list[dict]:
+    """
+    Returns the derivatives of a `ResponsiveImageField` file.
+    """
+    if not file:
+        return []
+    return getattr(file.instance, file.field.variants_attname, None) or []
+
+
+def image_metadata(file: FieldFile) -> dict:
+    """
+    Returns the stored metadata of a `ResponsiveImageField` file, without
+    reading the file from storage.
+    """
+    if not file:
+        return IMAGE_METADATA_DEFAULTS
+    return {
+        attribute: getattr(file.instance, f"{file.field.attname}_{attribute}", default)
+        for attribute, default in IMAGE_METADATA_DEFAULTS.items()
+    }
+
+
+class StoredImage(File):
+    """
+    An image that is already stored under its final name, e.g. a claimed direct
+    upload, with the dimensions read from its header. A `ResponsiveImageField`
+    saves it without reading or storing it again.
+    """
+
+    def __init__(self, name: str, width: int, height: int):
+        super().__init__(None, name)
+        self.width = width
+        self.height = height
+
+
+def unqueue_media_deletion(names: list[str]) -> None:
+    """
+    Takes the files of a deleted image that are uploaded again, and their
+    derivatives, off the deletion queue before they are reused. The rows locked
+    by a running `delete_pending_media` batch are waited for, so a file checked
+    for afterwards is either kept or already deleted and stored again.
+    """
+    lookup = models.Q()
+    for name in names:
+        lookup |= models.Q(name=name) | models.Q(name__startswith=f"{name}.w")
+    apps.get_model("webapp", "PendingMediaDeletion").objects.filter(lookup).delete()
+
+
+def store_images(instances: list[models.Model], field_name: str, workers: int) -> None:
+    """
+    Stores the new uploads of the `ResponsiveImageField` `field_name` of unsaved
+    model instances, with their metadata, on a bounded pool of threads.
+    Every thread saves with a default storage of its own, as the boto3 resources
+    of S3Storage are not thread-safe.
+    The files are then committed, so a `bulk_create` of the instances only
+    inserts their rows.
+    """
+    if not instances:
+        return
+    field = instances[0]._meta.get_field(field_name)
+    files = [getattr(instance, field.attname) for instance in instances]
+    names = [
+        field.generate_filename(instance, file.name)
+        for instance, file in zip(instances, files)
+    ]
+    # The threads do not query the database, which would open a connection each
+    unqueue_media_deletion(names)
+    local = threading.local()
+
+    def store_image(instance, file, name):
+        if not hasattr(local, "storage"):
+            local.storage = storages.create_storage(storages.backends["default"])
+        file.storage = local.storage
+        try:
+            field.store_upload(instance, file, name)
+        finally:
+            file.storage = field.storage
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Consuming the results re-raises the first error of a worker
+        list(executor.map(store_image, instances, files, names))
+
+
+class ResponsiveImageField(models.ImageField):
+    """
+    ImageField that processes a new upload once, when the model is saved.
+    It stores the dimensions, average color and placeholder of the image in
+    the `<name>_width`, `_height`, `_color` and `_placeholder` fields.
+    The WebP/AVIF derivatives, recorded in the `<name>_variants` JSON field,
+    take seconds to encode, so they are generated after the request by
+    `manage.py generate_image_variants` and the original is rendered until then.
+    An upload whose content-derived name is already stored is not stored again.
+    """
+
+    @property
+    def variants_attname(self) -> str:
+        return f"{self.attname}_variants"
+
+    def store_image(self, model_instance, image: PILImage.Image | None) -> None:
+        """
+        Sets the metadata of a new file on the model instance and clears its
+        derivatives, so `generate_image_variants` generates them.
+        """
+        metadata = IMAGE_METADATA_DEFAULTS if image is None else describe_image(image)
+
+        setattr(model_instance, self.variants_attname, [])
+        for attribute, value in metadata.items():
+            setattr(model_instance, f"{self.attname}_{attribute}", value)
+
+    def store_upload(self, model_instance, file: FieldFile, name: str) -> None:
+        """
+        Stores a new upload under its content-derived `name`, which must have
+        been taken off the deletion queue with `unqueue_media_deletion`.
+        """
+        # Read from the upload, so the stored original is not downloaded again
+        try:
+            image = open_image(file.file)
+        except OSError:
+            # Not an image Pillow can read, so only the original is stored
+            image = None
+
+        # `upload_to` names files after their content, so an existing file
+        # with the same name already holds this upload. Two identical uploads
+        # may both miss it and both be saved, which is harmless: the storage
+        # then writes the same content once more, or under a second name.
+        if not file.storage.exists(name):
+            name = file.storage.save(name, file.file, max_length=self.max_length)
+        file.name = name
+        file._committed = True
+
+        self.store_image(model_instance, image)
+
+    def pre_save(self, model_instance, add):
+        file = getattr(model_instance, self.attname)
+        if file and not file._committed and isinstance(file.file, StoredImage):
+            # Its color and placeholder are left to `generate_image_variants`
+            file._committed = True
+            self.store_image(model_instance, None)
+            setattr(model_instance, f"{self.attname}_width", file.file.width)
+            setattr(model_instance, f"{self.attname}_height", file.file.height)
+            return file
+
+        if file and not file._committed:
+            name = self.generate_filename(model_instance, file.name)
+            unqueue_media_deletion([name])
+            self.store_upload(model_instance, file, name)
+            return file
+
+        if not file:
+            self.store_image(model_instance, None)
+        return super().pre_save(model_instance, add)
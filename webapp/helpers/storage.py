@@ -0,0 +1,487 @@
+import asyncio
+import base64
+import hashlib
+import io
+import pathlib
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, NamedTuple
+
+from asgiref.sync import sync_to_async
+from botocore.exceptions import BotoCoreError, ClientError
+from django.conf import settings
+from django import forms
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import Storage
+from django.db.models.fields.files import FieldFile
+from PIL import ExifTags
+from PIL import Image as PILImage
+from storages.backends.s3 import S3Storage
+from storages.utils import clean_name
+
+from webapp.helpers.images import StoredImage, image_variants
+
+SIGNED_URL_MEMO_SIZE = 10_000
+
+# Maximum number of keys in one S3 DeleteObjects request, and in one listing page
+S3_DELETE_BATCH_SIZE = 1000
+
+# Direct uploads land here and are copied under `posts/` when they are saved
+# to a model, see `claim_direct_upload`
+DIRECT_UPLOAD_PREFIX = "uploads/"
+DIRECT_UPLOAD_NAME_RE = re.compile(
+    rf"^{DIRECT_UPLOAD_PREFIX}[0-9a-f]{{32}}(\.[a-z0-9]{{1,5}})?$"
+)
+
+# Bytes read from the start of a direct upload to validate it, which hold the
+# dimensions of common image formats even after large EXIF and ICC segments
+IMAGE_HEADER_SIZE = 256 * 1024
+
+# S3 rejects multipart upload parts smaller than this, except for the last one
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+def _cloudfront_b64encode(data: bytes) -> str:
+    """
+    Encodes data with the URL-safe base64 variant required by CloudFront.
+    """
+    return (
+        base64.b64encode(data)
+        .replace(b"+", b"-")
+        .replace(b"=", b"_")
+        .replace(b"/", b"~")
+        .decode()
+    )
+
+
+def _signed_url_cache_key(name: str) -> str:
+    return f"webapp:signed-url:{hashlib.md5(name.encode()).hexdigest()}"
+
+
+class SignedURLMemo:
+    """Thread-safe, size-bounded process-local memo of signed URLs."""
+
+    def __init__(self, max_size: int = SIGNED_URL_MEMO_SIZE):
+        self.max_size = max_size
+        self._urls = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name: str, now: float) -> str | None:
+        with self._lock:
+            entry = self._urls.get(name)
+            if entry is None:
+                return None
+            url, valid_until = entry
+            if valid_until <= now:
+                del self._urls[name]
+                return None
+            self._urls.move_to_end(name)
+            return url
+
+    def set(self, name: str, url: str, valid_until: float) -> None:
+        with self._lock:
+            self._urls[name] = (url, valid_until)
+            self._urls.move_to_end(name)
+            while len(self._urls) > self.max_size:
+                self._urls.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._urls.clear()
+
+
+class CachedSignedURLS3Storage(S3Storage):
+    """
+    S3 storage that memoizes signed media URLs per object name until shortly
+    before they expire, first in process memory and then in the shared cache.
+    """
+
+    memo = SignedURLMemo()
+
+    def url(self, name, parameters=None, expire=None, http_method=None):
+        if not self.querystring_auth or parameters or expire or http_method:
+            return super().url(name, parameters, expire, http_method)
+
+        now = time.time()
+        url = self.memo.get(name, now)
+        if url is not None:
+            return url
+
+        cache_key = _signed_url_cache_key(name)
+        entry = cache.get(cache_key)
+        if entry is not None and entry[1] > now:
+            self.memo.set(name, *entry)
+            return entry[0]
+
+        url = super().url(name)
+        valid_until = now + self.querystring_expire - settings.SIGNED_URL_REFRESH_MARGIN
+        if valid_until > now:
+            self.memo.set(name, url, valid_until)
+            cache.set(cache_key, (url, valid_until), int(valid_until - now))
+        return url
+
+    async def aurl(self, name: str) -> str:
+        """
+        Async counterpart of `url`. Memoized URLs are returned without blocking,
+        and a URL that has to be signed is signed in a worker thread.
+        """
+        if not self.querystring_auth:
+            return self.url(name)
+
+        now = time.time()
+        url = self.memo.get(name, now)
+        if url is not None:
+            return url
+
+        entry = await cache.aget(_signed_url_cache_key(name))
+        if entry is not None and entry[1] > now:
+            self.memo.set(name, *entry)
+            return entry[0]
+
+        return await sync_to_async(self.url, thread_sensitive=False)(name)
+
+    def signed_cookies(self, prefix: str) -> tuple[dict[str, str], float]:
+        """
+        Returns CloudFront signed cookies with a custom policy that authorizes
+        every object under `prefix`, and the time until they can be reused.
+        The cookies are shared by all visitors, so they are signed once per period.
+        """
+        now = time.time()
+        cache_key = f"webapp:cloudfront-signed-cookies:{prefix}"
+        entry = cache.get(cache_key)
+        if entry is not None and entry[1] > now:
+            return entry
+
+        resource = f"{self.url_protocol}//{self.custom_domain}/{prefix}*"
+        expires_at = datetime.fromtimestamp(now + self.querystring_expire, timezone.utc)
+        policy = self.cloudfront_signer.build_policy(resource, expires_at).encode()
+
+        cookies = {
+            "CloudFront-Policy": _cloudfront_b64encode(policy),
+            "CloudFront-Signature": _cloudfront_b64encode(
+                self.cloudfront_signer.rsa_signer(policy)
+            ),
+            "CloudFront-Key-Pair-Id": self.cloudfront_signer.key_id,
+        }
+        valid_until = now + self.querystring_expire - settings.SIGNED_URL_REFRESH_MARGIN
+        if valid_until > now:
+            cache.set(cache_key, (cookies, valid_until), int(valid_until - now))
+        return cookies, valid_until
+
+
+async def aprefetch_media_urls(files: Iterable[FieldFile]) -> None:
+    """
+    Generates the URLs of `files` and their derivatives concurrently, so a
+    template rendered afterwards reads them from the process-local memo
+    without blocking.
+    """
+    await asyncio.gather(
+        *(
+            file.storage.aurl(name)
+            for file in files
+            if file and hasattr(file.storage, "aurl")
+            for name in [
+                file.name,
+                *(variant["name"] for variant in image_variants(file)),
+            ]
+        )
+    )
+
+
+def delete_files(storage: Storage, names: list[str]) -> dict[str, str]:
+    """
+    Deletes files from storage and returns the error of every file that could
+    not be deleted. S3 files are deleted with one DeleteObjects request per
+    `S3_DELETE_BATCH_SIZE` keys, files of other storages one at a time.
+    """
+    errors = {}
+    if not isinstance(storage, S3Storage):
+        for name in names:
+            try:
+                storage.delete(name)
+            except OSError as error:
+                errors[name] = str(error)
+        return errors
+
+    for start in range(0, len(names), S3_DELETE_BATCH_SIZE):
+        batch = names[start : start + S3_DELETE_BATCH_SIZE]
+        keys = {storage._normalize_name(clean_name(name)): name for name in batch}
+        try:
+            # Quiet mode only reports the keys that could not be deleted
+            response = storage.bucket.delete_objects(
+                Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True}
+            )
+        except (BotoCoreError, ClientError) as error:
+            errors.update(dict.fromkeys(batch, str(error)))
+            continue
+
+        for error in response.get("Errors", []):
+            errors[keys[error["Key"]]] = f"{error['Code']}: {error['Message']}"
+    return errors
+
+
+class StoredFile(NamedTuple):
+    name: str
+    size: int
+    modified_at: datetime
+
+
+def iter_file_pages(
+    storage: Storage, prefix: str, page_size: int = S3_DELETE_BATCH_SIZE
+) -> Iterator[list[StoredFile]]:
+    """
+    Lists the files under `prefix` in pages, so memory use does not grow with
+    the number of files. S3 is listed with ListObjectsV2 pages, other storages
+    are walked with `listdir`.
+    """
+    if isinstance(storage, S3Storage):
+        location = storage._normalize_name(clean_name(""))
+        paginator = storage.connection.meta.client.get_paginator("list_objects_v2")
+        for response in paginator.paginate(
+            Bucket=storage.bucket_name,
+            Prefix=storage._normalize_name(clean_name(prefix)),
+            PaginationConfig={"PageSize": page_size},
+        ):
+            page = [
+                StoredFile(
+                    obj["Key"][len(location) :].lstrip("/"),
+                    obj["Size"],
+                    obj["LastModified"],
+                )
+                for obj in response.get("Contents", [])
+            ]
+            if page:
+                yield page
+        return
+
+    page = []
+    directories = [prefix.rstrip("/")]
+    while directories:
+        directory = directories.pop()
+        if not storage.exists(directory):
+            continue
+        subdirectories, files = storage.listdir(directory)
+        directories += [f"{directory}/{name}" for name in subdirectories]
+        for name in files:
+            name = f"{directory}/{name}" if directory else name
+            page.append(
+                StoredFile(name, storage.size(name), storage.get_modified_time(name))
+            )
+            if len(page) == page_size:
+                yield page
+                page = []
+    if page:
+        yield page
+
+
+def direct_upload_name(filename: str, token: str = None) -> str:
+    """
+    Returns a new name under `DIRECT_UPLOAD_PREFIX` for an upload of `filename`,
+    made of a random (or the given) 32-digit hex token and the file extension.
+    """
+    name = f"{DIRECT_UPLOAD_PREFIX}{token or uuid.uuid4().hex}"
+    suffix = pathlib.Path(filename).suffix.lower()
+    if DIRECT_UPLOAD_NAME_RE.match(name + suffix):
+        name += suffix
+    return name
+
+
+def presigned_upload(storage: S3Storage, filename: str, content_type: str) -> dict:
+    """
+    Returns the URL and form fields of a presigned POST, which lets the browser
+    upload one image straight to the bucket, and the name it will be stored as.
+    """
+    name = direct_upload_name(filename)
+    presigned_post = storage.connection.meta.client.generate_presigned_post(
+        storage.bucket_name,
+        storage._normalize_name(name),
+        Fields={"Content-Type": content_type},
+        Conditions=[
+            {"Content-Type": content_type},
+            ["content-length-range", 1, settings.DIRECT_UPLOAD_MAX_SIZE],
+        ],
+        ExpiresIn=settings.DIRECT_UPLOAD_EXPIRE,
+    )
+    return {**presigned_post, "name": name}
+
+
+def read_file_header(storage: Storage, name: str, size: int) -> bytes:
+    """
+    Returns the first `size` bytes of a stored file. On S3 only these bytes
+    are downloaded, with a ranged GET.
+    """
+    if isinstance(storage, S3Storage):
+        response = storage.connection.meta.client.get_object(
+            Bucket=storage.bucket_name,
+            Key=storage._normalize_name(clean_name(name)),
+            Range=f"bytes=0-{size - 1}",
+        )
+        return response["Body"].read()
+    with storage.open(name) as file:
+        return file.read(size)
+
+
+def copy_file(storage: Storage, source: str, name: str) -> str:
+    """
+    Copies a stored file to `name` and returns the name it was stored as.
+    S3 copies the object itself, so it never passes through the app server.
+    """
+    if not isinstance(storage, S3Storage):
+        with storage.open(source) as file:
+            return storage.save(name, file)
+
+    name = storage.get_available_name(name)
+    storage.connection.meta.client.copy_object(
+        Bucket=storage.bucket_name,
+        Key=storage._normalize_name(clean_name(name)),
+        CopySource={
+            "Bucket": storage.bucket_name,
+            "Key": storage._normalize_name(clean_name(source)),
+        },
+        # Stored with the parameters of a saved file, e.g. its Cache-Control
+        MetadataDirective="REPLACE",
+        **storage._get_write_parameters(name),
+    )
+    return name
+
+
+def claim_direct_upload(
+    storage: Storage, name: str, max_size: int = None
+) -> StoredImage:
+    """
+    Copies a finished direct upload under `posts/` and returns it as a
+    `StoredImage`, which a `ResponsiveImageField` saves without reading it.
+    Only the header of the upload is read, to check that it is an image and
+    get its dimensions. The copy keeps the random name of the upload instead
+    of a content hash, which never refers to different content either.
+    Raises ValidationError for names that were not issued by
+    `direct_upload_name`, missing uploads, files larger than `max_size`
+    (`DIRECT_UPLOAD_MAX_SIZE` by default), and files that are not images.
+    """
+    if not DIRECT_UPLOAD_NAME_RE.match(name) or not storage.exists(name):
+        raise ValidationError("The upload does not exist.")
+    if storage.size(name) > (max_size or settings.DIRECT_UPLOAD_MAX_SIZE):
+        raise ValidationError("The upload is too large.")
+
+    header = read_file_header(storage, name, IMAGE_HEADER_SIZE)
+    try:
+        with PILImage.open(io.BytesIO(header)) as image:
+            width, height = image.size
+            # Dimensions are stored upright, as derivatives drop EXIF orientation
+            if image.getexif().get(ExifTags.Base.Orientation) in (5, 6, 7, 8):
+                width, height = height, width
+    except (OSError, PILImage.DecompressionBombError) as error:
+        raise ValidationError(
+            forms.ImageField.default_error_messages["invalid_image"],
+            code="invalid_image",
+        ) from error
+
+    stored_name = copy_file(
+        storage, name, f"posts/{name.removeprefix(DIRECT_UPLOAD_PREFIX)}"
+    )
+    return StoredImage(stored_name, width, height)
+
+
+def upload_chunk_size(storage: Storage) -> int:
+    """
+    Returns the size of the chunks of a resumable upload to `storage`.
+    """
+    if isinstance(storage, S3Storage):
+        return max(settings.UPLOAD_CHUNK_SIZE, S3_MIN_PART_SIZE)
+    return settings.UPLOAD_CHUNK_SIZE
+
+
+def start_multipart_upload(storage: Storage, name: str, content_type: str) -> str:
+    """
+    Starts a multipart upload of `name` and returns its S3 upload ID. Other
+    storages keep every part in a file of its own and get an empty ID.
+    """
+    if not isinstance(storage, S3Storage):
+        return ""
+    response = storage.connection.meta.client.create_multipart_upload(
+        Bucket=storage.bucket_name,
+        Key=storage._normalize_name(clean_name(name)),
+        ContentType=content_type or "application/octet-stream",
+    )
+    return response["UploadId"]
+
+
+def upload_part(
+    storage: Storage, name: str, upload_id: str, number: int, content: bytes
+) -> dict:
+    """
+    Stores part `number` of a multipart upload and returns what
+    `complete_multipart_upload` needs to find it. Uploading a part again
+    replaces it.
+    """
+    if isinstance(storage, S3Storage):
+        response = storage.connection.meta.client.upload_part(
+            Bucket=storage.bucket_name,
+            Key=storage._normalize_name(clean_name(name)),
+            UploadId=upload_id,
+            PartNumber=number,
+            Body=content,
+        )
+        return {"PartNumber": number, "ETag": response["ETag"]}
+
+    part_name = f"{name}.part{number:05d}"
+    if storage.exists(part_name):
+        storage.delete(part_name)
+    return {"PartNumber": number, "name": storage.save(part_name, ContentFile(content))}
+
+
+def complete_multipart_upload(
+    storage: Storage, name: str, upload_id: str, parts: list[dict]
+) -> None:
+    """
+    Joins the parts of a multipart upload into `name`. S3 joins them in the
+    bucket, parts of other storages are joined through a temporary file, so
+    memory use does not grow with the size of the upload.
+    """
+    parts = sorted(parts, key=lambda part: part["PartNumber"])
+    if isinstance(storage, S3Storage):
+        storage.connection.meta.client.complete_multipart_upload(
+            Bucket=storage.bucket_name,
+            Key=storage._normalize_name(clean_name(name)),
+            UploadId=upload_id,
+            MultipartUpload={
+                "Parts": [
+                    {"PartNumber": part["PartNumber"], "ETag": part["ETag"]}
+                    for part in parts
+                ]
+            },
+        )
+        return
+
+    with tempfile.TemporaryFile() as joined:
+        for part in parts:
+            with storage.open(part["name"]) as part_file:
+                for chunk in part_file.chunks():
+                    joined.write(chunk)
+        joined.seek(0)
+        storage.save(name, File(joined, name))
+    delete_files(storage, [part["name"] for part in parts])
+
+
+def abort_multipart_upload(
+    storage: Storage, name: str, upload_id: str, parts: list[dict]
+) -> None:
+    """
+    Discards the parts of an unfinished multipart upload.
+    """
+    if isinstance(storage, S3Storage):
+        storage.connection.meta.client.abort_multipart_upload(
+            Bucket=storage.bucket_name,
+            Key=storage._normalize_name(clean_name(name)),
+            UploadId=upload_id,
+        )
+        return
+    delete_files(storage, [part["name"] for part in parts])
@@ -1,18 +1,146 @@
+import threading
+import time
+
 import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
 
-from mykytaso_app import settings
 
+class TelegramError(Exception):
+    pass
 
-def send_telegram_message(message: str) -> None:
-    url = f"https://api.telegram.org/bot{getattr(settings, 'TELEGRAM_BOT_TOKEN')}/sendMessage"
 
-    payload = {
-        "chat_id": getattr(settings, "TELEGRAM_CHAT_ID"),
-        "text": message,
-        "parse_mode": "HTML",
-    }
+class CircuitOpenError(TelegramError):
+    pass
+
+
+class TelegramTransport:
+    """
+    Sends messages to the Telegram Bot API over a pooled keep-alive session.
+
+    Every request is bounded by connect and read timeouts. After
+    `failure_threshold` consecutive failures the circuit opens and calls are
+    rejected without touching the network for `recovery_timeout` seconds,
+    after which a single trial request decides whether it closes again.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        chat_id: str,
+        base_url: str = "https://api.telegram.org",
+        connect_timeout: float = 3.05,
+        read_timeout: float = 10,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 60,
+        pool_size: int = 4,
+    ):
+        self.url = f"{base_url.rstrip('/')}/bot{token}/sendMessage"
+        self.chat_id = chat_id
+        self.timeout = (connect_timeout, read_timeout)
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._trial_in_progress = False
+        self._counters = {"sent": 0, "failed": 0, "rejected": 0, "latency": 0.0}
+
+    @property
+    def stats(self) -> dict:
+        """
+        Returns the counters of sent, failed and rejected messages,
+        and the total and average latency of the requests in seconds.
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats["circuit_open"] = self._opened_at is not None
+        requests_made = stats["sent"] + stats["failed"]
+        stats["average_latency"] = (
+            stats["latency"] / requests_made if requests_made else 0.0
+        )
+        return stats
+
+    def _before_request(self) -> None:
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if (
+                self._trial_in_progress
+                or time.monotonic() - self._opened_at < self.recovery_timeout
+            ):
+                self._counters["rejected"] += 1
+                raise CircuitOpenError("Telegram circuit is open.")
+            self._trial_in_progress = True
+
+    def _after_request(self, latency: float, succeeded: bool) -> None:
+        with self._lock:
+            self._counters["latency"] += latency
+            self._trial_in_progress = False
+            if succeeded:
+                self._counters["sent"] += 1
+                self._consecutive_failures = 0
+                self._opened_at = None
+                return
 
-    response = requests.post(url, data=payload)
+            self._counters["failed"] += 1
+            self._consecutive_failures += 1
+            if (
+                self._opened_at is not None
+                or self._consecutive_failures >= self.failure_threshold
+            ):
+                self._opened_at = time.monotonic()
 
-    if response.status_code != 200:
-        raise Exception(f"Error sending message: {response.text}")
\ No newline at end of file
+    def send_message(self, message: str) -> None:
+        self._before_request()
+
+        payload = {
+            "chat_id": self.chat_id,
+            "text": message,
+            "parse_mode": "HTML",
+        }
+
+        started_at = time.perf_counter()
+        try:
+            response = self.session.post(self.url, data=payload, timeout=self.timeout)
+        except requests.RequestException as error:
+            self._after_request(time.perf_counter() - started_at, succeeded=False)
+            raise TelegramError(f"Error sending message: {error}") from error
+
+        succeeded = response.status_code == 200
+        self._after_request(time.perf_counter() - started_at, succeeded)
+        if not succeeded:
+            raise TelegramError(f"Error sending message: {response.text}")
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_telegram_transport() -> TelegramTransport:
+    """
+    Returns the process-wide transport, so its connection pool and circuit are shared.
+    """
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = TelegramTransport(
+                token=settings.TELEGRAM_BOT_TOKEN,
+                chat_id=settings.TELEGRAM_CHAT_ID,
+                base_url=settings.TELEGRAM_API_URL,
+                connect_timeout=settings.TELEGRAM_CONNECT_TIMEOUT,
+                read_timeout=settings.TELEGRAM_READ_TIMEOUT,
+                failure_threshold=settings.TELEGRAM_CIRCUIT_FAILURE_THRESHOLD,
+                recovery_timeout=settings.TELEGRAM_CIRCUIT_RECOVERY_TIMEOUT,
+            )
+        return _transport
+
+
+def send_telegram_message(message: str) -> None:
+    get_telegram_transport().send_message(message)
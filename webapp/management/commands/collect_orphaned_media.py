@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from webapp.helpers.storage import delete_files, iter_file_pages
+from webapp.models import referenced_media_names
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes media files that no post cover or block image refers to. "
+        "The storage is listed and compared with the database one page at a time, "
+        "and the orphans of every page are deleted with a single request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--prefix",
+            default="posts/",
+            help="Storage prefix to collect orphans from.",
+        )
+        parser.add_argument(
+            "--grace-period",
+            type=float,
+            default=24,
+            help=(
+                "Hours a file is kept after it was uploaded, so files of uploads "
+                "that are not saved to the database yet are not collected."
+            ),
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the orphans, without deleting them.",
+        )
+
+    def handle(self, *args, **options):
+        uploaded_before = now() - timedelta(hours=options["grace_period"])
+        listed, orphans, orphan_size, failed = 0, 0, 0, 0
+
+        for page in iter_file_pages(default_storage, options["prefix"]):
+            listed += len(page)
+            files = {
+                file.name: file for file in page if file.modified_at < uploaded_before
+            }
+            orphan_names = sorted(set(files) - referenced_media_names(set(files)))
+            if not orphan_names:
+                continue
+
+            orphans += len(orphan_names)
+            orphan_size += sum(files[name].size for name in orphan_names)
+            if options["dry_run"] or options["verbosity"] > 1:
+                for name in orphan_names:
+                    self.stdout.write(f"Orphan {name} ({files[name].size} bytes)")
+
+            if not options["dry_run"]:
+                errors = delete_files(default_storage, orphan_names)
+                for name, error in errors.items():
+                    self.stderr.write(f"Failed to delete {name}: {error}")
+                failed += len(errors)
+
+        action = "Found" if options["dry_run"] else "Deleted"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Listed {listed} files. {action} {orphans - failed} orphans "
+                f"({orphan_size} bytes), {failed} failed."
+            )
+        )
@@ -0,0 +1,94 @@
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from webapp.helpers.storage import S3_DELETE_BATCH_SIZE, delete_files
+from webapp.models import PendingMediaDeletion, referenced_media_names
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes queued media files from storage in batches. On S3 every batch "
+        "is deleted with a single multi-object request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=S3_DELETE_BATCH_SIZE,
+            help="Number of files locked and deleted at once.",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=10,
+            help="Number of attempts before a file is given up.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling the queue instead of exiting once it is drained.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=60,
+            help="Seconds to wait between polls in --loop mode.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            deleted, failed = 0, 0
+            while True:
+                batch_deleted, batch_failed = self.delete_batch(
+                    options["batch_size"], options["max_attempts"]
+                )
+                deleted += batch_deleted
+                failed += batch_failed
+                # Failed files are retried on the next run instead of right away
+                if batch_failed or batch_deleted < options["batch_size"]:
+                    break
+
+            if deleted or failed or not options["loop"]:
+                self.stdout.write(
+                    self.style.SUCCESS(f"Deleted {deleted} files, {failed} failed.")
+                )
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
+
+    @staticmethod
+    def delete_batch(batch_size: int, max_attempts: int) -> tuple[int, int]:
+        """
+        Deletes one batch of queued files. Rows are locked with SKIP LOCKED,
+        so several workers can drain the queue at the same time.
+        Files that are still referenced are dropped from the queue without
+        being deleted.
+        """
+        with transaction.atomic():
+            pending = list(
+                PendingMediaDeletion.objects.select_for_update(skip_locked=True)
+                .filter(attempts__lt=max_attempts)
+                .order_by("id")[:batch_size]
+            )
+            names = {deletion.name for deletion in pending}
+            # A replaced file is still used if the save that replaced it was rolled back
+            names -= referenced_media_names(names)
+            errors = delete_files(default_storage, sorted(names))
+
+            failed = [deletion for deletion in pending if deletion.name in errors]
+            for deletion in failed:
+                deletion.attempts += 1
+                deletion.last_error = errors[deletion.name]
+            PendingMediaDeletion.objects.bulk_update(
+                failed, ["attempts", "last_error"]
+            )
+            PendingMediaDeletion.objects.filter(
+                id__in=[
+                    deletion.id for deletion in pending if deletion.name not in errors
+                ]
+            ).delete()
+        return len(pending) - len(failed), len(failed)
@@ -0,0 +1,163 @@
+import contextlib
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from webapp.models import Post
+
+MANIFEST_NAME = "manifest.json"
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders the anonymous view of the index, every post and the about page "
+        "to static HTML files. Only pages whose content changed since the last "
+        "run are rendered again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default=settings.STATIC_EXPORT_ROOT,
+            help="Directory to write the HTML files to.",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Render every page, even if it did not change.",
+        )
+
+    def handle(self, *args, **options):
+        # Pages served by NGINX never pass through CloudFrontSignedCookieMiddleware
+        if settings.AWS_CLOUDFRONT_SIGNED_COOKIES:
+            raise CommandError(
+                "Exported pages cannot set CloudFront signed cookies, "
+                "export them with signed media URLs instead."
+            )
+
+        output = Path(options["output"])
+        output.mkdir(parents=True, exist_ok=True)
+
+        manifest_path = output / MANIFEST_NAME
+        manifest = (
+            json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+        )
+        pages = self.get_pages()
+
+        self.request_factory = RequestFactory(HTTP_HOST=self.get_host())
+        rendered = 0
+        for url, fingerprint in pages.items():
+            if not options["force"] and not self.is_outdated(
+                manifest.get(url), fingerprint
+            ):
+                continue
+
+            if self.render_page(output, url):
+                manifest[url] = {"fingerprint": fingerprint, "rendered_at": time.time()}
+                rendered += 1
+
+        removed = 0
+        for url in set(manifest) - set(pages):
+            file_path = output / self.get_file_path(url)
+            file_path.unlink(missing_ok=True)
+            with contextlib.suppress(OSError):
+                file_path.parent.rmdir()
+            del manifest[url]
+            removed += 1
+
+        self.write_file(manifest_path, json.dumps(manifest, indent=2).encode())
+        self.stdout.write(
+            self.style.SUCCESS(f"Rendered {rendered} pages, removed {removed} pages.")
+        )
+
+    def get_pages(self) -> dict[str, str]:
+        """
+        Returns the URL of every exported page and a fingerprint of its content.
+        `Post.updated_at` is also touched by block, tag and comment changes.
+        """
+        posts = list(Post.objects.values_list("id", "position", "updated_at"))
+        index_fingerprint = hashlib.md5(
+            json.dumps(posts, default=str).encode()
+        ).hexdigest()
+
+        pages = {
+            reverse("webapp:index"): index_fingerprint,
+            reverse("webapp:about_me"): "",
+        }
+        for post_id, _, updated_at in posts:
+            pages[reverse("webapp:post_detail", args=[post_id])] = (
+                updated_at.isoformat()
+            )
+        return pages
+
+    @staticmethod
+    def is_outdated(entry: dict | None, fingerprint: str) -> bool:
+        if entry is None or entry["fingerprint"] != fingerprint:
+            return True
+
+        # Signed media URLs embedded in the page stay valid for at least
+        # SIGNED_URL_REFRESH_MARGIN seconds after it has been rendered
+        return entry["rendered_at"] + settings.SIGNED_URL_REFRESH_MARGIN <= time.time()
+
+    def render_page(self, output: Path, url: str) -> bool:
+        """
+        Renders the page by calling its view with an anonymous request,
+        so errors are raised instead of being rendered as an error page.
+        """
+        request = self.request_factory.get(url)
+        request.user = AnonymousUser()
+        match = resolve(url)
+        if iscoroutinefunction(match.func):
+            # ASYNC_READ_VIEWS views load the user set by AuthenticationMiddleware
+            async def auser():
+                return request.user
+
+            request.auser = auser
+            view = async_to_sync(match.func)
+        else:
+            view = match.func
+        response = view(request, *match.args, **match.kwargs)
+        if hasattr(response, "render"):
+            response.render()
+
+        if response.status_code != 200:
+            raise CommandError(f"{url} responded with {response.status_code}.")
+
+        # A stale page is rendered again on the next run
+        if response.get("X-Page-Cache") == "STALE":
+            self.stdout.write(f"Skipped {url} (stale page is being regenerated)")
+            return False
+
+        self.write_file(output / self.get_file_path(url), response.content)
+        self.stdout.write(f"Rendered {url}")
+        return True
+
+    @staticmethod
+    def get_file_path(url: str) -> Path:
+        return Path(url.strip("/")) / "index.html"
+
+    @staticmethod
+    def get_host() -> str:
+        for host in settings.ALLOWED_HOSTS:
+            if host and host != "*":
+                return host.lstrip(".")
+        return "localhost"
+
+    @staticmethod
+    def write_file(path: Path, content: bytes) -> None:
+        """
+        Writes the file atomically, so a file server never reads a partial page.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = path.with_name(f".{path.name}.tmp")
+        temporary_path.write_bytes(content)
+        os.replace(temporary_path, path)
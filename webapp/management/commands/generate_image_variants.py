@@ -0,0 +1,102 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from webapp.helpers.images import (
+    IMAGE_METADATA_DEFAULTS,
+    describe_image,
+    open_image,
+    save_derivatives,
+)
+from webapp.models import Image, Post
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates the WebP/AVIF derivatives, dimensions and placeholders of "
+        "post covers and block images. Uploads are stored without derivatives, "
+        "so this runs after every upload, from cron or with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling for new images instead of exiting once they are done.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Seconds to wait between polls in --loop mode.",
+        )
+
+    def handle(self, *args, **options):
+        # Images that cannot be read are only reported once per process
+        self.skipped = set()
+        while True:
+            generated, failed = self.generate()
+            if generated or failed or not options["loop"]:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Generated derivatives of {generated} images, {failed} failed."
+                    )
+                )
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
+
+    def generate(self) -> tuple[int, int]:
+        generated, failed = 0, 0
+        posts = Post.objects.exclude(cover_image="").exclude(cover_image=None)
+        objects = [(posts, "cover_image"), (Image.objects.all(), "image")]
+        for queryset, field_name in objects:
+            variants_field_name = f"{field_name}_variants"
+            update_fields = [variants_field_name] + [
+                f"{field_name}_{attribute}" for attribute in IMAGE_METADATA_DEFAULTS
+            ]
+            missing = Q(**{variants_field_name: []}) | Q(
+                **{f"{field_name}_width__isnull": True}
+            )
+            for obj in queryset.filter(missing).iterator():
+                file = getattr(obj, field_name)
+                key = (queryset.model, obj.pk, file.name)
+                if key in self.skipped:
+                    continue
+
+                try:
+                    with file.open("rb"):
+                        image = open_image(file)
+                except OSError as error:
+                    self.stderr.write(f"Skipped {file.name}: {error}")
+                    self.skipped.add(key)
+                    failed += 1
+                    continue
+
+                if not getattr(obj, variants_field_name):
+                    # Uploads are named after their content, so stored
+                    # derivatives of the same name are reused
+                    setattr(
+                        obj,
+                        variants_field_name,
+                        save_derivatives(file.storage, file.name, image, reuse=True),
+                    )
+                for attribute, value in describe_image(image).items():
+                    setattr(obj, f"{field_name}_{attribute}", value)
+
+                with transaction.atomic():
+                    # The image may have been replaced while its derivatives were
+                    # generated, then they are left to the next run
+                    current = queryset.select_for_update().filter(
+                        pk=obj.pk, **{field_name: file.name}
+                    )
+                    if not list(current.values_list("pk", flat=True)):
+                        continue
+
+                    # Saving invalidates the cached pages that show the image
+                    obj.save(update_fields=update_fields)
+                generated += 1
+
+        return generated, failed
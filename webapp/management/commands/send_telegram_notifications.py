@@ -0,0 +1,239 @@
+import time
+from datetime import datetime, timedelta, timezone
+from html import escape
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q, QuerySet
+from django.utils.timezone import now
+
+from webapp.helpers.telegram import (
+    CircuitOpenError,
+    TelegramError,
+    get_telegram_transport,
+    send_telegram_message,
+)
+from webapp.models import TelegramNotification
+
+# Delay before the first retry, doubled after every failed attempt
+RETRY_BASE_DELAY = 30
+RETRY_MAX_DELAY = 60 * 60
+
+# Number of posts or users listed in a digest message
+DIGEST_MAX_LINES = 10
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """
+    Returns the exponential backoff delay after `attempts` failed attempts.
+    """
+    delay = RETRY_BASE_DELAY * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay, RETRY_MAX_DELAY))
+
+
+def digest_text(
+    kind: str, count: int, subjects: list[tuple[str, int]], subjects_count: int
+) -> str:
+    """
+    Summarizes `count` notifications of one kind about `subjects_count` subjects,
+    e.g. "12 New Comments on 3 posts", listing `subjects` with their counts.
+    """
+    if kind == TelegramNotification.Kind.COMMENT:
+        posts = "post" if subjects_count == 1 else "posts"
+        lines = [f"<b>{count} New Comments</b> on {subjects_count} {posts}"]
+        lines += [
+            f"🚀{escape(subject)} ({subject_count})"
+            for subject, subject_count in subjects
+        ]
+    else:
+        lines = [f"<b>{count} New Users</b>"]
+        lines += [f"📧 {escape(subject)}" for subject, _ in subjects]
+
+    if subjects_count > len(subjects):
+        lines.append(f"… and {subjects_count - len(subjects)} more")
+    return "\n".join(lines)
+
+
+def due_notifications(max_attempts: int) -> QuerySet[TelegramNotification]:
+    """
+    Returns the unsent notifications that are due and have attempts left.
+    """
+    due = Q(next_attempt_at__lte=now())
+    window = settings.TELEGRAM_DIGEST_WINDOW
+    if window:
+        # Digest kinds wait until the window they were created in is over
+        window_start = datetime.fromtimestamp(
+            time.time() // window * window, tz=timezone.utc
+        )
+        due &= ~Q(kind__in=TelegramNotification.DIGEST_KINDS) | Q(
+            created_at__lt=window_start
+        )
+    return TelegramNotification.objects.filter(
+        due, sent_at__isnull=True, attempts__lt=max_attempts
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Sends queued Telegram notifications in batches. Failed notifications are "
+        "retried with exponential backoff until they run out of attempts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50,
+            help="Number of notifications locked and sent at once, besides digests.",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=10,
+            help="Number of attempts before a notification is given up.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling the outbox instead of exiting once it is drained.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Seconds to wait between polls in --loop mode.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = self.send_digests(options["max_attempts"])
+            while True:
+                batch_sent, batch_failed = self.send_batch(
+                    options["batch_size"], options["max_attempts"]
+                )
+                sent += batch_sent
+                failed += batch_failed
+                if batch_sent + batch_failed < options["batch_size"]:
+                    break
+
+            if sent or failed or not options["loop"]:
+                self.stdout.write(
+                    self.style.SUCCESS(f"Sent {sent} notifications, {failed} failed.")
+                )
+                if options["verbosity"] > 1:
+                    self.stdout.write(f"Transport: {get_telegram_transport().stats}")
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
+
+    @staticmethod
+    def send_batch(batch_size: int, max_attempts: int) -> tuple[int, int]:
+        """
+        Sends one batch of due notifications. Rows are locked with SKIP LOCKED,
+        so several workers can drain the outbox without sending a notification twice.
+        In digest mode digest kinds are left to `send_digests`.
+        """
+        notifications = due_notifications(max_attempts)
+        if settings.TELEGRAM_DIGEST_WINDOW:
+            notifications = notifications.exclude(
+                kind__in=TelegramNotification.DIGEST_KINDS
+            )
+
+        with transaction.atomic():
+            notifications = list(
+                notifications.select_for_update(skip_locked=True).order_by(
+                    "next_attempt_at", "id"
+                )[:batch_size]
+            )
+
+            sent, failed = 0, 0
+            for notification in notifications:
+                try:
+                    send_telegram_message(notification.text)
+                except CircuitOpenError as error:
+                    # Rejected without a request, so it does not use up an attempt
+                    notification.last_error = str(error)
+                    notification.next_attempt_at = now() + timedelta(
+                        seconds=settings.TELEGRAM_CIRCUIT_RECOVERY_TIMEOUT
+                    )
+                    failed += 1
+                except TelegramError as error:
+                    notification.attempts += 1
+                    notification.last_error = str(error)
+                    notification.next_attempt_at = now() + retry_delay(
+                        notification.attempts
+                    )
+                    failed += 1
+                else:
+                    notification.attempts += 1
+                    notification.sent_at = now()
+                    sent += 1
+
+            TelegramNotification.objects.bulk_update(
+                notifications,
+                ["attempts", "next_attempt_at", "sent_at", "last_error"],
+            )
+        return sent, failed
+
+    @staticmethod
+    def send_digests(max_attempts: int) -> tuple[int, int]:
+        """
+        Sends every due notification of each digest kind as one summary message.
+        The rows are counted and sampled in the database and updated with one query.
+        All of them are locked, so a concurrent worker waits and then finds them sent.
+        """
+        if not settings.TELEGRAM_DIGEST_WINDOW:
+            return 0, 0
+
+        sent, failed = 0, 0
+        for kind in TelegramNotification.DIGEST_KINDS:
+            with transaction.atomic():
+                notifications = due_notifications(max_attempts).filter(kind=kind)
+                count = len(notifications.select_for_update().values_list("id"))
+                if not count:
+                    continue
+
+                if count == 1:
+                    text = notifications.get().text
+                else:
+                    # Posts with the most comments first, users in signup order
+                    ordering = (
+                        ["-count", "first_id"]
+                        if kind == TelegramNotification.Kind.COMMENT
+                        else ["first_id"]
+                    )
+                    subjects = [
+                        (subject["subject"], subject["count"])
+                        for subject in notifications.values("subject")
+                        .annotate(count=Count("id"), first_id=Min("id"))
+                        .order_by(*ordering)[:DIGEST_MAX_LINES]
+                    ]
+                    subjects_count = notifications.aggregate(
+                        subjects_count=Count("subject", distinct=True)
+                    )["subjects_count"]
+                    text = digest_text(kind, count, subjects, subjects_count)
+
+                try:
+                    send_telegram_message(text)
+                except CircuitOpenError as error:
+                    # Rejected without a request, so it does not use up an attempt
+                    retry_at = now() + timedelta(
+                        seconds=settings.TELEGRAM_CIRCUIT_RECOVERY_TIMEOUT
+                    )
+                    notifications.update(
+                        last_error=str(error), next_attempt_at=retry_at
+                    )
+                    failed += count
+                except TelegramError as error:
+                    attempts = notifications.aggregate(attempts=Max("attempts"))
+                    notifications.update(
+                        attempts=F("attempts") + 1,
+                        last_error=str(error),
+                        next_attempt_at=now() + retry_delay(attempts["attempts"] + 1),
+                    )
+                    failed += count
+                else:
+                    notifications.update(attempts=F("attempts") + 1, sent_at=now())
+                    sent += count
+        return sent, failed
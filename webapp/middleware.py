@@ -0,0 +1,58 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.storage import storages
+
+# Every uploaded media file lives under this prefix, see `post_cover_image_path`
+MEDIA_PREFIX = "posts/"
+
+
+class CloudFrontSignedCookieMiddleware:
+    """
+    Issues CloudFront signed cookies that authorize all media under `posts/`,
+    so media URLs can stay plain and stable instead of being signed one by one.
+    It runs in the mode of the next handler, so async views stay async under ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.AWS_CLOUDFRONT_SIGNED_COOKIES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        response = self.get_response(request)
+        self.set_signed_cookies(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        self.set_signed_cookies(request, response)
+        return response
+
+    @staticmethod
+    def set_signed_cookies(request, response):
+        # The cookies expire in the browser before their policy does
+        if "CloudFront-Policy" in request.COOKIES:
+            return
+
+        cookies, valid_until = storages["default"].signed_cookies(MEDIA_PREFIX)
+        for name, value in cookies.items():
+            response.set_cookie(
+                name,
+                value,
+                max_age=max(int(valid_until - time.time()), 0),
+                domain=settings.AWS_CLOUDFRONT_COOKIE_DOMAIN,
+                secure=True,
+                httponly=True,
+                samesite="Lax",
+            )
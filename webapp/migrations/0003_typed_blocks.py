@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("webapp", "0002_comment"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="block",
+            name="block_type",
+            field=models.CharField(
+                choices=[("text", "Text"), ("image", "Image"), ("space", "Space")],
+                max_length=10,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="block",
+            name="image",
+            field=models.OneToOneField(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="block",
+                to="webapp.image",
+            ),
+        ),
+        migrations.AddField(
+            model_name="block",
+            name="space_number",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="block",
+            name="text",
+            field=models.TextField(blank=True, default=""),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="block",
+            name="text_alignment",
+            field=models.CharField(blank=True, default="", max_length=100),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="block",
+            name="text_type",
+            field=models.CharField(blank=True, default="", max_length=100),
+            preserve_default=False,
+        ),
+    ]
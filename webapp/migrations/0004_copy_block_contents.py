@@ -0,0 +1,85 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:00
+
+from django.db import migrations
+
+
+
+def copy_block_contents(apps, schema_editor):
+    """
+    Copies the content of every generic block into its own typed columns.
+    Blocks whose content object no longer exists are deleted.
+    """
+    Block = apps.get_model("webapp", "Block")
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    Text = apps.get_model("webapp", "Text")
+    Image = apps.get_model("webapp", "Image")
+    Space = apps.get_model("webapp", "Space")
+
+    content_types = {
+        content_type.id: content_type.model
+        for content_type in ContentType.objects.filter(
+            app_label="webapp", model__in=["text", "image", "space"]
+        )
+    }
+    object_ids = {"text": set(), "image": set(), "space": set()}
+    blocks = list(Block.objects.all())
+    for block in blocks:
+        model = content_types.get(block.object_type_id)
+        if model:
+            object_ids[model].add(block.object_id)
+
+    texts = Text.objects.in_bulk(object_ids["text"])
+    images = Image.objects.in_bulk(object_ids["image"])
+    spaces = Space.objects.in_bulk(object_ids["space"])
+
+    updated_blocks = []
+    orphan_block_ids = []
+    for block in blocks:
+        model = content_types.get(block.object_type_id)
+
+        if model == "text" and block.object_id in texts:
+            text = texts[block.object_id]
+            block.block_type = "text"
+            block.text = text.text
+            block.text_type = text.text_type
+            block.text_alignment = text.text_alignment
+        elif model == "image" and block.object_id in images:
+            block.block_type = "image"
+            block.image_id = block.object_id
+        elif model == "space" and block.object_id in spaces:
+            block.block_type = "space"
+            block.space_number = spaces[block.object_id].space_number
+        else:
+            orphan_block_ids.append(block.id)
+            continue
+
+        updated_blocks.append(block)
+
+    Block.objects.bulk_update(
+        updated_blocks,
+        [
+            "block_type",
+            "text",
+            "text_type",
+            "text_alignment",
+            "image",
+            "space_number",
+        ],
+        batch_size=500,
+    )
+    Block.objects.filter(id__in=orphan_block_ids).delete()
+
+
+class Migration(migrations.Migration):
+    # The copy runs in its own migration, because Postgres does not alter
+    # a table with pending trigger events from updates in the same transaction
+
+    dependencies = [
+        ("webapp", "0003_typed_blocks"),
+    ]
+
+    operations = [
+        # Generic rows are not rebuilt: the next migration deletes the Text and
+        # Space rows, so going back past it needs a database backup anyway
+        migrations.RunPython(copy_block_contents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webapp", "0004_copy_block_contents"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="block",
+            name="block_type",
+            field=models.CharField(
+                choices=[("text", "Text"), ("image", "Image"), ("space", "Space")],
+                max_length=10,
+            ),
+        ),
+        migrations.RemoveIndex(
+            model_name="block",
+            name="webapp_bloc_object__e351e5_idx",
+        ),
+        migrations.RemoveField(
+            model_name="block",
+            name="object_id",
+        ),
+        migrations.RemoveField(
+            model_name="block",
+            name="object_type",
+        ),
+        migrations.DeleteModel(
+            name="Space",
+        ),
+        migrations.DeleteModel(
+            name="Text",
+        ),
+        migrations.AddIndex(
+            model_name="block",
+            index=models.Index(
+                fields=["post", "block_position"], name="webapp_bloc_post_id_e3ef91_idx"
+            ),
+        ),
+    ]
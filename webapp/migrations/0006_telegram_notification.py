@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:03
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webapp", "0005_remove_generic_blocks"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TelegramNotification",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("kind", models.CharField(choices=[("message", "Message"), ("comment", "Comment"), ("user", "User")], max_length=10)),
+                ("text", models.TextField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("next_attempt_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("sent_at", models.DateTimeField(blank=True, null=True)),
+                ("last_error", models.TextField(blank=True)),
+            ],
+            options={
+                "ordering": ["created_at"],
+                "indexes": [models.Index(condition=models.Q(("sent_at__isnull", True)), fields=["next_attempt_at"], name="webapp_telegram_pending_idx")],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webapp", "0006_telegram_notification"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="telegramnotification",
+            name="subject",
+            field=models.CharField(blank=True, max_length=254),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webapp", "0007_telegram_notification_subject"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="post",
+            name="position",
+            field=models.PositiveIntegerField(db_index=True),
+        ),
+    ]
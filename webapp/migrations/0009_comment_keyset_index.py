@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webapp", "0008_post_position_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(fields=["post", "created_at", "id"], name="webapp_comm_post_id_89c41f_idx"),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:30
+
+from django.db import migrations
+
+POSITION_GAP = 1024
+
+
+def spread_block_positions(apps, schema_editor):
+    """
+    Numbers the blocks of every post `POSITION_GAP` apart, keeping their order.
+    """
+    Block = apps.get_model("webapp", "Block")
+
+    blocks = list(Block.objects.order_by("post_id", "block_position", "id"))
+    post_id, position = None, 0
+    for block in blocks:
+        if block.post_id != post_id:
+            post_id, position = block.post_id, 0
+        position += POSITION_GAP
+        block.block_position = position
+
+    Block.objects.bulk_update(blocks, ["block_position"], batch_size=500)
+
+
+def compact_block_positions(apps, schema_editor):
+    Block = apps.get_model("webapp", "Block")
+
+    blocks = list(Block.objects.order_by("post_id", "block_position", "id"))
+    post_id, position = None, 0
+    for block in blocks:
+        if block.post_id != post_id:
+            post_id, position = block.post_id, 0
+        position += 1
+        block.block_position = position
+
+    Block.objects.bulk_update(blocks, ["block_position"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webapp", "0009_comment_keyset_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(spread_block_positions, compact_block_positions),
+    ]
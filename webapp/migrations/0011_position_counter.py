@@ -0,0 +1,77 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:21
+
+from django.db import migrations, models
+
+POSITION_GAP = 1024
+
+
+def separate_duplicate_positions(apps, schema_editor):
+    """
+    Renumbers the posts, and the blocks of every post, that share a position
+    with another one, so the unique constraints can be added. The order is kept.
+    """
+    Post = apps.get_model("webapp", "Post")
+    Block = apps.get_model("webapp", "Block")
+
+    post_positions = list(Post.objects.values_list("position", flat=True))
+    if len(post_positions) != len(set(post_positions)):
+        posts = list(Post.objects.order_by("position", "id"))
+        for position, post in enumerate(posts, start=1):
+            post.position = position
+        Post.objects.bulk_update(posts, ["position"], batch_size=500)
+
+    duplicate_post_ids = (
+        Block.objects.values("post_id", "block_position")
+        .annotate(count=models.Count("id"))
+        .filter(count__gt=1)
+        .values_list("post_id", flat=True)
+    )
+    blocks = list(
+        Block.objects.filter(post_id__in=set(duplicate_post_ids)).order_by(
+            "post_id", "block_position", "id"
+        )
+    )
+    post_id, position = None, 0
+    for block in blocks:
+        if block.post_id != post_id:
+            post_id, position = block.post_id, 0
+        position += POSITION_GAP
+        block.block_position = position
+    Block.objects.bulk_update(blocks, ["block_position"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webapp", "0010_sparse_block_positions"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PositionCounter",
+            fields=[
+                (
+                    "key",
+                    models.CharField(max_length=50, primary_key=True, serialize=False),
+                ),
+                ("value", models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(separate_duplicate_positions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="block",
+            constraint=models.UniqueConstraint(
+                deferrable=models.Deferrable["DEFERRED"],
+                fields=("post", "block_position"),
+                name="webapp_block_position_unique",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="post",
+            constraint=models.UniqueConstraint(
+                deferrable=models.Deferrable["DEFERRED"],
+                fields=("position",),
+                name="webapp_post_position_unique",
+            ),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:30
+
+import webapp.helpers.images
+import webapp.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webapp", "0012_pending_media_deletion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="image",
+            name="image_variants",
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="cover_image_variants",
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AlterField(
+            model_name="image",
+            name="image",
+            field=webapp.helpers.images.ResponsiveImageField(upload_to=webapp.models.block_image_path),
+        ),
+        migrations.AlterField(
+            model_name="post",
+            name="cover_image",
+            field=webapp.helpers.images.ResponsiveImageField(blank=True, null=True, upload_to=webapp.models.post_cover_image_path),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:43
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webapp", "0014_image_metadata"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UploadSession",
+            fields=[
+                ("id", models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ("name", models.CharField(max_length=255)),
+                ("upload_id", models.CharField(blank=True, max_length=1024)),
+                ("size", models.PositiveBigIntegerField()),
+                ("chunk_size", models.PositiveIntegerField()),
+                ("offset", models.PositiveBigIntegerField(default=0)),
+                ("parts", models.JSONField(default=list)),
+                ("image_size", models.IntegerField()),
+                ("image_alignment", models.CharField(max_length=100)),
+                ("block_number", models.PositiveIntegerField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("post", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="upload_sessions", to="webapp.post")),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webapp", "0015_upload_session"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="image",
+            options={"ordering": ["id"]},
+        ),
+        migrations.AddField(
+            model_name="image",
+            name="gallery",
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name="gallery_images", to="webapp.block"),
+        ),
+        migrations.AlterField(
+            model_name="block",
+            name="block_type",
+            field=models.CharField(choices=[("text", "Text"), ("image", "Image"), ("space", "Space"), ("gallery", "Gallery")], max_length=10),
+        ),
+    ]
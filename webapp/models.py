@@ -1,18 +1,18 @@
+import hashlib
 import pathlib
+import uuid
 from datetime import timedelta
-from random import randrange
 
-from django.contrib.contenttypes.fields import GenericForeignKey
-from django.contrib.contenttypes.models import ContentType
-from django.core.files.storage import default_storage
-from django.db import models
-from django.db.models.signals import post_save, post_delete, pre_save
+from django.db import models, transaction
+from django.db.models.fields.files import FieldFile
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
 from django.dispatch import receiver
-from django.shortcuts import get_object_or_404
-from django.utils.text import slugify
+from django.utils.timezone import now
 
 from mykytaso_app import settings
-from webapp.helpers.telegram import send_telegram_message
+from webapp.helpers.cache import bump_post_version, bump_posts_version
+from webapp.helpers.images import ResponsiveImageField, original_name
 
 
 class Message(models.Model):
@@ -27,51 +27,116 @@ class Message(models.Model):
         return f"{self.email}: {self.content}"
 
 
+class PositionCounterManager(models.Manager):
+    def allocate(
+        self, key: str, queryset: models.QuerySet, field: str, step: int
+    ) -> int:
+        """
+        Returns a position `step` after both the last position allocated for
+        `key` and the highest `field` in `queryset`.
+
+        The UPDATE locks the counter row until the transaction ends, so
+        concurrent writers are served one at a time and never get the same
+        position. A `step` of 0 only takes the lock.
+        """
+        highest = models.Subquery(queryset.order_by(f"-{field}").values(field)[:1])
+        value = Greatest(models.F("value"), Coalesce(highest, 0)) + step
+
+        with transaction.atomic():
+            if not self.filter(key=key).update(value=value):
+                self.get_or_create(key=key)
+                self.filter(key=key).update(value=value)
+            return self.values_list("value", flat=True).get(key=key)
+
+
+# Last position allocated in a sequence: one row for the posts and one per post
+# for its blocks
+class PositionCounter(models.Model):
+    key = models.CharField(max_length=50, primary_key=True)
+    value = models.PositiveBigIntegerField(default=0)
+
+    objects = PositionCounterManager()
+
+    def __str__(self):
+        return f"{self.key}: {self.value}"
+
+
+def content_hash_path(file: FieldFile, filename: str) -> str:
+    """
+    Names an upload after the SHA-256 of its content, so an image uploaded
+    twice is stored once, and a name never refers to different content.
+    """
+    digest = hashlib.sha256()
+    for chunk in file.file.chunks():
+        digest.update(chunk)
+    file.file.seek(0)
+    return f"posts/{digest.hexdigest()}{pathlib.Path(filename).suffix.lower()}"
+
+
 def post_cover_image_path(instance: "Post", filename: str) -> str:
-    file_name = pathlib.Path(filename).stem
-    file_ext = pathlib.Path(filename).suffix
-    random_part = str(randrange(10**8)).zfill(8)
-    return (
-        pathlib.Path("posts/")
-        / slugify(instance.cover_title)
-        / pathlib.Path(f"{file_name}_{random_part}{file_ext}")
-    )
+    return content_hash_path(instance.cover_image, filename)
 
 
-def block_image_path(instance: "Image", filename: str) -> pathlib.Path:
-    file_name = pathlib.Path(filename).stem
-    file_ext = pathlib.Path(filename).suffix
-    random_part = str(randrange(10**8)).zfill(8)
-    return (
-        pathlib.Path("posts/")
-        / slugify(instance.post.cover_title)
-        / pathlib.Path(f"{file_name}_{random_part}{file_ext}")
-    )
+def block_image_path(instance: "Image", filename: str) -> str:
+    return content_hash_path(instance.image, filename)
 
 
 class Post(models.Model):
-    position = models.PositiveIntegerField()
+    position = models.PositiveIntegerField(db_index=True)
     cover_title = models.CharField(max_length=100)
     cover_description = models.TextField()
-    cover_image = models.ImageField(
+    cover_image = ResponsiveImageField(
         upload_to=post_cover_image_path, blank=True, null=True
     )
+    cover_image_variants = models.JSONField(default=list, blank=True, editable=False)
+    cover_image_width = models.PositiveIntegerField(
+        blank=True, null=True, editable=False
+    )
+    cover_image_height = models.PositiveIntegerField(
+        blank=True, null=True, editable=False
+    )
+    cover_image_color = models.CharField(max_length=7, blank=True, editable=False)
+    cover_image_placeholder = models.TextField(blank=True, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
+        constraints = [
+            # Deferred, so positions can be swapped within a transaction
+            models.UniqueConstraint(
+                fields=["position"],
+                name="webapp_post_position_unique",
+                deferrable=models.Deferrable.DEFERRED,
+            ),
+        ]
         ordering = ["-position"]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembers the stored cover image, so a save can tell whether it changed
+        if "cover_image" in field_names:
+            instance._loaded_cover_image = values[field_names.index("cover_image")]
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using, fields, from_queryset)
+        if fields is None or "cover_image" in fields:
+            self._loaded_cover_image = self.cover_image.name
+
     def save(self, *args, **kwargs):
         if not self.pk:
             if self.position is None:
-                max_position = Post.objects.aggregate(models.Max("position"))[
-                    "position__max"
-                ]
-                self.position = max_position + 1 if max_position is not None else 1
+                self.position = PositionCounter.objects.allocate(
+                    "posts", Post.objects.all(), "position", 1
+                )
         super().save(*args, **kwargs)
 
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "cover_image" in update_fields:
+            self._loaded_cover_image = self.cover_image.name
+
     def __str__(self):
         return f"Title: {self.cover_title} | Position: {self.position}"
 
@@ -85,47 +150,176 @@ class Tag(models.Model):
 
 
 class Image(models.Model):
-    image = models.ImageField(upload_to=block_image_path)
+    image = ResponsiveImageField(upload_to=block_image_path)
+    image_variants = models.JSONField(default=list, blank=True, editable=False)
+    image_width = models.PositiveIntegerField(blank=True, null=True, editable=False)
+    image_height = models.PositiveIntegerField(blank=True, null=True, editable=False)
+    image_color = models.CharField(max_length=7, blank=True, editable=False)
+    image_placeholder = models.TextField(blank=True, editable=False)
     image_size = models.IntegerField()
     image_alignment = models.CharField(max_length=100)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="images")
+    # Gallery block the image belongs to, images of image blocks have none
+    gallery = models.ForeignKey(
+        "Block",
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name="gallery_images",
+    )
+
+    class Meta:
+        ordering = ["id"]
 
     def __str__(self):
         return f"Image: {self.image} | Size: {self.image_size} | Alignment: {self.image_alignment}"
 
 
-class Text(models.Model):
-    text = models.TextField()
-    text_type = models.CharField(max_length=100)
-    text_alignment = models.CharField(max_length=100)
-
-    def __str__(self):
-        return self.text
+def touch_post(post_id: int) -> None:
+    """
+    Invalidates cached fragments of the post and touches `Post.updated_at`,
+    which drives conditional GET of the post.
+    The version is bumped once the transaction commits, so a concurrent render
+    that still reads the old rows cannot cache them under the new version.
+    """
+    transaction.on_commit(lambda: bump_post_version(post_id))
+    Post.objects.filter(pk=post_id).update(updated_at=now())
+
+
+class BlockManager(models.Manager):
+    def get_queryset(self):
+        # Image blocks are joined, so all blocks of a post are loaded in one query
+        return super().get_queryset().select_related("image")
+
+    def allocate_position(self, post_id: int, step: int) -> int:
+        """
+        Allocates a position `step` after the last block of the post, and locks
+        the positions of its blocks until the transaction ends.
+        """
+        return PositionCounter.objects.allocate(
+            f"post:{post_id}:blocks",
+            self.filter(post_id=post_id),
+            "block_position",
+            step,
+        )
 
+    def next_position(self, post_id: int) -> int:
+        """
+        Returns the position after the last block of the post.
+        """
+        return self.allocate_position(post_id, Block.POSITION_GAP)
+
+    def position_at(self, post_id: int, index: int, exclude_id: int = None) -> int:
+        """
+        Returns a position that places a block at `index` among the other blocks
+        of the post, halfway between its neighbours. Only when there is no gap
+        left between them are the blocks of the post spread out again.
+        """
+        self.allocate_position(post_id, 0)
+        positions = list(
+            self.filter(post_id=post_id)
+            .exclude(pk=exclude_id)
+            .order_by("block_position", "id")
+            .values_list("block_position", flat=True)
+        )
+        index = max(0, min(index, len(positions)))
+
+        before = positions[index - 1] if index > 0 else 0
+        if index == len(positions):
+            return self.next_position(post_id)
+        after = positions[index]
+        if after - before >= 2:
+            return (before + after) // 2
+
+        self.rebalance(post_id, exclude_id)
+        return index * Block.POSITION_GAP + Block.POSITION_GAP // 2
+
+    def rebalance(self, post_id: int, exclude_id: int = None) -> None:
+        """
+        Spreads the blocks of the post `POSITION_GAP` apart, keeping their order.
+        """
+        block_ids = list(
+            self.filter(post_id=post_id)
+            .exclude(pk=exclude_id)
+            .order_by("block_position", "id")
+            .values_list("id", flat=True)
+        )
+        self.reorder(post_id, block_ids)
+
+    def reorder(self, post_id: int, block_ids: list[int]) -> None:
+        """
+        Sets the order of the given blocks of the post in a single UPDATE.
+        `update()` sends no signals, so the post is touched here.
+        """
+        if not block_ids:
+            return
+        self.allocate_position(post_id, 0)
+        self.filter(post_id=post_id, pk__in=block_ids).update(
+            block_position=models.Case(
+                *[
+                    models.When(
+                        pk=block_id, then=models.Value((index + 1) * Block.POSITION_GAP)
+                    )
+                    for index, block_id in enumerate(block_ids)
+                ]
+            )
+        )
+        touch_post(post_id)
 
-class Space(models.Model):
-    space_number = models.IntegerField()
 
-    def __str__(self):
-        return f"Space Number: {self.space_number}"
+# Typed content block: every block type is stored in the same row
+class Block(models.Model):
+    class BlockType(models.TextChoices):
+        TEXT = "text", "Text"
+        IMAGE = "image", "Image"
+        SPACE = "space", "Space"
+        GALLERY = "gallery", "Gallery"
 
+    # Blocks are numbered this far apart, so a block can be inserted between
+    # two others without renumbering the blocks that follow
+    POSITION_GAP = 1024
 
-# Generic content association model
-class Block(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="blocks")
+    block_type = models.CharField(max_length=10, choices=BlockType.choices)
+    block_position = models.PositiveIntegerField()
 
-    object_id = models.PositiveIntegerField()
-    object_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
-    content_object = GenericForeignKey("object_type", "object_id")
+    # Text block
+    text = models.TextField(blank=True)
+    text_type = models.CharField(max_length=100, blank=True)
+    text_alignment = models.CharField(max_length=100, blank=True)
+
+    # Image block
+    image = models.OneToOneField(
+        Image,
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name="block",
+    )
 
-    block_position = models.PositiveIntegerField()
+    # Space block
+    space_number = models.IntegerField(blank=True, null=True)
+
+    objects = BlockManager()
 
     class Meta:
+        constraints = [
+            # Deferred, so blocks can be swapped and reordered within a transaction
+            models.UniqueConstraint(
+                fields=["post", "block_position"],
+                name="webapp_block_position_unique",
+                deferrable=models.Deferrable.DEFERRED,
+            ),
+        ]
+        # Kept for databases that skip deferrable constraints
         indexes = [
-            models.Index(fields=["object_type", "object_id"]),
+            models.Index(fields=["post", "block_position"]),
         ]
         ordering = ["post", "block_position"]
 
+    def __str__(self):
+        return f"Block: {self.block_type} | Position: {self.block_position}"
+
 
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="comments")
@@ -134,70 +328,247 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
+        indexes = [
+            models.Index(fields=["post", "created_at", "id"]),
+        ]
         ordering = ["created_at"]
 
     def __str__(self):
         return f"{self.author}: {self.content}"
 
 
-@receiver(post_delete, sender=Post)
-def delete_post_cover_image(sender, instance, **kwargs):
+# Outbox of Telegram notifications, sent by `manage.py send_telegram_notifications`
+class TelegramNotification(models.Model):
+    class Kind(models.TextChoices):
+        MESSAGE = "message", "Message"
+        COMMENT = "comment", "Comment"
+        USER = "user", "User"
+
+    # Kinds coalesced into a single summary message in digest mode
+    DIGEST_KINDS = (Kind.COMMENT, Kind.USER)
+
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    text = models.TextField()
+    # Post title or user email the notification is about, used in digests
+    subject = models.CharField(max_length=254, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=now)
+    sent_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=models.Q(sent_at__isnull=True),
+                name="webapp_telegram_pending_idx",
+            ),
+        ]
+        ordering = ["created_at"]
+
+    def __str__(self):
+        return f"Notification: {self.kind} | Sent: {self.sent_at}"
+
+
+# Media files to delete from storage, deleted in batches by `manage.py delete_pending_media`
+class PendingMediaDeletion(models.Model):
+    name = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ["created_at"]
+
+    def __str__(self):
+        return f"Pending deletion: {self.name} | Attempts: {self.attempts}"
+
+
+# Resumable chunked upload of a block image, see `UploadSessionView`
+class UploadSession(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="upload_sessions"
+    )
+    # Storage name of the joined upload, and the S3 multipart upload ID
+    name = models.CharField(max_length=255)
+    upload_id = models.CharField(max_length=1024, blank=True)
+
+    size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    # Bytes received so far, always a multiple of `chunk_size` until the last chunk
+    offset = models.PositiveBigIntegerField(default=0)
+    parts = models.JSONField(default=list)
+
+    # Fields of the image block created when the upload is committed
+    image_size = models.IntegerField()
+    image_alignment = models.CharField(max_length=100)
+    block_number = models.PositiveIntegerField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Upload session: {self.name} | {self.offset}/{self.size} bytes"
+
+
+def referenced_media_names(names: set[str]) -> set[str]:
     """
-    Deletes the cover image from storage when the `Post` object is deleted.
+    Returns the names that are used by a post cover or a block image.
+    A derivative is used as long as its original is.
     """
+    originals = {name: original_name(name) for name in names}
+    referenced = set(
+        Post.objects.filter(cover_image__in=originals.values()).values_list(
+            "cover_image", flat=True
+        )
+    ) | set(
+        Image.objects.filter(image__in=originals.values()).values_list(
+            "image", flat=True
+        )
+    )
+    return {name for name, original in originals.items() if original in referenced}
+
+
+def queue_media_deletion(images: list[tuple[str, list[dict]]]) -> None:
+    """
+    Queues images, given as `(name, variants)` pairs, and their derivatives
+    for deletion from storage with a single insert.
+    """
+    PendingMediaDeletion.objects.bulk_create(
+        PendingMediaDeletion(name=name)
+        for image_name, variants in images
+        for name in [image_name, *(variant["name"] for variant in variants)]
+    )
 
+
+def is_post_deletion(origin) -> bool:
+    """
+    Returns whether a deletion was started by deleting posts, so the deleted
+    object is only cascaded from its post.
+    """
+    if isinstance(origin, models.QuerySet):
+        return origin.model is Post
+    return isinstance(origin, Post)
+
+
+@receiver(pre_delete, sender=Post)
+def delete_post_images(sender, instance, **kwargs):
+    """
+    Queues the cover image, the block images and all their derivatives for
+    deletion from storage when the `Post` object is deleted. The block images
+    are queued here, before the cascade deletes them, so the whole post is
+    queued with one insert.
+    The queue entries are committed together with the deletion.
+    """
+    images = list(
+        Image.objects.filter(post=instance)
+        .exclude(image="")
+        .values_list("image", "image_variants")
+    )
     if instance.cover_image and instance.cover_image.name:
-        if default_storage.exists(instance.cover_image.name):
-            default_storage.delete(instance.cover_image.name)
+        images.append((instance.cover_image.name, instance.cover_image_variants))
+    queue_media_deletion(images)
 
 
 @receiver(pre_save, sender=Post)
-def delete_post_cover_image_on_update(sender, instance, **kwargs):
+def delete_post_cover_image_on_update(sender, instance, update_fields, **kwargs):
     """
-    Deletes the old cover image from storage when the `Post` object is updated.
+    Queues the old cover image for deletion when the `Post` object is updated.
+    The stored cover image is remembered when the post is loaded, so saves that
+    leave it unchanged, like position swaps, run no extra query.
     """
-    # Check if the object exists in the database (old instance)
-    if instance.pk:
-        old_instance = get_object_or_404(Post, pk=instance.pk)
+    if not instance.pk or "cover_image" in instance.get_deferred_fields():
+        return
+    if update_fields is not None and "cover_image" not in update_fields:
+        return
+
+    if hasattr(instance, "_loaded_cover_image"):
+        old_name = instance._loaded_cover_image
+    else:
+        # The post was not loaded from the database
+        old_name = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list("cover_image", flat=True)
+            .first()
+        )
 
-        if (
-            old_instance.cover_image
-            and old_instance.cover_image != instance.cover_image
-        ):
-            # Delete the old image from the storage (S3)
-            if default_storage.exists(old_instance.cover_image.name):
-                default_storage.delete(old_instance.cover_image.name)
+    if old_name and old_name != instance.cover_image.name:
+        # The derivatives of the new cover are only generated after this receiver
+        queue_media_deletion([(old_name, instance.cover_image_variants)])
 
 
 @receiver(post_delete, sender=Image)
-def delete_block_image(sender, instance, **kwargs):
+def delete_block_image(sender, instance, origin=None, **kwargs):
     """
-    Deletes the image file from storage when the `Image` object is deleted.
+    Queues the image file and its derivatives for deletion from storage when
+    the `Image` object is deleted, unless its whole post is.
     """
+    if is_post_deletion(origin):
+        return
     if instance.image and instance.image.name:
-        if default_storage.exists(instance.image.name):
-            default_storage.delete(instance.image.name)
+        queue_media_deletion([(instance.image.name, instance.image_variants)])
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_cache(sender, instance, **kwargs):
+    """
+    Invalidates cached fragments of the post and cached post lists
+    when the `Post` object changes, once the transaction commits.
+    """
+    post_id = instance.pk
+    transaction.on_commit(lambda: bump_post_version(post_id))
+    transaction.on_commit(bump_posts_version)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Block)
+@receiver(post_delete, sender=Block)
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_post_cache_on_related_change(sender, instance, origin=None, **kwargs):
+    """
+    Invalidates cached fragments of the post when one of its related objects changes.
+    A post that is being deleted is not touched for every object of its cascade.
+    """
+    if is_post_deletion(origin):
+        return
+    touch_post(instance.post_id)
 
 
 @receiver(post_save, sender=Message)
 def new_message_created(sender, instance, created, **kwargs):
     """
-    Sends a Telegram message when a new `Message` object is created.
+    Queues a Telegram notification when a new `Message` object is created.
     """
     if created:
-        send_telegram_message(
-            f"<b>New Message</b>\n⏱️ {(instance.created_at - timedelta(hours=4)).strftime('%Y-%m-%d %H:%M:%S')}\n"
-            f"📧 {instance.email}\n✍ {instance.content}"
+        TelegramNotification.objects.create(
+            kind=TelegramNotification.Kind.MESSAGE,
+            text=(
+                f"<b>New Message</b>\n⏱️ {(instance.created_at - timedelta(hours=4)).strftime('%Y-%m-%d %H:%M:%S')}\n"
+                f"📧 {instance.email}\n✍ {instance.content}"
+            ),
         )
 
 
 @receiver(post_save, sender=Comment)
 def new_comment_created(sender, instance, created, **kwargs):
     """
-    Sends a Telegram message when a new `Comment` object is created.
+    Queues a Telegram notification when a new `Comment` object is created.
     """
     if created:
-        send_telegram_message(
-            f"<b>New Comment</b>\n⏱️ {(instance.created_at - timedelta(hours=4)).strftime('%Y-%m-%d %H:%M:%S')}\n"
-            f"📧 {instance.author.email}\n🚀{instance.post.cover_title}\n✍ {instance.content}"
+        TelegramNotification.objects.create(
+            kind=TelegramNotification.Kind.COMMENT,
+            text=(
+                f"<b>New Comment</b>\n⏱️ {(instance.created_at - timedelta(hours=4)).strftime('%Y-%m-%d %H:%M:%S')}\n"
+                f"📧 {instance.author.email}\n🚀{instance.post.cover_title}\n✍ {instance.content}"
+            ),
+            subject=instance.post.cover_title,
         )
@@ -2,6 +2,8 @@ from datetime import timedelta
 
 from django import template
 
+from webapp.helpers.images import image_metadata, image_variants
+
 register = template.Library()
 
 
@@ -13,3 +15,23 @@ def email_username(value):
 @register.filter
 def minus_hours(value, hours):
     return value - timedelta(hours=int(hours))
+
+
+@register.filter
+def image_formats(file):
+    """Returns the formats of the derivatives of an image, best compression first."""
+    return list(dict.fromkeys(variant["format"] for variant in image_variants(file)))
+
+
+@register.filter
+def srcset(file, image_format):
+    """Returns the `srcset` of the derivatives of an image in one format."""
+    return ", ".join(
+        f"{file.storage.url(variant['name'])} {variant['width']}w"
+        for variant in image_variants(file)
+        if variant["format"] == image_format
+    )
+
+
+# Dimensions, color and placeholder stored for an image at upload
+register.filter(image_metadata)
@@ -0,0 +1,31 @@
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+
+def temporary_directory(test_case: SimpleTestCase) -> Path:
+    """Returns a temporary directory that is removed after the test."""
+    directory = tempfile.TemporaryDirectory()
+    test_case.addCleanup(directory.cleanup)
+    return Path(directory.name)
+
+
+def use_file_system_storage(test_case: SimpleTestCase) -> Path:
+    """
+    Stores the files of `test_case` in a temporary directory instead of S3,
+    and returns the directory.
+    """
+    media_root = temporary_directory(test_case)
+    storages = {
+        **settings.STORAGES,
+        "default": {
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+            "OPTIONS": {"location": media_root},
+        },
+    }
+    settings_override = override_settings(STORAGES=storages)
+    settings_override.enable()
+    test_case.addCleanup(settings_override.disable)
+    return media_root
@@ -0,0 +1,499 @@
+import io
+import json
+import time
+from datetime import datetime, timezone
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import include, path
+from django.utils.timezone import now
+
+from PIL import Image as PILImage
+
+from users.models import User
+from webapp.helpers.storage import iter_file_pages
+from webapp.helpers.telegram import TelegramError
+from webapp.models import (
+    Comment,
+    Image,
+    Message,
+    PendingMediaDeletion,
+    Post,
+    Tag,
+    TelegramNotification,
+)
+from webapp.tests.helpers import temporary_directory, use_file_system_storage
+from webapp.urls import urlpatterns as webapp_urlpatterns
+from webapp.views import AsyncPostDetailView, AsyncPostListView
+
+# The URLs served with ASYNC_READ_VIEWS, which webapp.urls reads on import
+urlpatterns = [
+    path(
+        "",
+        include(
+            (
+                [
+                    path("", AsyncPostListView.as_view(), name="index"),
+                    path(
+                        "posts/<int:pk>/",
+                        AsyncPostDetailView.as_view(),
+                        name="post_detail",
+                    ),
+                    *webapp_urlpatterns,
+                ],
+                "webapp",
+            )
+        ),
+    ),
+    path("", include("users.urls", namespace="users")),
+]
+
+
+class TestExportStaticPagesCommand(TestCase):
+    def setUp(self):
+        # Post versions are only bumped on commit, which never happens in a TestCase
+        cache.clear()
+
+        # Pages render media and static URLs, so both storages must work offline
+        use_file_system_storage(self)
+
+        self.post_1 = Post.objects.create(
+            position=1,
+            cover_title="Post 1 Title",
+            cover_description="Post 1 Description",
+            cover_image="post_1_image.jpg",
+        )
+
+        self.post_2 = Post.objects.create(
+            position=2,
+            cover_title="Post 2 Title",
+            cover_description="Post 2 Description",
+            cover_image="post_2_image.jpg",
+        )
+
+        self.output = temporary_directory(self)
+
+    def export(self) -> str:
+        out = StringIO()
+        call_command("export_static_pages", output=self.output, stdout=out)
+        return out.getvalue()
+
+    def test_export_renders_every_page(self):
+        out = self.export()
+
+        self.assertIn("Rendered 4 pages, removed 0 pages.", out)
+        self.assertIn(
+            "Post 1 Title", (self.output / "index.html").read_text()
+        )
+        self.assertIn(
+            "Post 2 Title",
+            (self.output / f"posts/{self.post_2.id}/index.html").read_text(),
+        )
+        self.assertTrue((self.output / "about/index.html").exists())
+        self.assertIn("/", json.loads((self.output / "manifest.json").read_text()))
+
+    def test_export_renders_only_changed_pages(self):
+        self.export()
+
+        self.assertIn("Rendered 0 pages", self.export())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(tag_name="Fresh Tag", post=self.post_1)
+        out = self.export()
+
+        self.assertIn(f"Rendered /posts/{self.post_1.id}/", out)
+        self.assertNotIn(f"Rendered /posts/{self.post_2.id}/", out)
+        self.assertIn(
+            "Fresh Tag",
+            (self.output / f"posts/{self.post_1.id}/index.html").read_text(),
+        )
+
+    def test_export_removes_deleted_posts(self):
+        self.export()
+        post_2_id = self.post_2.id
+        self.post_2.delete()
+
+        out = self.export()
+
+        self.assertIn("removed 1 pages.", out)
+        self.assertFalse((self.output / f"posts/{post_2_id}/index.html").exists())
+
+    @override_settings(ROOT_URLCONF=__name__, ASYNC_READ_VIEWS=True)
+    def test_export_renders_async_views(self):
+        out = self.export()
+
+        self.assertIn("Rendered 4 pages, removed 0 pages.", out)
+        self.assertIn("Post 1 Title", (self.output / "index.html").read_text())
+        self.assertIn(
+            "Post 2 Title",
+            (self.output / f"posts/{self.post_2.id}/index.html").read_text(),
+        )
+
+    @override_settings(AWS_CLOUDFRONT_SIGNED_COOKIES=True)
+    def test_export_refuses_signed_cookies(self):
+        with self.assertRaises(CommandError):
+            self.export()
+
+        self.assertFalse((self.output / "index.html").exists())
+
+
+class TestDeletePendingMediaCommand(TestCase):
+    def setUp(self):
+        self.media_root = use_file_system_storage(self)
+
+        for name in ["post_1_image.jpg", "post_2_image.jpg", "block_image.jpg"]:
+            (self.media_root / name).write_bytes(b"image")
+
+        self.post_1 = Post.objects.create(
+            position=1,
+            cover_title="Post 1 Title",
+            cover_description="Post 1 Description",
+            cover_image="post_1_image.jpg",
+        )
+        Image.objects.create(
+            image="block_image.jpg",
+            image_size=75,
+            image_alignment="center",
+            post=self.post_1,
+        )
+        self.post_2 = Post.objects.create(
+            position=2,
+            cover_title="Post 2 Title",
+            cover_description="Post 2 Description",
+            cover_image="post_2_image.jpg",
+        )
+
+    def delete_pending_media(self, **options) -> str:
+        out = StringIO()
+        call_command("delete_pending_media", stdout=out, **options)
+        return out.getvalue()
+
+    def test_deleted_post_media_is_queued_until_worker_runs(self):
+        self.post_1.delete()
+
+        self.assertTrue((self.media_root / "post_1_image.jpg").exists())
+        self.assertEqual(PendingMediaDeletion.objects.count(), 2)
+
+        out = self.delete_pending_media(batch_size=1)
+
+        self.assertIn("Deleted 2 files, 0 failed.", out)
+        self.assertFalse((self.media_root / "post_1_image.jpg").exists())
+        self.assertFalse((self.media_root / "block_image.jpg").exists())
+        self.assertTrue((self.media_root / "post_2_image.jpg").exists())
+        self.assertFalse(PendingMediaDeletion.objects.exists())
+
+    def test_referenced_media_is_not_deleted(self):
+        PendingMediaDeletion.objects.create(name="post_2_image.jpg")
+
+        self.delete_pending_media()
+
+        self.assertTrue((self.media_root / "post_2_image.jpg").exists())
+        self.assertFalse(PendingMediaDeletion.objects.exists())
+
+    def test_reuploaded_media_is_not_deleted(self):
+        buffer = io.BytesIO()
+        PILImage.new("RGB", (800, 400), "teal").save(buffer, "JPEG")
+        post = Post.objects.create(
+            position=3,
+            cover_title="Post 3 Title",
+            cover_description="Post 3 Description",
+            cover_image=SimpleUploadedFile("cover.jpg", buffer.getvalue()),
+        )
+        call_command("generate_image_variants", stdout=StringIO(), stderr=StringIO())
+        post.refresh_from_db()
+        names = [post.cover_image.name] + [
+            variant["name"] for variant in post.cover_image_variants
+        ]
+        post.delete()
+
+        post = Post(
+            position=3,
+            cover_title="Post 3 Title",
+            cover_description="Post 3 Description",
+            cover_image=SimpleUploadedFile("cover.jpg", buffer.getvalue()),
+        )
+        # The worker runs after the upload is stored, before its row is saved
+        Post._meta.get_field("cover_image").pre_save(post, add=True)
+        self.delete_pending_media()
+        post.save()
+
+        for name in names:
+            self.assertTrue((self.media_root / name).exists(), name)
+
+    def test_failed_deletion_is_retried(self):
+        self.post_2.delete()
+
+        with mock.patch(
+            "webapp.management.commands.delete_pending_media.delete_files",
+            return_value={"post_2_image.jpg": "AccessDenied: Access Denied"},
+        ):
+            out = self.delete_pending_media()
+
+        self.assertIn("Deleted 0 files, 1 failed.", out)
+        deletion = PendingMediaDeletion.objects.get()
+        self.assertEqual(deletion.attempts, 1)
+        self.assertEqual(deletion.last_error, "AccessDenied: Access Denied")
+
+        self.assertIn("Deleted 1 files, 0 failed.", self.delete_pending_media())
+        self.assertFalse((self.media_root / "post_2_image.jpg").exists())
+
+
+class TestCollectOrphanedMediaCommand(TestCase):
+    def setUp(self):
+        self.media_root = use_file_system_storage(self)
+
+        for name in [
+            "posts/post-1/cover.jpg",
+            "posts/post-1/block.jpg",
+            "posts/post-1/orphan.jpg",
+            "posts/post-2/orphan.jpg",
+            "about/photo.jpg",
+        ]:
+            path = self.media_root / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b"image")
+
+        post = Post.objects.create(
+            position=1,
+            cover_title="Post 1 Title",
+            cover_description="Post 1 Description",
+            cover_image="posts/post-1/cover.jpg",
+        )
+        Image.objects.create(
+            image="posts/post-1/block.jpg",
+            image_size=75,
+            image_alignment="center",
+            post=post,
+        )
+
+    def collect(self, **options) -> str:
+        out = StringIO()
+        call_command("collect_orphaned_media", stdout=out, grace_period=0, **options)
+        return out.getvalue()
+
+    def test_dry_run_reports_orphans_without_deleting_them(self):
+        out = self.collect(dry_run=True)
+
+        self.assertIn("Orphan posts/post-1/orphan.jpg (5 bytes)", out)
+        self.assertIn("Orphan posts/post-2/orphan.jpg (5 bytes)", out)
+        self.assertIn("Listed 4 files. Found 2 orphans (10 bytes), 0 failed.", out)
+        self.assertTrue((self.media_root / "posts/post-1/orphan.jpg").exists())
+
+    def test_orphans_are_deleted_page_by_page(self):
+        with mock.patch(
+            "webapp.management.commands.collect_orphaned_media.iter_file_pages",
+            side_effect=lambda storage, prefix: iter_file_pages(storage, prefix, 1),
+        ):
+            out = self.collect()
+
+        self.assertIn("Deleted 2 orphans", out)
+        self.assertFalse((self.media_root / "posts/post-1/orphan.jpg").exists())
+        self.assertFalse((self.media_root / "posts/post-2/orphan.jpg").exists())
+        self.assertTrue((self.media_root / "posts/post-1/cover.jpg").exists())
+        self.assertTrue((self.media_root / "posts/post-1/block.jpg").exists())
+        self.assertTrue((self.media_root / "about/photo.jpg").exists())
+
+    def test_recent_uploads_are_kept(self):
+        out = StringIO()
+        call_command("collect_orphaned_media", stdout=out)
+
+        self.assertIn("Deleted 0 orphans", out.getvalue())
+        self.assertTrue((self.media_root / "posts/post-1/orphan.jpg").exists())
+
+
+class TestGenerateImageVariantsCommand(TestCase):
+    def setUp(self):
+        use_file_system_storage(self)
+
+    def test_derivatives_and_metadata_are_generated_for_existing_images(self):
+        buffer = io.BytesIO()
+        PILImage.new("RGB", (800, 400), "teal").save(buffer, "JPEG")
+        name = default_storage.save(
+            "posts/post-1/cover.jpg", ContentFile(buffer.getvalue())
+        )
+        post = Post.objects.create(
+            position=1,
+            cover_title="Post 1 Title",
+            cover_description="Post 1 Description",
+            cover_image=name,
+        )
+        Image.objects.create(
+            image="posts/post-1/missing.jpg",
+            image_size=75,
+            image_alignment="center",
+            post=post,
+        )
+
+        out = StringIO()
+        call_command("generate_image_variants", stdout=out, stderr=StringIO())
+
+        self.assertIn("Generated derivatives of 1 images, 1 failed.", out.getvalue())
+        post.refresh_from_db()
+        self.assertEqual(
+            [variant["width"] for variant in post.cover_image_variants],
+            [320, 640, 800],
+        )
+        self.assertEqual((post.cover_image_width, post.cover_image_height), (800, 400))
+
+
+class TestSendTelegramNotificationsCommand(TestCase):
+    def setUp(self):
+        Message.objects.create(email="test@test.com", content="Test Content")
+        self.notification = TelegramNotification.objects.get()
+
+    def send(self, **options) -> str:
+        out = StringIO()
+        call_command("send_telegram_notifications", stdout=out, **options)
+        return out.getvalue()
+
+    def test_notifications_are_sent_in_batches(self):
+        Message.objects.create(email="test_2@test.com", content="Test Content 2")
+        Message.objects.create(email="test_3@test.com", content="Test Content 3")
+
+        with mock.patch(
+            "webapp.management.commands.send_telegram_notifications.send_telegram_message"
+        ) as send_telegram_message:
+            out = self.send(batch_size=2)
+
+        self.assertIn("Sent 3 notifications, 0 failed.", out)
+        self.assertEqual(send_telegram_message.call_count, 3)
+        self.assertFalse(
+            TelegramNotification.objects.filter(sent_at__isnull=True).exists()
+        )
+
+        # Sent notifications are not sent again
+        with mock.patch(
+            "webapp.management.commands.send_telegram_notifications.send_telegram_message"
+        ) as send_telegram_message:
+            self.send()
+        send_telegram_message.assert_not_called()
+
+    def test_failed_notification_is_retried_with_backoff(self):
+        with mock.patch(
+            "webapp.management.commands.send_telegram_notifications.send_telegram_message",
+            side_effect=TelegramError("Error sending message: Bad Gateway"),
+        ):
+            out = self.send()
+            self.assertIn("Sent 0 notifications, 1 failed.", out)
+
+            # The retry is not due yet
+            self.assertIn("Sent 0 notifications, 0 failed.", self.send())
+
+        self.notification.refresh_from_db()
+        self.assertEqual(self.notification.attempts, 1)
+        self.assertEqual(
+            self.notification.last_error, "Error sending message: Bad Gateway"
+        )
+        self.assertGreater(self.notification.next_attempt_at, now())
+
+        TelegramNotification.objects.update(next_attempt_at=now())
+        with mock.patch(
+            "webapp.management.commands.send_telegram_notifications.send_telegram_message"
+        ):
+            self.send()
+
+        self.notification.refresh_from_db()
+        self.assertEqual(self.notification.attempts, 2)
+        self.assertIsNotNone(self.notification.sent_at)
+
+    def test_notification_is_given_up_after_max_attempts(self):
+        TelegramNotification.objects.update(attempts=3)
+
+        with mock.patch(
+            "webapp.management.commands.send_telegram_notifications.send_telegram_message"
+        ) as send_telegram_message:
+            self.send(max_attempts=3)
+
+        send_telegram_message.assert_not_called()
+
+
+@override_settings(TELEGRAM_DIGEST_WINDOW=300)
+class TestTelegramNotificationDigest(TestCase):
+    def setUp(self):
+        self.post_1 = Post.objects.create(
+            position=1,
+            cover_title="Post 1 Title",
+            cover_description="Post 1 Description",
+        )
+        self.post_2 = Post.objects.create(
+            position=2,
+            cover_title="Post 2 Title",
+            cover_description="Post 2 Description",
+        )
+        self.user_1 = User.objects.create_user(
+            email="test_user_1@test.com", username="test_user_1"
+        )
+        self.user_2 = User.objects.create_user(
+            email="test_user_2@test.com", username="test_user_2"
+        )
+
+        Comment.objects.create(post=self.post_1, author=self.user_1, content="1")
+        Comment.objects.create(post=self.post_1, author=self.user_2, content="2")
+        Comment.objects.create(post=self.post_2, author=self.user_1, content="3")
+        Message.objects.create(email="test@test.com", content="Test Content")
+
+        # Every notification was created at the start of a past digest window
+        self.window_start = time.time() // 300 * 300 - 600
+        TelegramNotification.objects.update(
+            created_at=datetime.fromtimestamp(self.window_start + 10, tz=timezone.utc)
+        )
+
+    def send_at(self, timestamp: float, **options) -> list[str]:
+        with (
+            mock.patch(
+                "webapp.management.commands.send_telegram_notifications.time.time",
+                return_value=timestamp,
+            ),
+            mock.patch(
+                "webapp.management.commands.send_telegram_notifications.send_telegram_message"
+            ) as send_telegram_message,
+        ):
+            call_command("send_telegram_notifications", stdout=StringIO(), **options)
+        return [call.args[0] for call in send_telegram_message.call_args_list]
+
+    def test_digest_kinds_wait_for_end_of_window(self):
+        texts = self.send_at(self.window_start + 20)
+
+        self.assertEqual(len(texts), 1)
+        self.assertIn("<b>New Message</b>", texts[0])
+
+    def test_digest_kinds_are_sent_as_one_summary_per_kind(self):
+        texts = self.send_at(self.window_start + 310)
+
+        self.assertEqual(len(texts), 3)
+        comments_digest = next(text for text in texts if "New Comments" in text)
+        self.assertIn("<b>3 New Comments</b> on 2 posts", comments_digest)
+        self.assertIn("🚀Post 1 Title (2)", comments_digest)
+        self.assertIn("🚀Post 2 Title (1)", comments_digest)
+
+        users_digest = next(text for text in texts if "New Users" in text)
+        self.assertIn("<b>2 New Users</b>", users_digest)
+        self.assertIn("📧 test_user_1@test.com", users_digest)
+
+        self.assertFalse(
+            TelegramNotification.objects.filter(sent_at__isnull=True).exists()
+        )
+
+    def test_digest_summarizes_every_due_notification(self):
+        for index in range(12):
+            Comment.objects.create(
+                post=self.post_2, author=self.user_2, content=f"Comment {index}"
+            )
+        TelegramNotification.objects.update(
+            created_at=datetime.fromtimestamp(self.window_start + 10, tz=timezone.utc)
+        )
+
+        texts = self.send_at(self.window_start + 310, batch_size=1)
+
+        comments_digest = next(text for text in texts if "New Comments" in text)
+        self.assertIn("<b>15 New Comments</b> on 2 posts", comments_digest)
+        self.assertIn("🚀Post 2 Title (13)", comments_digest)
+        self.assertFalse(
+            TelegramNotification.objects.filter(sent_at__isnull=True).exists()
+        )
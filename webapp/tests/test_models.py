@@ -1,8 +1,30 @@
-from django.db.models import Max
-from django.test import TestCase
+import hashlib
+import io
+import threading
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from PIL import Image as PILImage
 
 from users.models import User
-from webapp.models import Post, Image, Tag, Text, Space, ContentType, Block, Comment
+from webapp.helpers.images import store_images
+from webapp.models import (
+    Post,
+    Image,
+    Tag,
+    Block,
+    Comment,
+    PendingMediaDeletion,
+    TelegramNotification,
+)
+from webapp.tests.helpers import use_file_system_storage
 
 
 USER_EMAIL = "test_user@test.com"
@@ -12,6 +34,18 @@ SUPERUSER_EMAIL = "test_superuser@test.com"
 SUPERUSER_PASSWORD = "test_sdff3987r3uifss"
 
 
+def image_upload(name: str = "cover.jpg", size: tuple[int, int] = (1000, 500)):
+    """Returns an uploaded JPEG image of the given size."""
+    buffer = io.BytesIO()
+    PILImage.new("RGB", size, "teal").save(buffer, "JPEG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+
+def generate_image_variants():
+    """Generates the derivatives of uploaded images, as the worker does."""
+    call_command("generate_image_variants", stdout=StringIO(), stderr=StringIO())
+
+
 class TestModels(TestCase):
 
     def setUp(self):
@@ -28,12 +62,6 @@ class TestModels(TestCase):
             image_alignment="center",
             post=self.post,
         )
-        self.text = Text.objects.create(
-            text="Test Text",
-            text_type="normal",
-            text_alignment="center",
-        )
-        self.space = Space.objects.create(space_number=1)
 
     def test_create_post(self):
         """Test creating a Post instance."""
@@ -92,66 +120,339 @@ class TestModels(TestCase):
         )
         self.assertEqual(str(image), expected_str)
 
-    def test_create_text(self):
-        """Test creating a Text instance linked to a Post."""
-        text = Text.objects.create(
+    def test_create_text_block(self):
+        """Test creating a text Block instance linked to a Post."""
+        block = Block.objects.create(
+            post=self.post,
+            block_type=Block.BlockType.TEXT,
+            block_position=1,
             text="Test Text",
             text_type="normal",
             text_alignment="center",
         )
-        self.assertEqual(text.text, "Test Text")
-        self.assertEqual(text.text_type, "normal")
-        self.assertEqual(text.text_alignment, "center")
-        self.assertIsInstance(text, Text)
+        self.assertEqual(block.text, "Test Text")
+        self.assertEqual(block.text_type, "normal")
+        self.assertEqual(block.text_alignment, "center")
+        self.assertIsInstance(block, Block)
+
+    def test_create_space_block(self):
+        """Test creating a space Block instance linked to a Post."""
+        block = Block.objects.create(
+            post=self.post,
+            block_type=Block.BlockType.SPACE,
+            block_position=1,
+            space_number=1,
+        )
+        self.assertEqual(block.space_number, 1)
+        self.assertIsInstance(block, Block)
+
+    def test_block_str(self):
+        """Test the string representation of Block."""
+        block = Block.objects.create(
+            post=self.post,
+            block_type=Block.BlockType.SPACE,
+            block_position=1,
+            space_number=1,
+        )
+        expected_str = f"Block: space | Position: {block.block_position}"
+        self.assertEqual(str(block), expected_str)
 
-    def test_text_str(self):
-        """Test the string representation of Text."""
-        text = Text.objects.create(
+    def test_post_content(self):
+        """Test that blocks of every type are loaded in one query."""
+        Block.objects.create(
+            post=self.post,
+            block_type=Block.BlockType.IMAGE,
+            block_position=1,
+            image=self.image,
+        )
+        Block.objects.create(
+            post=self.post,
+            block_type=Block.BlockType.TEXT,
+            block_position=2,
             text="Test Text",
-            text_type="normal",
-            text_alignment="center",
         )
-        expected_str = text.text
-        self.assertEqual(str(text), expected_str)
+        Block.objects.create(
+            post=self.post,
+            block_type=Block.BlockType.SPACE,
+            block_position=3,
+            space_number=1,
+        )
 
-    def test_create_space(self):
-        """Test creating a Space instance linked to a Post."""
-        space = Space.objects.create(space_number=1)
-        self.assertEqual(space.space_number, 1)
-        self.assertIsInstance(space, Space)
+        with self.assertNumQueries(1):
+            blocks = list(self.post.blocks.all())
+            self.assertEqual(blocks[0].image, self.image)
+            self.assertEqual(blocks[1].text, "Test Text")
+            self.assertEqual(blocks[2].space_number, 1)
 
-    def test_space_str(self):
-        """Test the string representation of Space."""
-        space = Space.objects.create(space_number=1)
-        expected_str = f"Space Number: {space.space_number}"
-        self.assertEqual(str(space), expected_str)
+    def test_block_position_at_uses_gaps_between_blocks(self):
+        """Test that a block is placed between its neighbours without renumbering."""
+        block_1 = Block.objects.create(
+            post=self.post,
+            block_type=Block.BlockType.SPACE,
+            block_position=Block.objects.next_position(self.post.id),
+            space_number=1,
+        )
+        block_2 = Block.objects.create(
+            post=self.post,
+            block_type=Block.BlockType.SPACE,
+            block_position=Block.objects.next_position(self.post.id),
+            space_number=2,
+        )
 
-    def test_post_content(self):
-        """Test creating PostContent instances for different content types."""
+        position = Block.objects.position_at(self.post.id, 1)
 
-        for content in [self.image, self.text, self.space]:
-            object_type = ContentType.objects.get_for_model(content)
-            max_position = Block.objects.filter(post=self.post).aggregate(
-                Max("block_position")
+        self.assertEqual(block_1.block_position, Block.POSITION_GAP)
+        self.assertEqual(block_2.block_position, 2 * Block.POSITION_GAP)
+        self.assertEqual(position, Block.POSITION_GAP * 3 // 2)
+
+    def test_block_position_at_rebalances_when_no_gap_is_left(self):
+        """Test that the blocks are spread out when two neighbours are adjacent."""
+        for position in [1, 2]:
+            Block.objects.create(
+                post=self.post,
+                block_type=Block.BlockType.SPACE,
+                block_position=position,
+                space_number=position,
+            )
+
+        position = Block.objects.position_at(self.post.id, 1)
+
+        self.assertEqual(
+            list(self.post.blocks.values_list("block_position", flat=True)),
+            [Block.POSITION_GAP, 2 * Block.POSITION_GAP],
+        )
+        self.assertEqual(position, Block.POSITION_GAP * 3 // 2)
+
+    def test_post_position_save_skips_cover_image_checks(self):
+        """Test that saving a loaded post with the same cover only runs the UPDATE."""
+        post = Post.objects.get(pk=self.post.pk)
+        post.position = 2
+
+        with self.assertNumQueries(1):
+            post.save()
+
+        self.assertFalse(PendingMediaDeletion.objects.exists())
+
+    def test_post_cover_image_change_deletes_old_image(self):
+        """Test that replacing the cover queues the previously stored image once."""
+        post = Post.objects.get(pk=self.post.pk)
+        post.cover_image = "new_image.jpg"
+
+        post.save()
+        post.cover_title = "New Title"
+        post.save()
+
+        self.assertEqual(
+            list(PendingMediaDeletion.objects.values_list("name", flat=True)),
+            ["test_image.jpg"],
+        )
+
+    def test_cover_upload_generates_derivatives(self):
+        """Test that a new cover gets width-stepped derivatives after upload."""
+        use_file_system_storage(self)
+        post = Post.objects.create(
+            cover_title="Post With Cover",
+            cover_description="Description",
+            cover_image=image_upload(),
+        )
+        self.assertEqual(post.cover_image_variants, [])
+
+        generate_image_variants()
+        post.refresh_from_db()
+
+        widths = [variant["width"] for variant in post.cover_image_variants]
+        self.assertEqual(widths, [320, 640, 960, 1000])
+        for variant in post.cover_image_variants:
+            self.assertEqual(
+                variant["name"],
+                f"{post.cover_image.name}.w{variant['width']}.{variant['format']}",
             )
-            position = (
-                max_position["block_position__max"] + 1
-                if max_position["block_position__max"]
-                else 1
+            with default_storage.open(variant["name"]) as file:
+                self.assertEqual(PILImage.open(file).width, variant["width"])
+
+    def test_uploads_are_named_after_their_content(self):
+        """Test that identical uploads are stored once, under their content hash."""
+        use_file_system_storage(self)
+        upload = image_upload("Cover Photo.JPG")
+        digest = hashlib.sha256(upload.read()).hexdigest()
+        upload.seek(0)
+
+        post = Post.objects.create(
+            cover_title="Post With Cover",
+            cover_description="Description",
+            cover_image=upload,
+        )
+        with mock.patch.object(
+            default_storage, "save", wraps=default_storage.save
+        ) as save:
+            image = Image.objects.create(
+                image=image_upload("copy.jpg"),
+                image_size=50,
+                image_alignment="center",
+                post=self.post,
+            )
+
+        self.assertEqual(post.cover_image.name, f"posts/{digest}.jpg")
+        self.assertEqual(image.image.name, post.cover_image.name)
+        self.assertEqual(image.image_variants, post.cover_image_variants)
+        self.assertEqual((image.image_width, image.image_height), (1000, 500))
+        save.assert_not_called()
+
+    def test_images_are_stored_with_a_storage_per_thread(self):
+        """Test that concurrent uploads never share a storage and its S3 client."""
+        use_file_system_storage(self)
+        images = [
+            Image(
+                image=image_upload(f"{index}.jpg", (100 + index, 50)),
+                image_size=100,
+                image_alignment="center",
+                post=self.post,
+            )
+            for index in range(4)
+        ]
+        savers = set()
+        original_save = FileSystemStorage.save
+
+        def save(storage, *args, **kwargs):
+            savers.add(id(storage))
+            return original_save(storage, *args, **kwargs)
+
+        with mock.patch.object(
+            FileSystemStorage, "save", autospec=True, side_effect=save
+        ) as save_mock:
+            store_images(images, "image", workers=2)
+
+        self.assertEqual(save_mock.call_count, 4)
+        self.assertLessEqual(len(savers), 2)
+        self.assertNotIn(id(default_storage._wrapped), savers)
+        for image in images:
+            self.assertIs(image.image.storage, default_storage)
+            self.assertTrue(default_storage.exists(image.image.name))
+
+    def test_cover_upload_stores_image_metadata(self):
+        """Test that dimensions, color and placeholder are stored at upload."""
+        use_file_system_storage(self)
+        post = Post.objects.create(
+            cover_title="Post With Cover",
+            cover_description="Description",
+            cover_image=image_upload(size=(1000, 500)),
+        )
+        post = Post.objects.get(pk=post.pk)
+
+        self.assertEqual((post.cover_image_width, post.cover_image_height), (1000, 500))
+        self.assertRegex(post.cover_image_color, r"^#[0-9a-f]{6}$")
+        self.assertTrue(
+            post.cover_image_placeholder.startswith("data:image/webp;base64,")
+        )
+        self.assertLess(len(post.cover_image_placeholder), 1000)
+
+    def test_cover_replacement_queues_old_derivatives(self):
+        """Test that the derivatives of a replaced cover are deleted with it."""
+        use_file_system_storage(self)
+        post = Post.objects.create(
+            cover_title="Post With Cover",
+            cover_description="Description",
+            cover_image=image_upload(size=(400, 200)),
+        )
+        generate_image_variants()
+        post.refresh_from_db()
+        old_names = [post.cover_image.name] + [
+            variant["name"] for variant in post.cover_image_variants
+        ]
+
+        post.cover_image = image_upload(size=(200, 100))
+        post.save()
+
+        self.assertEqual(
+            sorted(PendingMediaDeletion.objects.values_list("name", flat=True)),
+            sorted(old_names),
+        )
+        self.assertEqual(post.cover_image_variants, [])
+
+        generate_image_variants()
+        post.refresh_from_db()
+        self.assertEqual(
+            [variant["width"] for variant in post.cover_image_variants], [200]
+        )
+
+    def test_post_position_is_allocated_after_existing_posts(self):
+        """Test that new posts follow posts whose position was set explicitly."""
+        Post.objects.create(
+            position=5, cover_title="Post 5 Title", cover_description="Description"
+        )
+
+        post_6 = Post.objects.create(
+            cover_title="Post 6 Title", cover_description="Description"
+        )
+        post_7 = Post.objects.create(
+            cover_title="Post 7 Title", cover_description="Description"
+        )
+
+        self.assertEqual(post_6.position, 6)
+        self.assertEqual(post_7.position, 7)
+
+    def test_block_next_position_follows_reordered_blocks(self):
+        """Test that an appended block follows blocks renumbered by a reorder."""
+        block_ids = [
+            Block.objects.create(
+                post=self.post,
+                block_type=Block.BlockType.SPACE,
+                block_position=position,
+                space_number=position,
+            ).id
+            for position in [1, 2, 3]
+        ]
+        Block.objects.next_position(self.post.id)
+
+        Block.objects.reorder(self.post.id, block_ids)
+
+        self.assertEqual(
+            Block.objects.next_position(self.post.id), 4 * Block.POSITION_GAP
+        )
+
+    def test_image_delete_deletes_block(self):
+        """Test that deleting an Image also deletes its Block."""
+        block = Block.objects.create(
+            post=self.post,
+            block_type=Block.BlockType.IMAGE,
+            block_position=1,
+            image=self.image,
+        )
+        self.image.delete()
+        self.assertFalse(Block.objects.filter(id=block.id).exists())
+
+    def test_post_delete_queues_media_without_touching_post(self):
+        """Test that a cascade delete does not touch the post for every block."""
+        for position in range(1, 51):
+            image = Image.objects.create(
+                image=f"block_image_{position}.jpg",
+                image_size=75,
+                image_alignment="center",
+                post=self.post,
             )
             Block.objects.create(
                 post=self.post,
-                object_type=object_type,
-                object_id=content.id,
+                block_type=Block.BlockType.IMAGE,
                 block_position=position,
+                image=image,
             )
 
-        # Check if PostContent instances are created correctly
-        post_contents = Block.objects.filter(post=self.post)
-        self.assertEqual(post_contents.count(), 3)
-        self.assertEqual(post_contents[0].content_object, self.image)
-        self.assertEqual(post_contents[1].content_object, self.text)
-        self.assertEqual(post_contents[2].content_object, self.space)
+        with CaptureQueriesContext(connection) as queries:
+            self.post.delete()
+
+        statements = [query["sql"] for query in queries.captured_queries]
+        self.assertEqual(
+            sum(sql.startswith('UPDATE "webapp_post"') for sql in statements), 0
+        )
+        self.assertEqual(
+            sum(
+                sql.startswith('INSERT INTO "webapp_pendingmediadeletion"')
+                for sql in statements
+            ),
+            1,
+        )
+        # The 50 block images, the image of `setUp` and the cover
+        self.assertEqual(PendingMediaDeletion.objects.count(), 52)
 
     def test_comment_creation(self):
         """Test creating a comment instance."""
@@ -185,3 +486,102 @@ class TestModels(TestCase):
         )
         expected_str = f"{USER_EMAIL}: Test Content"
         self.assertEqual(str(comment), expected_str)
+
+    def test_comment_creation_queues_telegram_notification(self):
+        """Test that a new comment is queued instead of being sent right away."""
+        user = User.objects.create_user(
+            email=USER_EMAIL,
+            password=USER_PASSWORD,
+        )
+
+        with mock.patch("requests.post") as post:
+            Comment.objects.create(
+                post=self.post,
+                author=user,
+                content="Test Content",
+            )
+        post.assert_not_called()
+
+        notification = TelegramNotification.objects.get(
+            kind=TelegramNotification.Kind.COMMENT
+        )
+        self.assertIn("Test Content", notification.text)
+        self.assertIsNone(notification.sent_at)
+        self.assertTrue(
+            TelegramNotification.objects.filter(
+                kind=TelegramNotification.Kind.USER
+            ).exists()
+        )
+
+
+@skipUnless(
+    connection.vendor == "postgresql",
+    "Concurrent writers need a database with row-level locking.",
+)
+class TestConcurrentPositionAllocation(TransactionTestCase):
+    WRITERS = 8
+    CREATES_PER_WRITER = 10
+
+    def run_writers(self, create):
+        """
+        Runs `create(writer_number)` in parallel writers, each with its own connection.
+        """
+        barrier = threading.Barrier(self.WRITERS)
+        errors = []
+
+        def writer(number):
+            try:
+                barrier.wait()
+                for _ in range(self.CREATES_PER_WRITER):
+                    create(number)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=writer, args=(number,))
+            for number in range(self.WRITERS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+
+    def test_parallel_post_creates_get_unique_positions(self):
+        self.run_writers(
+            lambda number: Post.objects.create(
+                cover_title="Test Title", cover_description="Test Description"
+            )
+        )
+
+        positions = list(Post.objects.values_list("position", flat=True))
+        self.assertEqual(len(positions), self.WRITERS * self.CREATES_PER_WRITER)
+        self.assertEqual(len(set(positions)), len(positions))
+
+    def test_parallel_block_creates_get_unique_positions(self):
+        post = Post.objects.create(
+            cover_title="Test Title", cover_description="Test Description"
+        )
+
+        def create_block(number):
+            # Appends and inserts lock the positions of the post in the same way
+            with transaction.atomic():
+                if number % 2:
+                    block_position = Block.objects.next_position(post.id)
+                else:
+                    block_position = Block.objects.position_at(post.id, 0)
+                Block.objects.create(
+                    post=post,
+                    block_type=Block.BlockType.SPACE,
+                    block_position=block_position,
+                    space_number=1,
+                )
+
+        self.run_writers(create_block)
+
+        positions = list(post.blocks.values_list("block_position", flat=True))
+        self.assertEqual(len(positions), self.WRITERS * self.CREATES_PER_WRITER)
+        self.assertEqual(len(set(positions)), len(positions))
@@ -0,0 +1,273 @@
+import base64
+import json
+from datetime import datetime, timezone
+from unittest import mock
+
+from asgiref.sync import iscoroutinefunction
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from webapp.helpers.storage import (
+    CachedSignedURLS3Storage,
+    StoredFile,
+    delete_files,
+    iter_file_pages,
+)
+from webapp.middleware import CloudFrontSignedCookieMiddleware
+
+CLOUDFRONT_DOMAIN = "media.test.com"
+CLOUDFRONT_KEY_ID = "TESTKEYID"
+
+
+CLOUDFRONT_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+CLOUDFRONT_KEY_PEM = CLOUDFRONT_KEY.private_bytes(
+    encoding=serialization.Encoding.PEM,
+    format=serialization.PrivateFormat.TraditionalOpenSSL,
+    encryption_algorithm=serialization.NoEncryption(),
+).decode()
+
+SIGNED_STORAGES = {
+    "default": {
+        "BACKEND": "webapp.helpers.storage.CachedSignedURLS3Storage",
+        "OPTIONS": {
+            "custom_domain": CLOUDFRONT_DOMAIN,
+            "cloudfront_key_id": CLOUDFRONT_KEY_ID,
+            "cloudfront_key": CLOUDFRONT_KEY_PEM,
+            "querystring_auth": False,
+        },
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
+
+
+def cloudfront_b64decode(value: str) -> bytes:
+    return base64.b64decode(
+        value.replace("-", "+").replace("_", "=").replace("~", "/")
+    )
+
+
+@override_settings(SIGNED_URL_REFRESH_MARGIN=60)
+class TestCachedSignedURLS3Storage(TestCase):
+    def setUp(self):
+        self.storage = CachedSignedURLS3Storage(
+            custom_domain=CLOUDFRONT_DOMAIN,
+            cloudfront_key_id=CLOUDFRONT_KEY_ID,
+            cloudfront_key=CLOUDFRONT_KEY_PEM,
+            querystring_expire=3600,
+        )
+        self.storage.memo.clear()
+        cache.clear()
+
+    def test_signed_url_is_memoized_per_name(self):
+        signer = self.storage.cloudfront_signer
+
+        with mock.patch.object(
+            signer, "generate_presigned_url", wraps=signer.generate_presigned_url
+        ) as generate_presigned_url:
+            url_1 = self.storage.url("posts/test/image_1.jpg")
+            url_2 = self.storage.url("posts/test/image_1.jpg")
+            url_3 = self.storage.url("posts/test/image_2.jpg")
+
+        self.assertEqual(url_1, url_2)
+        self.assertNotEqual(url_1, url_3)
+        self.assertIn(f"Key-Pair-Id={CLOUDFRONT_KEY_ID}", url_1)
+        self.assertEqual(generate_presigned_url.call_count, 2)
+
+    def test_signed_url_is_shared_between_processes(self):
+        url = self.storage.url("posts/test/image_1.jpg")
+
+        # Another process starts with an empty local memo
+        self.storage.memo.clear()
+
+        with mock.patch.object(
+            self.storage.cloudfront_signer, "generate_presigned_url"
+        ) as generate_presigned_url:
+            self.assertEqual(self.storage.url("posts/test/image_1.jpg"), url)
+
+        generate_presigned_url.assert_not_called()
+
+    def test_signed_url_is_renewed_before_expiry(self):
+        self.storage.url("posts/test/image_1.jpg")
+
+        # Less than SIGNED_URL_REFRESH_MARGIN seconds are left before the URL expires
+        with (
+            mock.patch("webapp.helpers.storage.time.time", return_value=10**10),
+            mock.patch.object(
+                self.storage.cloudfront_signer,
+                "generate_presigned_url",
+                return_value="https://media.test.com/posts/test/image_1.jpg?renewed",
+            ) as generate_presigned_url,
+        ):
+            self.storage.url("posts/test/image_1.jpg")
+
+        generate_presigned_url.assert_called_once()
+
+    async def test_async_url_is_shared_with_sync_url(self):
+        url = await self.storage.aurl("posts/test/image_1.jpg")
+
+        with mock.patch.object(
+            self.storage.cloudfront_signer, "generate_presigned_url"
+        ) as generate_presigned_url:
+            self.assertEqual(self.storage.url("posts/test/image_1.jpg"), url)
+            self.assertEqual(await self.storage.aurl("posts/test/image_1.jpg"), url)
+
+        generate_presigned_url.assert_not_called()
+
+
+@override_settings(SIGNED_URL_REFRESH_MARGIN=60)
+class TestCloudFrontSignedCookies(TestCase):
+    def setUp(self):
+        self.storage = CachedSignedURLS3Storage(
+            custom_domain=CLOUDFRONT_DOMAIN,
+            cloudfront_key_id=CLOUDFRONT_KEY_ID,
+            cloudfront_key=CLOUDFRONT_KEY_PEM,
+            querystring_auth=False,
+            querystring_expire=3600,
+        )
+        cache.clear()
+
+    def test_media_urls_are_not_signed_in_cookie_mode(self):
+        self.assertEqual(
+            self.storage.url("posts/test/image_1.jpg"),
+            f"https://{CLOUDFRONT_DOMAIN}/posts/test/image_1.jpg",
+        )
+
+    def test_signed_cookies_authorize_media_prefix(self):
+        cookies, _ = self.storage.signed_cookies("posts/")
+
+        policy = cloudfront_b64decode(cookies["CloudFront-Policy"])
+        statement = json.loads(policy)["Statement"][0]
+
+        self.assertEqual(statement["Resource"], f"https://{CLOUDFRONT_DOMAIN}/posts/*")
+        self.assertEqual(cookies["CloudFront-Key-Pair-Id"], CLOUDFRONT_KEY_ID)
+
+        # Raises InvalidSignature if the policy is not signed with the CloudFront key
+        CLOUDFRONT_KEY.public_key().verify(
+            cloudfront_b64decode(cookies["CloudFront-Signature"]),
+            policy,
+            padding.PKCS1v15(),
+            hashes.SHA1(),
+        )
+
+    def test_signed_cookies_are_signed_once_per_period(self):
+        cookies, _ = self.storage.signed_cookies("posts/")
+
+        with mock.patch.object(
+            self.storage.cloudfront_signer, "rsa_signer"
+        ) as rsa_signer:
+            self.assertEqual(self.storage.signed_cookies("posts/")[0], cookies)
+
+        rsa_signer.assert_not_called()
+
+    @override_settings(
+        AWS_CLOUDFRONT_SIGNED_COOKIES=True,
+        AWS_CLOUDFRONT_COOKIE_DOMAIN=".test.com",
+        STORAGES=SIGNED_STORAGES,
+    )
+    def test_signed_cookies_are_issued_once_per_browser(self):
+        response = self.client.get(reverse("webapp:about_me"))
+
+        for name in ["CloudFront-Policy", "CloudFront-Signature", "CloudFront-Key-Pair-Id"]:
+            self.assertIn(name, response.cookies)
+            self.assertEqual(response.cookies[name]["domain"], ".test.com")
+
+        response = self.client.get(reverse("webapp:about_me"))
+        self.assertNotIn("CloudFront-Policy", response.cookies)
+
+    @override_settings(
+        AWS_CLOUDFRONT_SIGNED_COOKIES=True,
+        AWS_CLOUDFRONT_COOKIE_DOMAIN=".test.com",
+        STORAGES=SIGNED_STORAGES,
+    )
+    async def test_signed_cookies_are_issued_to_async_requests(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        middleware = CloudFrontSignedCookieMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        response = await middleware(RequestFactory().get("/"))
+        self.assertIn("CloudFront-Policy", response.cookies)
+
+        policy = response.cookies["CloudFront-Policy"].value
+        request = RequestFactory().get("/")
+        request.COOKIES["CloudFront-Policy"] = policy
+        response = await middleware(request)
+        self.assertNotIn("CloudFront-Policy", response.cookies)
+
+
+class TestS3BatchOperations(TestCase):
+    def test_s3_files_are_deleted_in_batches_of_1000(self):
+        storage = CachedSignedURLS3Storage(bucket_name="test-bucket", location="media")
+        bucket = mock.Mock()
+        bucket.delete_objects.side_effect = [
+            {},
+            {
+                "Errors": [
+                    {
+                        "Key": "media/posts/image_1500.jpg",
+                        "Code": "AccessDenied",
+                        "Message": "Access Denied",
+                    }
+                ]
+            },
+            {},
+        ]
+        names = [f"posts/image_{index}.jpg" for index in range(2500)]
+
+        with mock.patch.object(
+            CachedSignedURLS3Storage, "bucket", new_callable=mock.PropertyMock
+        ) as bucket_property:
+            bucket_property.return_value = bucket
+            errors = delete_files(storage, names)
+
+        self.assertEqual(errors, {"posts/image_1500.jpg": "AccessDenied: Access Denied"})
+        batches = [
+            call.kwargs["Delete"]["Objects"] for call in bucket.delete_objects.call_args_list
+        ]
+        self.assertEqual([len(batch) for batch in batches], [1000, 1000, 500])
+        self.assertEqual(batches[0][0], {"Key": "media/posts/image_0.jpg"})
+
+    def test_s3_listing_is_streamed_page_by_page(self):
+        storage = CachedSignedURLS3Storage(bucket_name="test-bucket", location="media")
+        modified_at = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        connection = mock.Mock()
+        paginator = connection.meta.client.get_paginator.return_value
+        paginator.paginate.return_value = iter(
+            [
+                {
+                    "Contents": [
+                        {"Key": "media/posts/a.jpg", "Size": 1, "LastModified": modified_at},
+                        {"Key": "media/posts/b.jpg", "Size": 2, "LastModified": modified_at},
+                    ]
+                },
+                {"KeyCount": 0},
+            ]
+        )
+
+        with mock.patch.object(
+            CachedSignedURLS3Storage, "connection", new_callable=mock.PropertyMock
+        ) as connection_property:
+            connection_property.return_value = connection
+            pages = list(iter_file_pages(storage, "posts/", page_size=2))
+
+        self.assertEqual(
+            pages,
+            [
+                [
+                    StoredFile("posts/a.jpg", 1, modified_at),
+                    StoredFile("posts/b.jpg", 2, modified_at),
+                ]
+            ],
+        )
+        paginator.paginate.assert_called_once_with(
+            Bucket="test-bucket",
+            Prefix="media/posts/",
+            PaginationConfig={"PageSize": 2},
+        )
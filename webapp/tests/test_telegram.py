@@ -0,0 +1,133 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from webapp.helpers.telegram import (
+    CircuitOpenError,
+    TelegramError,
+    TelegramTransport,
+)
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers["Content-Length"]))
+        server.requests.append((self.path, self.client_address))
+        time.sleep(server.delay)
+
+        body = b'{"ok": true}' if server.status == 200 else b'{"ok": false}'
+        self.send_response(server.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestTelegramTransport(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeTelegramHandler)
+        self.server.daemon_threads = True
+        self.server.requests = []
+        self.server.status = 200
+        self.server.delay = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.transport = TelegramTransport(
+            token="TEST_TOKEN",
+            chat_id="TEST_CHAT_ID",
+            base_url=f"http://127.0.0.1:{self.server.server_port}",
+            read_timeout=0.5,
+            failure_threshold=2,
+            recovery_timeout=60,
+        )
+
+    def tearDown(self):
+        self.transport.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_messages_reuse_pooled_connection(self):
+        for _ in range(3):
+            self.transport.send_message("Test Message")
+
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(self.server.requests[0][0], "/botTEST_TOKEN/sendMessage")
+        # Every request is sent over the same keep-alive connection
+        self.assertEqual(len({address for _, address in self.server.requests}), 1)
+
+        stats = self.transport.stats
+        self.assertEqual(stats["sent"], 3)
+        self.assertEqual(stats["failed"], 0)
+        self.assertGreater(stats["average_latency"], 0)
+
+    def test_slow_response_is_bounded_by_read_timeout(self):
+        self.server.delay = 2
+
+        started_at = time.monotonic()
+        with self.assertRaises(TelegramError):
+            self.transport.send_message("Test Message")
+
+        self.assertLess(time.monotonic() - started_at, 1.5)
+        self.assertEqual(self.transport.stats["failed"], 1)
+
+    def test_error_status_raises_telegram_error(self):
+        self.server.status = 502
+
+        with self.assertRaisesMessage(TelegramError, '{"ok": false}'):
+            self.transport.send_message("Test Message")
+
+    def test_circuit_opens_after_repeated_failures(self):
+        self.server.status = 502
+        for _ in range(2):
+            with self.assertRaises(TelegramError):
+                self.transport.send_message("Test Message")
+
+        with self.assertRaises(CircuitOpenError):
+            self.transport.send_message("Test Message")
+
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertTrue(self.transport.stats["circuit_open"])
+        self.assertEqual(self.transport.stats["rejected"], 1)
+
+    def test_circuit_closes_after_successful_trial(self):
+        self.server.status = 502
+        for _ in range(2):
+            with self.assertRaises(TelegramError):
+                self.transport.send_message("Test Message")
+
+        self.server.status = 200
+        recovered_at = time.monotonic() + 61
+        with mock.patch(
+            "webapp.helpers.telegram.time.monotonic", return_value=recovered_at
+        ):
+            self.transport.send_message("Test Message")
+
+        self.assertFalse(self.transport.stats["circuit_open"])
+        self.transport.send_message("Test Message")
+        self.assertEqual(len(self.server.requests), 4)
+
+    def test_failed_trial_keeps_circuit_open(self):
+        self.server.status = 502
+        for _ in range(2):
+            with self.assertRaises(TelegramError):
+                self.transport.send_message("Test Message")
+
+        with mock.patch(
+            "webapp.helpers.telegram.time.monotonic",
+            return_value=time.monotonic() + 61,
+        ):
+            with self.assertRaises(TelegramError):
+                self.transport.send_message("Test Message")
+            with self.assertRaises(CircuitOpenError):
+                self.transport.send_message("Test Message")
+
+        self.assertEqual(len(self.server.requests), 3)
@@ -0,0 +1,407 @@
+import io
+from unittest import mock
+
+import boto3
+import requests
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from moto import mock_aws
+from PIL import Image as PILImage
+
+from users.models import User
+from webapp.models import Block, PendingMediaDeletion, Post, UploadSession
+from webapp.tests.helpers import use_file_system_storage
+
+SUPERUSER_EMAIL = "test_superuser@test.com"
+SUPERUSER_PASSWORD = "test_sdff3987r3uifss"
+
+BUCKET_NAME = "test-media"
+
+S3_STORAGES = {
+    "default": {
+        "BACKEND": "storages.backends.s3.S3Storage",
+        "OPTIONS": {
+            "bucket_name": BUCKET_NAME,
+            "access_key": "testing",
+            "secret_key": "testing",
+            "region_name": "us-east-1",
+            "custom_domain": None,
+            "querystring_auth": False,
+        },
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
+
+
+def jpeg_bytes(size: tuple[int, int] = (800, 400)) -> bytes:
+    """Returns a JPEG image of the given size."""
+    buffer = io.BytesIO()
+    PILImage.new("RGB", size, "teal").save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def bmp_bytes(size: tuple[int, int]) -> bytes:
+    """Returns an uncompressed image, which is larger than one S3 part."""
+    buffer = io.BytesIO()
+    PILImage.new("RGB", size, "teal").save(buffer, "BMP")
+    return buffer.getvalue()
+
+
+class ResumableUploadMixin:
+    def start_session(self, content: bytes, **data) -> dict:
+        response = self.client.post(
+            reverse("webapp:upload_session_create", args=[self.post.id]),
+            {
+                "filename": "photo.jpg",
+                "size": len(content),
+                "content_type": "image/jpeg",
+                "image_size": "100",
+                "image_alignment": "text-center",
+                **data,
+            },
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def put_chunk(self, session: dict, content: bytes, offset: int):
+        return self.client.put(
+            session["url"],
+            content[offset : offset + session["chunk_size"]],
+            content_type="application/octet-stream",
+            headers={"Upload-Offset": str(offset)},
+        )
+
+    def upload_chunks(self, session: dict, content: bytes) -> None:
+        for offset in range(0, len(content), session["chunk_size"]):
+            self.assertEqual(self.put_chunk(session, content, offset).status_code, 200)
+
+
+@mock_aws
+@override_settings(STORAGES=S3_STORAGES, DIRECT_UPLOAD_MAX_SIZE=1024 * 1024)
+class TestDirectUploads(TestCase):
+    """
+    Uploads go through the presigned POST flow against a mocked S3 bucket.
+    """
+
+    def setUp(self):
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET_NAME)
+
+        self.post = Post.objects.create(
+            position=1,
+            cover_title="Post Title",
+            cover_description="Post Description",
+        )
+        User.objects.create_superuser(
+            email=SUPERUSER_EMAIL,
+            password=SUPERUSER_PASSWORD,
+        )
+        self.client.login(email=SUPERUSER_EMAIL, password=SUPERUSER_PASSWORD)
+
+    def upload(self, content: bytes, content_type: str = "image/jpeg") -> str:
+        """Uploads the content like the browser does and returns its name."""
+        response = self.client.post(
+            reverse("webapp:direct_upload"),
+            {"filename": "Photo.JPG", "content_type": content_type},
+        )
+        self.assertEqual(response.status_code, 200)
+        presigned_post = response.json()
+
+        upload = requests.post(
+            presigned_post["url"],
+            data=presigned_post["fields"],
+            files={"file": ("Photo.JPG", content)},
+        )
+        self.assertLess(upload.status_code, 300)
+        return presigned_post["name"]
+
+    def test_presigned_post_is_limited_to_one_image_key(self):
+        response = self.client.post(
+            reverse("webapp:direct_upload"),
+            {"filename": "Photo.JPG", "content_type": "image/jpeg"},
+        )
+
+        presigned_post = response.json()
+        self.assertRegex(presigned_post["name"], r"^uploads/[0-9a-f]{32}\.jpg$")
+        self.assertEqual(presigned_post["fields"]["key"], presigned_post["name"])
+        self.assertEqual(presigned_post["fields"]["Content-Type"], "image/jpeg")
+
+    def test_presigned_post_rejects_other_content_types(self):
+        response = self.client.post(
+            reverse("webapp:direct_upload"),
+            {"filename": "script.html", "content_type": "text/html"},
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_post_create_with_direct_upload(self):
+        content = jpeg_bytes()
+        name = self.upload(content)
+
+        response = self.client.post(
+            reverse("webapp:post_create"),
+            {
+                "cover_title": "New Post",
+                "cover_description": "New Post Description",
+                "cover_image_key": name,
+            },
+        )
+
+        self.assertEqual(response.status_code, 302)
+        post = Post.objects.get(cover_title="New Post")
+        # The upload is copied within the bucket and keeps its random name
+        self.assertEqual(post.cover_image.name, name.replace("uploads/", "posts/"))
+        self.assertEqual((post.cover_image_width, post.cover_image_height), (800, 400))
+        # Derivatives are generated after the request by `generate_image_variants`
+        self.assertEqual(post.cover_image_variants, [])
+        stored = boto3.client("s3", region_name="us-east-1").head_object(
+            Bucket=BUCKET_NAME, Key=post.cover_image.name
+        )
+        self.assertEqual(stored["ContentLength"], len(content))
+        self.assertEqual(stored["ContentType"], "image/jpeg")
+        self.assertEqual(stored["CacheControl"], "public, max-age=31536000, immutable")
+        # The temporary upload is deleted by `delete_pending_media`
+        self.assertTrue(PendingMediaDeletion.objects.filter(name=name).exists())
+
+    def test_block_create_with_direct_upload(self):
+        name = self.upload(jpeg_bytes())
+
+        response = self.client.post(
+            reverse("webapp:block_create", args=[self.post.id]),
+            {"image_key": name, "image_size": "100", "image_alignment": "text-center"},
+        )
+
+        self.assertEqual(response.status_code, 302)
+        block = Block.objects.get(post=self.post)
+        self.assertEqual(block.block_type, Block.BlockType.IMAGE)
+        self.assertTrue(block.image.image.name.startswith("posts/"))
+        self.assertTrue(PendingMediaDeletion.objects.filter(name=name).exists())
+
+    def test_only_the_header_of_a_direct_upload_is_read(self):
+        name = self.upload(jpeg_bytes())
+
+        with mock.patch.object(
+            default_storage, "open", side_effect=AssertionError("Downloaded")
+        ):
+            response = self.client.post(
+                reverse("webapp:block_create", args=[self.post.id]),
+                {
+                    "image_key": name,
+                    "image_size": "100",
+                    "image_alignment": "text-center",
+                },
+            )
+
+        self.assertEqual(response.status_code, 302)
+        image = Block.objects.get(post=self.post).image
+        self.assertEqual((image.image_width, image.image_height), (800, 400))
+
+    def test_direct_upload_that_is_not_an_image_is_rejected(self):
+        name = self.upload(b"not an image")
+
+        response = self.client.post(
+            reverse("webapp:block_create", args=[self.post.id]),
+            {"image_key": name, "image_size": "100", "image_alignment": "text-center"},
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Block.objects.exists())
+
+    def test_keys_that_were_not_issued_are_rejected(self):
+        default_storage.save("posts/secret.jpg", io.BytesIO(jpeg_bytes()))
+
+        for key in ["posts/secret.jpg", f"uploads/{'0' * 32}.jpg"]:
+            response = self.client.post(
+                reverse("webapp:post_create"),
+                {
+                    "cover_title": "New Post",
+                    "cover_description": "New Post Description",
+                    "cover_image_key": key,
+                },
+            )
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(Post.objects.filter(cover_title="New Post").exists())
+
+
+@mock_aws
+@override_settings(STORAGES=S3_STORAGES, UPLOAD_CHUNK_SIZE=1024)
+class TestResumableUploadsToS3(ResumableUploadMixin, TestCase):
+    def setUp(self):
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET_NAME)
+
+        self.post = Post.objects.create(
+            position=1,
+            cover_title="Post Title",
+            cover_description="Post Description",
+        )
+        User.objects.create_superuser(
+            email=SUPERUSER_EMAIL,
+            password=SUPERUSER_PASSWORD,
+        )
+        self.client.login(email=SUPERUSER_EMAIL, password=SUPERUSER_PASSWORD)
+
+    def test_chunks_are_uploaded_as_multipart_parts(self):
+        content = bmp_bytes((1400, 1400))
+        session = self.start_session(content)
+        # S3 parts are at least 5 MB, whatever the chunk size setting
+        self.assertEqual(session["chunk_size"], 5 * 1024 * 1024)
+
+        self.upload_chunks(session, content)
+        # The joined upload is validated from its header and copied within S3
+        with mock.patch.object(
+            default_storage, "open", side_effect=AssertionError("Downloaded")
+        ):
+            response = self.client.post(session["commit_url"])
+
+        self.assertEqual(response.status_code, 302)
+        image = Block.objects.get(post=self.post).image
+        self.assertRegex(image.image.name, r"^posts/[0-9a-f]{32}\.jpg$")
+        self.assertEqual(default_storage.size(image.image.name), len(content))
+        self.assertEqual((image.image_width, image.image_height), (1400, 1400))
+
+
+@override_settings(UPLOAD_CHUNK_SIZE=1024)
+class TestResumableUploads(ResumableUploadMixin, TestCase):
+    def setUp(self):
+        use_file_system_storage(self)
+        self.post = Post.objects.create(
+            position=1,
+            cover_title="Post Title",
+            cover_description="Post Description",
+        )
+        self.first_block = Block.objects.create(
+            post=self.post,
+            block_type=Block.BlockType.SPACE,
+            space_number=16,
+            block_position=Block.objects.next_position(self.post.id),
+        )
+        User.objects.create_superuser(
+            email=SUPERUSER_EMAIL,
+            password=SUPERUSER_PASSWORD,
+        )
+        self.client.login(email=SUPERUSER_EMAIL, password=SUPERUSER_PASSWORD)
+        self.content = jpeg_bytes((1200, 900))
+
+    def test_status_reports_the_received_offset(self):
+        session = self.start_session(self.content)
+        self.put_chunk(session, self.content, 0)
+
+        response = self.client.get(session["url"])
+
+        self.assertEqual(response.json()["offset"], 1024)
+        self.assertEqual(response.json()["size"], len(self.content))
+
+    def test_chunk_at_another_offset_is_rejected_with_the_current_offset(self):
+        session = self.start_session(self.content)
+        self.put_chunk(session, self.content, 0)
+
+        # A retry of a chunk that was received, and a chunk sent too early
+        for offset in (0, 2048):
+            response = self.put_chunk(session, self.content, offset)
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.json()["offset"], 1024)
+        self.assertEqual(len(UploadSession.objects.get().parts), 1)
+
+    def test_chunk_of_wrong_length_is_rejected(self):
+        session = self.start_session(self.content)
+
+        response = self.client.put(
+            session["url"],
+            self.content[:100],
+            content_type="application/octet-stream",
+            headers={"Upload-Offset": "0"},
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(UploadSession.objects.get().offset, 0)
+
+    def test_commit_of_unfinished_upload_is_rejected(self):
+        session = self.start_session(self.content)
+        self.put_chunk(session, self.content, 0)
+
+        response = self.client.post(session["commit_url"])
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Block.objects.filter(block_type=Block.BlockType.IMAGE))
+
+    def test_commit_creates_the_image_block(self):
+        session = self.start_session(self.content, block_number="1")
+        self.upload_chunks(session, self.content)
+
+        response = self.client.post(session["commit_url"])
+
+        self.assertRedirects(
+            response,
+            reverse("webapp:post_detail", args=[self.post.id]),
+            fetch_redirect_response=False,
+        )
+        blocks = list(Block.objects.filter(post=self.post))
+        self.assertEqual(blocks[0].block_type, Block.BlockType.IMAGE)
+        self.assertEqual(blocks[1], self.first_block)
+
+        image = blocks[0].image
+        self.assertRegex(image.image.name, r"^posts/[0-9a-f]{32}\.jpg$")
+        self.assertEqual((image.image_width, image.image_height), (1200, 900))
+        self.assertEqual(image.image_size, 100)
+        self.assertFalse(UploadSession.objects.exists())
+
+        # The joined upload is queued for deletion, and its parts are deleted
+        upload_name = PendingMediaDeletion.objects.get().name
+        self.assertTrue(upload_name.startswith("uploads/"))
+        self.assertFalse(default_storage.exists(f"{upload_name}.part00001"))
+
+    def test_commit_of_upload_that_is_not_an_image_is_rejected(self):
+        content = b"not an image" * 100
+        session = self.start_session(content)
+        self.upload_chunks(session, content)
+
+        response = self.client.post(session["commit_url"])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Block.objects.filter(block_type=Block.BlockType.IMAGE))
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_delete_cancels_the_upload(self):
+        session = self.start_session(self.content)
+        self.put_chunk(session, self.content, 0)
+        part_name = UploadSession.objects.get().parts[0]["name"]
+
+        response = self.client.delete(session["url"])
+
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(default_storage.exists(part_name))
+
+    def test_upload_larger_than_the_limit_is_rejected(self):
+        with self.settings(RESUMABLE_UPLOAD_MAX_SIZE=1000):
+            response = self.client.post(
+                reverse("webapp:upload_session_create", args=[self.post.id]),
+                {
+                    "filename": "photo.jpg",
+                    "size": len(self.content),
+                    "content_type": "image/jpeg",
+                    "image_size": "100",
+                    "image_alignment": "text-center",
+                },
+            )
+
+        self.assertEqual(response.status_code, 400)
+
+
+class TestDirectUploadsWithoutS3(TestCase):
+    def test_presign_requires_s3_storage(self):
+        use_file_system_storage(self)
+        User.objects.create_superuser(
+            email=SUPERUSER_EMAIL,
+            password=SUPERUSER_PASSWORD,
+        )
+        self.client.login(email=SUPERUSER_EMAIL, password=SUPERUSER_PASSWORD)
+
+        response = self.client.post(
+            reverse("webapp:direct_upload"),
+            {"filename": "Photo.jpg", "content_type": "image/jpeg"},
+        )
+
+        self.assertEqual(response.status_code, 400)
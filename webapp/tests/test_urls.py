@@ -1,3 +1,5 @@
+import uuid
+
 from django.test import TestCase
 from django.urls import reverse
 
@@ -36,6 +38,10 @@ class TestUrls(TestCase):
             "webapp:index",
             methods_expected={"get": 200, "post": 405, "put": 405, "delete": 405},
         )
+        self.check_response(
+            "webapp:post_list_page",
+            methods_expected={"get": 200, "post": 405, "put": 405, "delete": 405},
+        )
         self.check_response(
             "webapp:about_me",
             methods_expected={"get": 200, "post": 405, "put": 405, "delete": 405},
@@ -53,6 +59,11 @@ class TestUrls(TestCase):
             args=[self.post.id],
             methods_expected={"get": 200, "post": 405, "put": 405, "delete": 405},
         )
+        self.check_response(
+            "webapp:comment_list",
+            args=[self.post.id],
+            methods_expected={"get": 200, "post": 405, "put": 405, "delete": 405},
+        )
 
     def test_protected_urls_anonymous(self):
         protected_routes = [
@@ -60,9 +71,14 @@ class TestUrls(TestCase):
             ("webapp:post_update", [self.post.id]),
             ("webapp:post_delete", [self.post.id]),
             ("webapp:post_change_position", None),
+            ("webapp:post_reorder", None),
+            ("webapp:direct_upload", None),
             ("webapp:block_create", [self.post.id]),
             ("webapp:block_delete", [self.post.id]),
             ("webapp:block_change_position", [self.post.id]),
+            ("webapp:upload_session_create", [self.post.id]),
+            ("webapp:upload_session", [uuid.uuid4()]),
+            ("webapp:upload_session_commit", [uuid.uuid4()]),
             ("webapp:tag_create", [self.post.id]),
             ("webapp:tag_delete", [self.post.id]),
             ("webapp:comment_create", [self.post.id]),
@@ -83,6 +99,10 @@ class TestUrls(TestCase):
             "webapp:index",
             methods_expected={"get": 200, "post": 405, "put": 405, "delete": 405},
         )
+        self.check_response(
+            "webapp:post_list_page",
+            methods_expected={"get": 200, "post": 405, "put": 405, "delete": 405},
+        )
         self.check_response(
             "webapp:about_me",
             methods_expected={"get": 200, "post": 405, "put": 405, "delete": 405},
@@ -100,6 +120,11 @@ class TestUrls(TestCase):
             args=[self.post.id],
             methods_expected={"get": 200, "post": 405, "put": 405, "delete": 405},
         )
+        self.check_response(
+            "webapp:comment_list",
+            args=[self.post.id],
+            methods_expected={"get": 200, "post": 405, "put": 405, "delete": 405},
+        )
 
     def test_protected_urls_user_logged_in(self):
 
@@ -128,6 +153,10 @@ class TestUrls(TestCase):
             "webapp:post_change_position",
             methods_expected={"get": 403, "post": 403, "put": 403, "delete": 403},
         )
+        self.check_response(
+            "webapp:direct_upload",
+            methods_expected={"get": 403, "post": 403, "put": 403, "delete": 403},
+        )
         self.check_response(
             "webapp:block_create",
             args=[self.post.id],
@@ -1,11 +1,32 @@
-from django.contrib.contenttypes.models import ContentType
-from django.db.models import Max
-from django.test import TestCase
-from django.urls import reverse
-
+import hashlib
+import io
+import json
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.http import HttpResponse
+from django.urls import path, reverse
+from django.views import View
+from PIL import Image as PILImage
+
+from mykytaso_app.urls import urlpatterns as project_urlpatterns
 from users.models import User
 from webapp.forms import MessageForm
-from webapp.models import Post, Message, Block, Text, Space, Comment
+from webapp.helpers.cache import bump_posts_version, get_posts_version
+from webapp.models import Post, Message, Block, Comment, Tag, Image
+from webapp.tests.helpers import use_file_system_storage
+from webapp.views import (
+    AsyncConditionalGetMixin,
+    AsyncPostDetailView,
+    AsyncPostListView,
+)
 
 USER_EMAIL = "test_user@test.com"
 USER_PASSWORD = "test_dffhsf232iife87"
@@ -19,9 +40,30 @@ SUPERUSER_PASSWORD = "test_sdff3987r3uifss"
 ANOTHER_SUPERUSER_EMAIL = "test_another_superuser@test.com"
 ANOTHER_SUPERUSER_PASSWORD = "test_3r4uifss"
 
+# Smallest valid GIF image (1x1 pixel)
+TEST_GIF = (
+    b"GIF87a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff,"
+    b"\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;"
+)
+
+
+class AsyncUnvalidatedView(AsyncConditionalGetMixin, View):
+    async def get(self, request):
+        return HttpResponse("Unvalidated")
+
+
+# The async read views are mounted next to the sync ones for `ROOT_URLCONF=__name__`
+urlpatterns = project_urlpatterns + [
+    path("async/", AsyncPostListView.as_view()),
+    path("async/posts/<int:pk>/", AsyncPostDetailView.as_view()),
+    path("async/unvalidated/", AsyncUnvalidatedView.as_view()),
+]
+
 
 class TestPostViewsAnonymous(TestCase):
     def setUp(self):
+        # Post versions are only bumped on commit, which never happens in a TestCase
+        cache.clear()
 
         self.post_1 = Post.objects.create(
             position=1,
@@ -54,6 +96,35 @@ class TestPostViewsAnonymous(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, "webapp/index.html")
 
+    def test_post_list_view_renders_cover_derivatives(self):
+        use_file_system_storage(self)
+        post = Post.objects.create(
+            cover_title="Post 3 Title",
+            cover_description="Post 3 Description",
+            cover_image=SimpleUploadedFile(
+                "cover.gif", TEST_GIF, content_type="image/gif"
+            ),
+        )
+        call_command("generate_image_variants", stdout=io.StringIO())
+        post.refresh_from_db()
+        variant = post.cover_image_variants[0]
+        # Saving the derivatives only bumps post versions on commit
+        cache.clear()
+
+        response = self.client.get(reverse("webapp:index"))
+
+        self.assertContains(
+            response,
+            f'<source type="image/webp" srcset="{default_storage.url(variant["name"])} 1w"'
+            ' sizes="18rem">',
+            html=True,
+        )
+        self.assertContains(response, 'width="1" height="1"')
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, "url(data:image/webp;base64,")
+        # Covers uploaded before derivatives existed are served as they are
+        self.assertContains(response, f'src="{default_storage.url("post_1_image.jpg")}"')
+
     def test_post_create_view_post_method_anonymous(self):
         posts_count_before = Post.objects.count()
         response = self.client.post(
@@ -93,6 +164,86 @@ class TestPostViewsAnonymous(TestCase):
         )
 
 
+@override_settings(POSTS_PER_PAGE=2)
+class TestPostListPaginationAnonymous(TestCase):
+    def setUp(self):
+        # Post versions are only bumped on commit, which never happens in a TestCase
+        cache.clear()
+
+        self.posts = [
+            Post.objects.create(
+                position=position,
+                cover_title=f"Post {position} Title",
+                cover_description=f"Post {position} Description",
+            )
+            for position in range(1, 6)
+        ]
+
+        self.index_url = reverse("webapp:index")
+        self.post_list_page_url = reverse("webapp:post_list_page")
+
+    def test_post_list_view_renders_first_page_anonymous(self):
+        response = self.client.get(self.index_url)
+
+        self.assertEqual(
+            list(response.context["object_list"]), [self.posts[4], self.posts[3]]
+        )
+        self.assertEqual(response.context["next_cursor"], f"4_{self.posts[3].id}")
+        self.assertContains(
+            response, f"{self.post_list_page_url}?after=4_{self.posts[3].id}"
+        )
+
+    def test_post_list_page_view_follows_cursor_anonymous(self):
+        response = self.client.get(
+            self.post_list_page_url, {"after": f"4_{self.posts[3].id}"}
+        )
+
+        self.assertTemplateUsed(response, "includes/post_cards.html")
+        self.assertTemplateNotUsed(response, "base.html")
+        self.assertEqual(
+            [post.cover_title for post in response.context["object_list"]],
+            ["Post 3 Title", "Post 2 Title"],
+        )
+
+        response = self.client.get(
+            self.post_list_page_url, {"after": response.context["next_cursor"]}
+        )
+
+        self.assertEqual(list(response.context["object_list"]), [self.posts[0]])
+        self.assertIsNone(response.context["next_cursor"])
+        self.assertNotContains(response, "post-list-next")
+
+    def test_post_list_page_view_breaks_position_ties_by_id_anonymous(self):
+        Post.objects.filter(pk=self.posts[2].pk).update(position=4)
+
+        titles = []
+        cursor = None
+        while True:
+            response = self.client.get(
+                self.post_list_page_url, {"after": cursor} if cursor else {}
+            )
+            titles += [post.cover_title for post in response.context["object_list"]]
+            cursor = response.context["next_cursor"]
+            if cursor is None:
+                break
+
+        self.assertEqual(len(titles), 5)
+        self.assertEqual(len(set(titles)), 5)
+
+    def test_post_list_page_view_invalid_cursor_anonymous(self):
+        response = self.client.get(self.post_list_page_url, {"after": "invalid"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_post_list_page_query_count_does_not_depend_on_depth_anonymous(self):
+        # One query for the conditional GET validators and one for the page
+        with self.assertNumQueries(2):
+            self.client.get(self.post_list_page_url)
+        with self.assertNumQueries(2):
+            self.client.get(
+                self.post_list_page_url, {"after": f"2_{self.posts[1].id}"}
+            )
+
+
 class TestPostViewsUserLoggedIn(TestCase):
     def setUp(self):
 
@@ -313,6 +464,450 @@ class TestPostViewsSuperUserLoggedIn(TestCase):
         self.assertEqual(self.post_1.position, post_2_old_position)
         self.assertEqual(self.post_2.position, post_1_old_position)
 
+    def reorder(self, post_ids, order_version):
+        return self.client.post(
+            reverse("webapp:post_reorder"),
+            json.dumps({"post_ids": post_ids, "order_version": order_version}),
+            content_type="application/json",
+        )
+
+    def test_post_reorder_view_get_method_superuser_logged_in(self):
+        response = self.client.get(reverse("webapp:post_reorder"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["post_ids"], [self.post_2.id, self.post_1.id])
+
+    def test_post_reorder_view_post_method_superuser_logged_in(self):
+        post_3 = Post.objects.create(
+            position=3,
+            cover_title="Post 3 Title",
+            cover_description="Post 3 Description",
+        )
+        order_version = self.client.get(reverse("webapp:post_reorder")).json()[
+            "order_version"
+        ]
+        posts_version = get_posts_version()
+        new_order = [self.post_1.id, post_3.id, self.post_2.id]
+
+        with (
+            CaptureQueriesContext(connection) as queries,
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            response = self.reorder(new_order, order_version)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["post_ids"], new_order)
+        self.assertEqual(
+            list(Post.objects.values_list("id", flat=True)), new_order
+        )
+        # The new order is written by a single statement
+        post_updates = [
+            query
+            for query in queries.captured_queries
+            if query["sql"].startswith('UPDATE "webapp_post"')
+        ]
+        self.assertEqual(len(post_updates), 1)
+        self.assertNotEqual(get_posts_version(), posts_version)
+
+        # The old version is rejected once the order has changed
+        response = self.reorder(new_order, order_version)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["post_ids"], new_order)
+
+    def test_post_reorder_view_incomplete_order_superuser_logged_in(self):
+        order_version = self.client.get(reverse("webapp:post_reorder")).json()[
+            "order_version"
+        ]
+
+        response = self.reorder([self.post_1.id, self.post_1.id], order_version)
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(reverse("webapp:post_reorder"), {"post_ids": 1})
+        self.assertEqual(response.status_code, 400)
+
+
+class TestPostListPageCacheAnonymous(TestCase):
+    def setUp(self):
+        # Post versions are only bumped on commit, which never happens in a TestCase
+        cache.clear()
+
+        self.post_1 = Post.objects.create(
+            position=1,
+            cover_title="Post 1 Title",
+            cover_description="Post 1 Description",
+            cover_image="post_1_image.jpg",
+        )
+
+        self.index_url = reverse("webapp:index")
+
+    def test_post_list_view_page_is_cached_anonymous(self):
+        response = self.client.get(self.index_url)
+        self.assertEqual(response["X-Page-Cache"], "MISS")
+
+        # Only the conditional GET validators query the database
+        with self.assertNumQueries(1):
+            response = self.client.get(self.index_url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Page-Cache"], "HIT")
+        self.assertIn("Post 1 Title", response.content.decode())
+
+    def test_post_list_view_page_is_regenerated_after_post_change_anonymous(self):
+        self.client.get(self.index_url)
+
+        self.post_1.cover_title = "Post 1 New Title"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post_1.save()
+
+        response = self.client.get(self.index_url)
+
+        self.assertEqual(response["X-Page-Cache"], "MISS")
+        self.assertIn("Post 1 New Title", response.content.decode())
+
+    def test_post_list_view_stale_page_is_served_during_regeneration_anonymous(self):
+        response = self.client.get(self.index_url)
+
+        self.post_1.cover_title = "Post 1 New Title"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post_1.save()
+
+        # Another worker is already regenerating the page
+        lock_key = f"webapp:page:{hashlib.md5(self.index_url.encode()).hexdigest()}:lock"
+        cache.add(lock_key, True)
+        self.addCleanup(cache.delete, lock_key)
+
+        with self.assertNumQueries(1):
+            stale_response = self.client.get(self.index_url)
+
+        self.assertEqual(stale_response["X-Page-Cache"], "STALE")
+        self.assertEqual(stale_response.content, response.content)
+
+    def test_post_list_view_stale_page_is_not_revalidated_anonymous(self):
+        response = self.client.get(self.index_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(
+                cover_title="Post 2 Title",
+                cover_description="Post 2 Description",
+                cover_image="post_2_image.jpg",
+            )
+
+        lock_key = f"webapp:page:{hashlib.md5(self.index_url.encode()).hexdigest()}:lock"
+        cache.add(lock_key, True)
+        stale_response = self.client.get(self.index_url)
+
+        self.assertEqual(stale_response["X-Page-Cache"], "STALE")
+        self.assertNotIn("Post 2 Title", stale_response.content.decode())
+        # The stale page does not get the validators of the new post list
+        self.assertNotIn("ETag", stale_response)
+        self.assertNotIn("Last-Modified", stale_response)
+
+        cache.delete(lock_key)
+        revalidated_response = self.client.get(
+            self.index_url, headers={"if-none-match": response["ETag"]}
+        )
+        self.assertEqual(revalidated_response.status_code, 200)
+        self.assertIn("Post 2 Title", revalidated_response.content.decode())
+
+    def test_post_list_view_waits_for_the_first_render_anonymous(self):
+        # Another worker is rendering the page and nothing is cached yet
+        lock_key = f"webapp:page:{hashlib.md5(self.index_url.encode()).hexdigest()}:lock"
+        cache.add(lock_key, True)
+        self.addCleanup(cache.delete, lock_key)
+
+        with (
+            mock.patch("webapp.helpers.cache.PAGE_RENDER_WAIT", 0.2),
+            self.assertNumQueries(1),
+        ):
+            response = self.client.get(self.index_url)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+
+    def test_post_list_view_ignores_unused_query_parameters_anonymous(self):
+        self.client.get(self.index_url)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.index_url, {"utm_source": "feed"})
+
+        self.assertEqual(response["X-Page-Cache"], "HIT")
+
+
+class TestPostDetailFragmentCacheAnonymous(TestCase):
+    def setUp(self):
+        # Post versions are only bumped on commit, which never happens in a TestCase
+        cache.clear()
+
+        self.post_1 = Post.objects.create(
+            position=1,
+            cover_title="Post 1 Title",
+            cover_description="Post 1 Description",
+            cover_image="post_1_image.jpg",
+        )
+
+        self.block_1 = Block.objects.create(
+            post=self.post_1,
+            block_type=Block.BlockType.TEXT,
+            block_position=1,
+            text="Cached Block Text",
+            text_type="normal",
+            text_alignment="center",
+        )
+
+        self.post_detail_url = reverse("webapp:post_detail", args=[self.post_1.id])
+
+    def test_post_detail_view_fragments_are_cached_anonymous(self):
+        self.client.get(self.post_detail_url)
+
+        # Only the conditional GET check and the post itself are fetched
+        # once every fragment is cached
+        with self.assertNumQueries(2):
+            response = self.client.get(self.post_detail_url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Cached Block Text", response.content.decode())
+
+    def test_post_detail_view_fragments_are_invalidated_anonymous(self):
+        self.client.get(self.post_detail_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(tag_name="Fresh Tag", post=self.post_1)
+            self.block_1.delete()
+
+        response = self.client.get(self.post_detail_url)
+
+        self.assertIn("Fresh Tag", response.content.decode())
+        self.assertNotIn("Cached Block Text", response.content.decode())
+
+
+class TestConditionalGetAnonymous(TestCase):
+    def setUp(self):
+        # Post versions are only bumped on commit, which never happens in a TestCase
+        cache.clear()
+
+        self.post_1 = Post.objects.create(
+            position=1,
+            cover_title="Post 1 Title",
+            cover_description="Post 1 Description",
+            cover_image="post_1_image.jpg",
+        )
+
+        self.index_url = reverse("webapp:index")
+        self.post_detail_url = reverse("webapp:post_detail", args=[self.post_1.id])
+
+    def test_post_list_view_not_modified_anonymous(self):
+        response = self.client.get(self.index_url)
+
+        with self.assertNumQueries(1):
+            not_modified_response = self.client.get(
+                self.index_url, headers={"if-none-match": response["ETag"]}
+            )
+        self.assertEqual(not_modified_response.status_code, 304)
+
+        not_modified_response = self.client.get(
+            self.index_url, headers={"if-modified-since": response["Last-Modified"]}
+        )
+        self.assertEqual(not_modified_response.status_code, 304)
+
+    def test_post_list_view_modified_after_post_delete_anonymous(self):
+        response = self.client.get(self.index_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post_1.delete()
+
+        modified_response = self.client.get(
+            self.index_url, headers={"if-none-match": response["ETag"]}
+        )
+        self.assertEqual(modified_response.status_code, 200)
+
+    @override_settings(AWS_QUERYSTRING_AUTH=True)
+    def test_post_list_view_modified_after_signing_period_anonymous(self):
+        with mock.patch("webapp.views.time.time", return_value=0):
+            response = self.client.get(self.index_url)
+
+        # Signed media URLs in the page may expire after this period
+        period = settings.SIGNED_URL_REFRESH_MARGIN - 2 * (
+            settings.ANONYMOUS_PAGE_CACHE_TIMEOUT
+        )
+        with mock.patch("webapp.views.time.time", return_value=period):
+            modified_response = self.client.get(
+                self.index_url, headers={"if-none-match": response["ETag"]}
+            )
+        self.assertEqual(modified_response.status_code, 200)
+
+    @override_settings(AWS_QUERYSTRING_AUTH=True, SIGNED_URL_REFRESH_MARGIN=0)
+    def test_post_detail_view_without_signing_period_anonymous(self):
+        response = self.client.get(self.post_detail_url)
+
+        self.assertNotIn("ETag", response)
+        self.assertNotIn("Last-Modified", response)
+
+    def test_post_detail_view_not_modified_anonymous(self):
+        response = self.client.get(self.post_detail_url)
+
+        with self.assertNumQueries(1):
+            not_modified_response = self.client.get(
+                self.post_detail_url, headers={"if-none-match": response["ETag"]}
+            )
+        self.assertEqual(not_modified_response.status_code, 304)
+
+    def test_post_detail_view_modified_after_tag_create_anonymous(self):
+        response = self.client.get(self.post_detail_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(tag_name="Fresh Tag", post=self.post_1)
+
+        modified_response = self.client.get(
+            self.post_detail_url, headers={"if-none-match": response["ETag"]}
+        )
+        self.assertEqual(modified_response.status_code, 200)
+        self.assertIn("Fresh Tag", modified_response.content.decode())
+
+    def test_post_detail_view_missing_post_anonymous(self):
+        response = self.client.get(reverse("webapp:post_detail", args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class TestAsyncPostViewsAnonymous(TestCase):
+    def setUp(self):
+        # Post versions are only bumped on commit, which never happens in a TestCase
+        cache.clear()
+
+        self.post_1 = Post.objects.create(
+            position=1,
+            cover_title="Post 1 Title",
+            cover_description="Post 1 Description",
+            cover_image="post_1_image.jpg",
+        )
+
+        Block.objects.create(
+            post=self.post_1,
+            block_type=Block.BlockType.TEXT,
+            block_position=1,
+            text="Async Block Text",
+            text_type="normal",
+            text_alignment="center",
+        )
+        Tag.objects.create(tag_name="Async Tag", post=self.post_1)
+
+        self.index_url = "/async/"
+        self.post_detail_url = f"/async/posts/{self.post_1.id}/"
+
+    async def test_async_post_list_view_anonymous(self):
+        response = await self.async_client.get(self.index_url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Page-Cache"], "MISS")
+        self.assertIn("Post 1 Title", response.content.decode())
+
+        response = await self.async_client.get(self.index_url)
+        self.assertEqual(response["X-Page-Cache"], "HIT")
+
+        response = await self.async_client.get(
+            self.index_url, headers={"if-none-match": response["ETag"]}
+        )
+        self.assertEqual(response.status_code, 304)
+
+    async def test_async_post_list_view_stale_page_is_not_revalidated_anonymous(self):
+        await self.async_client.get(self.index_url)
+
+        await Post.objects.acreate(
+            cover_title="Post 2 Title",
+            cover_description="Post 2 Description",
+            cover_image="post_2_image.jpg",
+        )
+        # Post versions are only bumped on commit, which never happens in a TestCase
+        bump_posts_version()
+        lock_key = f"webapp:page:{hashlib.md5(self.index_url.encode()).hexdigest()}:lock"
+        await cache.aadd(lock_key, True)
+        self.addCleanup(cache.delete, lock_key)
+
+        response = await self.async_client.get(self.index_url)
+
+        self.assertEqual(response["X-Page-Cache"], "STALE")
+        self.assertNotIn("ETag", response)
+        self.assertNotIn("Last-Modified", response)
+
+    async def test_async_post_detail_view_anonymous(self):
+        response = await self.async_client.get(self.post_detail_url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Async Block Text", response.content.decode())
+        self.assertIn("Async Tag", response.content.decode())
+
+        # A bulk update sends no signals, so the cached fragment is still served
+        await Block.objects.filter(post=self.post_1).aupdate(text="Updated Text")
+
+        response = await self.async_client.get(self.post_detail_url)
+        self.assertIn("Async Block Text", response.content.decode())
+
+        response = await self.async_client.get(
+            self.post_detail_url, headers={"if-none-match": response["ETag"]}
+        )
+        self.assertEqual(response.status_code, 304)
+
+    async def test_async_post_detail_view_last_modified_anonymous(self):
+        response = await self.async_client.get(self.post_detail_url)
+
+        response = await self.async_client.get(
+            self.post_detail_url,
+            headers={"if-modified-since": response["Last-Modified"]},
+        )
+        self.assertEqual(response.status_code, 304)
+
+    async def test_async_view_without_validators_anonymous(self):
+        response = await self.async_client.get("/async/unvalidated/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response)
+        self.assertNotIn("Last-Modified", response)
+
+    async def test_async_post_detail_view_not_found_anonymous(self):
+        response = await self.async_client.get("/async/posts/999/")
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class TestAsyncPostViewsUserLoggedIn(TestCase):
+    def setUp(self):
+
+        self.post_1 = Post.objects.create(
+            position=1,
+            cover_title="Post 1 Title",
+            cover_description="Post 1 Description",
+            cover_image="post_1_image.jpg",
+        )
+
+        self.user = User.objects.create_user(
+            email=USER_EMAIL,
+            password=USER_PASSWORD,
+        )
+
+        Comment.objects.create(
+            post=self.post_1, author=self.user, content="Async Comment"
+        )
+
+    async def test_async_post_list_view_user_logged_in(self):
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get("/async/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Page-Cache", response)
+        self.assertIn("Post 1 Title", response.content.decode())
+
+    async def test_async_post_detail_view_user_logged_in(self):
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get(f"/async/posts/{self.post_1.id}/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            reverse("webapp:comment_list", args=[self.post_1.id]),
+            response.content.decode(),
+        )
+
 
 class TestBlockViewsAnonymous(TestCase):
     def setUp(self):
@@ -388,44 +983,20 @@ class TestBlockViewsSuperUserLoggedIn(TestCase):
             cover_image="post_1_image.jpg",
         )
 
-        text = Text.objects.create(
+        self.block_1 = Block.objects.create(
+            post=self.post_1,
+            block_type=Block.BlockType.TEXT,
+            block_position=1,
             text="Test Block Text",
             text_type="normal",
             text_alignment="center",
         )
 
-        space = Space.objects.create(
-            space_number=10,
-        )
-
-        object_type_1 = ContentType.objects.get_for_model(text)
-        max_position = Block.objects.filter(post=self.post_1).aggregate(Max("block_position"))
-        block_position = (
-            max_position["block_position__max"] + 1
-            if max_position["block_position__max"]
-            else 1
-        )
-
-        self.block_1 = Block.objects.create(
-            post=self.post_1,
-            object_type=object_type_1,
-            object_id=text.id,
-            block_position=block_position,
-        )
-
-        object_type_2 = ContentType.objects.get_for_model(space)
-        max_position = Block.objects.filter(post=self.post_1).aggregate(Max("block_position"))
-        block_position = (
-            max_position["block_position__max"] + 1
-            if max_position["block_position__max"]
-            else 1
-        )
-
         self.block_2 = Block.objects.create(
             post=self.post_1,
-            object_type=object_type_2,
-            object_id=space.id,
-            block_position=block_position,
+            block_type=Block.BlockType.SPACE,
+            block_position=2,
+            space_number=10,
         )
 
         self.superuser = User.objects.create_superuser(
@@ -454,6 +1025,93 @@ class TestBlockViewsSuperUserLoggedIn(TestCase):
         self.assertEqual(blocks_count_after, blocks_count_before + 1)
 
 
+    def test_block_create_view_image_super_user_logged_in(self):
+        use_file_system_storage(self)
+
+        response = self.client.post(
+            reverse("webapp:block_create", args=[self.post_1.id]),
+            data={
+                "image": SimpleUploadedFile(
+                    "block.gif", TEST_GIF, content_type="image/gif"
+                ),
+                "image_size": 75,
+                "image_alignment": "text-center",
+            },
+        )
+
+        self.assertEqual(response.status_code, 302)
+        block = Block.objects.get(post=self.post_1, block_type=Block.BlockType.IMAGE)
+        self.assertEqual(block.image.image_size, 75)
+        self.assertGreater(block.block_position, self.block_2.block_position)
+
+        response = self.client.post(
+            reverse("webapp:block_delete", args=[self.post_1.id]),
+            data={"block_id": block.id},
+        )
+
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Image.objects.filter(id=block.image.id).exists())
+        self.assertFalse(Block.objects.filter(id=block.id).exists())
+
+    def test_block_create_view_gallery_super_user_logged_in(self):
+        use_file_system_storage(self)
+
+        colors = ["red", "green", "blue"]
+        gallery_images = []
+        for color in colors:
+            buffer = io.BytesIO()
+            PILImage.new("RGB", (8, 8), color).save(buffer, "PNG")
+            gallery_images.append(
+                SimpleUploadedFile(
+                    f"{color}.png", buffer.getvalue(), content_type="image/png"
+                )
+            )
+
+        response = self.client.post(
+            reverse("webapp:block_create", args=[self.post_1.id]),
+            data={"gallery_images": gallery_images},
+        )
+
+        self.assertEqual(response.status_code, 302)
+        block = Block.objects.get(post=self.post_1, block_type=Block.BlockType.GALLERY)
+        images = list(block.gallery_images.all())
+        self.assertEqual(len(images), len(colors))
+        self.assertEqual(len({image.image.name for image in images}), len(colors))
+        self.assertEqual(
+            [image.image_color for image in images], ["#ff0000", "#008000", "#0000ff"]
+        )
+        self.assertTrue(all(image.post_id == self.post_1.id for image in images))
+
+        response = self.client.get(
+            reverse("webapp:post_detail", args=[self.post_1.id])
+        )
+        for image in images:
+            self.assertContains(response, default_storage.url(image.image.name))
+
+        response = self.client.post(
+            reverse("webapp:block_delete", args=[self.post_1.id]),
+            data={"block_id": block.id},
+        )
+
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Image.objects.filter(gallery=block.id).exists())
+
+    def test_block_create_view_gallery_rejects_files_that_are_not_images(self):
+        response = self.client.post(
+            reverse("webapp:block_create", args=[self.post_1.id]),
+            data={
+                "gallery_images": [
+                    SimpleUploadedFile("block.gif", TEST_GIF, content_type="image/gif"),
+                    SimpleUploadedFile("notes.txt", b"text", content_type="text/plain"),
+                ],
+            },
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(
+            Block.objects.filter(block_type=Block.BlockType.GALLERY).exists()
+        )
+
     def test_block_delete_view_post_method_super_user_logged_in(self):
         response = self.client.post(
             reverse("webapp:block_delete", args=[self.post_1.id]),
@@ -485,6 +1143,155 @@ class TestBlockViewsSuperUserLoggedIn(TestCase):
         self.assertEqual(self.block_1.block_position, block_2_old_position)
         self.assertEqual(self.block_2.block_position, block_1_old_position)
 
+    def block_ids(self):
+        return list(
+            Block.objects.filter(post=self.post_1).values_list("id", flat=True)
+        )
+
+    def test_block_create_view_inserts_at_block_number_super_user_logged_in(self):
+        response = self.client.post(
+            reverse("webapp:block_create", args=[self.post_1.id]),
+            data={
+                "text": "Inserted Text",
+                "text_type": "normal",
+                "text_alignment": "center",
+                "block_number": 2,
+            },
+        )
+
+        self.assertEqual(response.status_code, 302)
+        inserted_block = Block.objects.get(text="Inserted Text")
+        self.assertEqual(
+            self.block_ids(), [self.block_1.id, inserted_block.id, self.block_2.id]
+        )
+
+    def test_block_move_view_post_method_super_user_logged_in(self):
+        Block.objects.rebalance(self.post_1.id)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse("webapp:block_move", args=[self.post_1.id]),
+                data={"block_id": self.block_2.id, "block_number": 1},
+            )
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.block_ids(), [self.block_2.id, self.block_1.id])
+        # The blocks are spread out, so only the moved block is updated
+        block_updates = [
+            query
+            for query in queries.captured_queries
+            if query["sql"].startswith('UPDATE "webapp_block"')
+        ]
+        self.assertEqual(len(block_updates), 1)
+
+    def test_block_move_view_missing_block_number_super_user_logged_in(self):
+        response = self.client.post(
+            reverse("webapp:block_move", args=[self.post_1.id]),
+            data={"block_id": self.block_2.id},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_block_reorder_view_post_method_super_user_logged_in(self):
+        block_3 = Block.objects.create(
+            post=self.post_1,
+            block_type=Block.BlockType.SPACE,
+            block_position=3,
+            space_number=1,
+        )
+        new_order = [block_3.id, self.block_1.id, self.block_2.id]
+
+        response = self.client.post(
+            reverse("webapp:block_reorder", args=[self.post_1.id]),
+            json.dumps({"block_ids": new_order}),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.block_ids(), new_order)
+
+        response = self.client.post(
+            reverse("webapp:block_reorder", args=[self.post_1.id]),
+            json.dumps({"block_ids": [self.block_1.id]}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(COMMENTS_PER_PAGE=2)
+class TestCommentListViewUserLoggedIn(TestCase):
+    def setUp(self):
+
+        self.post_1 = Post.objects.create(
+            position=1,
+            cover_title="Post 1 Title",
+            cover_description="Post 1 Description",
+            cover_image="post_1_image.jpg",
+        )
+
+        self.user = User.objects.create_user(
+            email=USER_EMAIL,
+            password=USER_PASSWORD,
+        )
+
+        self.comments = [
+            Comment.objects.create(
+                post=self.post_1, author=self.user, content=f"Comment {number}"
+            )
+            for number in range(1, 6)
+        ]
+
+        self.comment_list_url = reverse("webapp:comment_list", args=[self.post_1.id])
+
+        self.client.login(email=USER_EMAIL, password=USER_PASSWORD)
+
+    def get_all_pages(self) -> list[str]:
+        contents = []
+        response = self.client.get(self.comment_list_url)
+        while True:
+            contents += [comment.content for comment in response.context["comments"]]
+            if response.context["next_cursor"] is None:
+                return contents
+            response = self.client.get(
+                self.comment_list_url, {"after": response.context["next_cursor"]}
+            )
+
+    def test_post_detail_view_does_not_load_comments_user_logged_in(self):
+        response = self.client.get(
+            reverse("webapp:post_detail", args=[self.post_1.id])
+        )
+
+        self.assertContains(response, self.comment_list_url)
+        self.assertNotContains(response, "Comment 1")
+
+    def test_comment_list_view_first_page_user_logged_in(self):
+        response = self.client.get(self.comment_list_url)
+
+        self.assertTemplateNotUsed(response, "base.html")
+        self.assertEqual(response.context["comments"], self.comments[:2])
+        self.assertContains(response, "Show more comments")
+        # The author can delete their own comments
+        self.assertContains(
+            response, reverse("webapp:comment_delete", args=[self.post_1.id])
+        )
+
+    def test_comment_list_view_follows_cursor_user_logged_in(self):
+        self.assertEqual(
+            self.get_all_pages(),
+            ["Comment 1", "Comment 2", "Comment 3", "Comment 4", "Comment 5"],
+        )
+
+    def test_comment_list_view_breaks_created_at_ties_by_id_user_logged_in(self):
+        Comment.objects.update(created_at=self.comments[0].created_at)
+
+        self.assertEqual(len(set(self.get_all_pages())), 5)
+
+    def test_comment_list_view_not_found_user_logged_in(self):
+        response = self.client.get(reverse("webapp:comment_list", args=[999]))
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.get(self.comment_list_url, {"after": "invalid"})
+        self.assertEqual(response.status_code, 404)
+
 
 class TestCommentViewsAnonymous(TestCase):
     def setUp(self):
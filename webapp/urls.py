@@ -1,29 +1,53 @@
+from django.conf import settings
 from django.urls import path
 
 from webapp.views import (
+    AsyncPostDetailView,
+    AsyncPostListPageView,
+    AsyncPostListView,
     PostListView,
+    PostListPageView,
     PostDetailView,
     PostCreateView,
     PostUpdateView,
     PostDeleteView,
     PostChangePositionView,
+    PostReorderView,
+    DirectUploadView,
     TagCreateView,
     TagDeleteView,
     BlockCreateView,
     BlockDeleteView,
     BlockChangePositionView,
+    BlockMoveView,
+    BlockReorderView,
+    UploadSessionCreateView,
+    UploadSessionView,
+    UploadSessionCommitView,
     AboutMeView,
     ResumeView,
     MessageCreateView,
+    CommentListView,
     CommentCreateView,
     CommentDeleteView,
 )
 
 app_name = "webapp"
 
+# Under ASGI the read path is served by async views
+if settings.ASYNC_READ_VIEWS:
+    post_list_view = AsyncPostListView.as_view()
+    post_list_page_view = AsyncPostListPageView.as_view()
+    post_detail_view = AsyncPostDetailView.as_view()
+else:
+    post_list_view = PostListView.as_view()
+    post_list_page_view = PostListPageView.as_view()
+    post_detail_view = PostDetailView.as_view()
+
 urlpatterns = [
-    path("", PostListView.as_view(), name="index"),
-    path("posts/<int:pk>/", PostDetailView.as_view(), name="post_detail"),
+    path("", post_list_view, name="index"),
+    path("posts/page/", post_list_page_view, name="post_list_page"),
+    path("posts/<int:pk>/", post_detail_view, name="post_detail"),
     path("posts/create/", PostCreateView.as_view(), name="post_create"),
     path("posts/<int:pk>/update/", PostUpdateView.as_view(), name="post_update"),
     path("posts/<int:pk>/delete/", PostDeleteView.as_view(), name="post_delete"),
@@ -32,6 +56,8 @@ urlpatterns = [
         PostChangePositionView.as_view(),
         name="post_change_position",
     ),
+    path("posts/reorder/", PostReorderView.as_view(), name="post_reorder"),
+    path("uploads/presign/", DirectUploadView.as_view(), name="direct_upload"),
     path(
         "posts/<int:pk>/content/create/",
         BlockCreateView.as_view(),
@@ -47,8 +73,38 @@ urlpatterns = [
         BlockChangePositionView.as_view(),
         name="block_change_position",
     ),
+    path(
+        "posts/<int:pk>/content/move/",
+        BlockMoveView.as_view(),
+        name="block_move",
+    ),
+    path(
+        "posts/<int:pk>/content/reorder/",
+        BlockReorderView.as_view(),
+        name="block_reorder",
+    ),
+    path(
+        "posts/<int:pk>/content/uploads/",
+        UploadSessionCreateView.as_view(),
+        name="upload_session_create",
+    ),
+    path(
+        "uploads/<uuid:session_id>/",
+        UploadSessionView.as_view(),
+        name="upload_session",
+    ),
+    path(
+        "uploads/<uuid:session_id>/commit/",
+        UploadSessionCommitView.as_view(),
+        name="upload_session_commit",
+    ),
     path("posts/<int:pk>/tag/create/", TagCreateView.as_view(), name="tag_create"),
     path("posts/<int:pk>/tag/delete/", TagDeleteView.as_view(), name="tag_delete"),
+    path(
+        "posts/<int:pk>/comments/",
+        CommentListView.as_view(),
+        name="comment_list",
+    ),
     path(
         "posts/<int:pk>/comment/create/",
         CommentCreateView.as_view(),
@@ -1,14 +1,79 @@
+import hashlib
+import json
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django import forms
 from django.contrib import messages
-from django.contrib.contenttypes.models import ContentType
-from django.db.models.aggregates import Max
-from django.http import HttpResponseForbidden, HttpResponseBadRequest
-from django.shortcuts import redirect, get_object_or_404
-from django.urls import reverse_lazy
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import (
+    Case,
+    Count,
+    Max,
+    Q,
+    Value,
+    When,
+    aprefetch_related_objects,
+    prefetch_related_objects,
+)
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    JsonResponse,
+)
+from django.shortcuts import redirect, get_object_or_404, render
+from django.urls import reverse, reverse_lazy
+from django.utils.cache import get_conditional_response
+from django.utils.decorators import method_decorator
+from django.utils.timezone import now
+from django.utils.http import http_date, quote_etag
 from django.utils.translation import gettext_lazy as _
 from django.views import generic, View
+from django.views.decorators.http import condition
+from storages.backends.s3 import S3Storage
 
 from webapp.forms import MessageForm
-from webapp.models import Message, Post, Text, Block, Image, Space, Tag, Comment
+from webapp.helpers.cache import (
+    POST_FRAGMENTS,
+    UNVALIDATED_PAGE_CACHE_STATUSES,
+    aget_post_version,
+    amissing_post_fragments,
+    aserve_cached_page,
+    bump_posts_version,
+    get_post_version,
+    missing_post_fragments,
+    serve_cached_page,
+)
+from webapp.helpers.images import store_images
+from webapp.helpers.storage import (
+    abort_multipart_upload,
+    aprefetch_media_urls,
+    claim_direct_upload,
+    complete_multipart_upload,
+    direct_upload_name,
+    presigned_upload,
+    start_multipart_upload,
+    upload_chunk_size,
+    upload_part,
+)
+from webapp.models import (
+    Message,
+    Post,
+    Block,
+    Image,
+    Tag,
+    Comment,
+    PendingMediaDeletion,
+    UploadSession,
+    touch_post,
+)
 
 
 class SuperuserRequiredMixin:
@@ -33,19 +98,387 @@ class LoginRequiredCustomMixin:
         return super().dispatch(request, *args, **kwargs)
 
 
-class PostListView(generic.ListView):
+def _signed_url_period() -> int | None:
+    """
+    Returns for how many seconds a served page may be revalidated, because its
+    signed media URLs stay valid at least that long: a URL is valid for
+    SIGNED_URL_REFRESH_MARGIN seconds after it is rendered, minus the time the
+    page may be served from cache. Returns None without per-URL signatures.
+    """
+    if not settings.AWS_QUERYSTRING_AUTH:
+        return None
+    return settings.SIGNED_URL_REFRESH_MARGIN - 2 * settings.ANONYMOUS_PAGE_CACHE_TIMEOUT
+
+
+def _conditional_etag(request, *parts) -> str | None:
+    """
+    Builds an ETag from the content version and the viewer,
+    because superusers and authors see extra controls on the same page.
+    With signed media URLs it also changes every signing period, so a reader
+    is never told to keep a page whose media URLs have expired.
+    """
+    period = _signed_url_period()
+    if period is not None:
+        if period <= 0:
+            return None
+        parts = [*parts, int(time.time() // period)]
+
+    viewer = request.user.pk if request.user.is_authenticated else "anonymous"
+    return hashlib.md5(":".join(map(str, [*parts, viewer])).encode()).hexdigest()
+
+
+def _conditional_last_modified(updated_at: datetime | None) -> datetime | None:
+    """
+    Returns the Last-Modified time of content changed at `updated_at`, moved
+    to the start of the current signing period, see `_conditional_etag`.
+    """
+    period = _signed_url_period()
+    if updated_at is None or period is None:
+        return updated_at
+    if period <= 0:
+        return None
+    period_start = datetime.fromtimestamp(time.time() // period * period, timezone.utc)
+    return max(updated_at, period_start)
+
+
+def _post_list_state(request) -> tuple[datetime | None, int]:
+    # The latest change and the number of posts, which also catches deletions
+    if not hasattr(request, "post_list_state"):
+        state = Post.objects.aggregate(updated_at=Max("updated_at"), count=Count("id"))
+        request.post_list_state = state["updated_at"], state["count"]
+    return request.post_list_state
+
+
+def post_list_last_modified(request, *args, **kwargs):
+    updated_at, _count = _post_list_state(request)
+    return _conditional_last_modified(updated_at)
+
+
+def post_list_etag(request, *args, **kwargs):
+    updated_at, count = _post_list_state(request)
+    return _conditional_etag(
+        request, updated_at.timestamp() if updated_at else None, count
+    )
+
+
+def post_detail_last_modified(request, pk):
+    return _conditional_last_modified(_post_updated_at(request, pk))
+
+
+def _post_updated_at(request, pk) -> datetime | None:
+    # `updated_at` is also touched by block, tag and comment changes
+    if not hasattr(request, "post_updated_at"):
+        request.post_updated_at = (
+            Post.objects.filter(pk=pk).values_list("updated_at", flat=True).first()
+        )
+    return request.post_updated_at
+
+
+def post_detail_etag(request, pk):
+    updated_at = _post_updated_at(request, pk)
+    if updated_at is None:
+        return None
+    return _conditional_etag(request, updated_at.timestamp())
+
+
+async def _apost_list_state(request) -> tuple[datetime | None, int]:
+    if not hasattr(request, "post_list_state"):
+        state = await Post.objects.aaggregate(
+            updated_at=Max("updated_at"), count=Count("id")
+        )
+        request.post_list_state = state["updated_at"], state["count"]
+    return request.post_list_state
+
+
+async def apost_list_last_modified(request, *args, **kwargs):
+    updated_at, _count = await _apost_list_state(request)
+    return _conditional_last_modified(updated_at)
+
+
+async def apost_list_etag(request, *args, **kwargs):
+    updated_at, count = await _apost_list_state(request)
+    return _conditional_etag(
+        request, updated_at.timestamp() if updated_at else None, count
+    )
+
+
+async def _apost_updated_at(request, pk) -> datetime | None:
+    if not hasattr(request, "post_updated_at"):
+        request.post_updated_at = (
+            await Post.objects.filter(pk=pk)
+            .values_list("updated_at", flat=True)
+            .afirst()
+        )
+    return request.post_updated_at
+
+
+async def apost_detail_last_modified(request, pk):
+    return _conditional_last_modified(await _apost_updated_at(request, pk))
+
+
+async def apost_detail_etag(request, pk):
+    updated_at = await _apost_updated_at(request, pk)
+    if updated_at is None:
+        return None
+    return _conditional_etag(request, updated_at.timestamp())
+
+
+def _post_list_page(request):
+    """
+    Returns the posts after the `after` cursor, plus one to tell whether another
+    page follows. Keyset pagination on (position, id) keeps every page as cheap
+    as the first one, however many posts there are.
+    """
+    queryset = Post.objects.order_by("-position", "-id")
+
+    cursor = request.GET.get("after")
+    if cursor:
+        try:
+            position, post_id = map(int, cursor.split("_"))
+        except ValueError:
+            raise Http404(_("Invalid page."))
+        queryset = queryset.filter(
+            Q(position__lt=position) | Q(position=position, id__lt=post_id)
+        )
+
+    return queryset[: settings.POSTS_PER_PAGE + 1]
+
+
+def _post_list_context(request, posts: list[Post]) -> dict:
+    next_cursor = None
+    if len(posts) > settings.POSTS_PER_PAGE:
+        posts = posts[: settings.POSTS_PER_PAGE]
+        next_cursor = f"{posts[-1].position}_{posts[-1].id}"
+
+    return {
+        "object_list": posts,
+        "post_list": posts,
+        "cursor": request.GET.get("after"),
+        "next_cursor": next_cursor,
+    }
+
+
+def page_cache_condition(etag_func=None, last_modified_func=None):
+    """
+    `condition` for views served from the anonymous page cache. A stale page,
+    or a 503 while the page is rendered, gets no validators: a reader would
+    otherwise revalidate the stale page with those of the current content.
+    """
+
+    def decorator(view):
+        conditional_view = condition(
+            etag_func=etag_func, last_modified_func=last_modified_func
+        )(view)
+
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if response.get("X-Page-Cache") in UNVALIDATED_PAGE_CACHE_STATUSES:
+                response.headers.pop("ETag", None)
+                response.headers.pop("Last-Modified", None)
+            return response
+
+        return inner
+
+    return decorator
+
+
+class AnonymousPageCacheMixin:
+    """Mixin to serve cached full pages to anonymous readers."""
+
+    # Query parameters that change the page, other ones share its cache entry
+    page_cache_query_params = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD") or request.user.is_authenticated:
+            return super().dispatch(request, *args, **kwargs)
+
+        return serve_cached_page(
+            request,
+            lambda: super(AnonymousPageCacheMixin, self).dispatch(
+                request, *args, **kwargs
+            ),
+            settings.ANONYMOUS_PAGE_CACHE_TIMEOUT,
+            self.page_cache_query_params,
+        )
+
+
+@method_decorator(
+    page_cache_condition(
+        etag_func=post_list_etag, last_modified_func=post_list_last_modified
+    ),
+    name="dispatch",
+)
+class PostListView(AnonymousPageCacheMixin, generic.ListView):
     model = Post
     template_name = "webapp/index.html"
+    page_cache_query_params = ("after",)
+
+    def get_queryset(self):
+        return _post_list_page(self.request)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(_post_list_context(self.request, list(self.object_list)))
+        return context
+
+
+class PostListPageView(PostListView):
+    """Renders the next page of post cards, appended to the homepage by a script."""
+
+    template_name = "includes/post_cards.html"
+
+
+class AsyncConditionalGetMixin:
+    """
+    Async counterpart of the `condition` decorator, whose ETag and Last-Modified
+    functions cannot query the database from an async view. `etag_func` and
+    `last_modified_func` are coroutine functions taking the view arguments.
+    """
+
+    etag_func = None
+    last_modified_func = None
+
+    async def dispatch(self, request, *args, **kwargs):
+        # Loaded once here, so templates and ETags never query the user synchronously
+        request.user = await request.auser()
+
+        etag, last_modified = None, None
+        if self.etag_func:
+            etag = await self.etag_func(request, *args, **kwargs)
+        if self.last_modified_func:
+            last_modified = await self.last_modified_func(request, *args, **kwargs)
+        etag = quote_etag(etag) if etag is not None else None
+        last_modified = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = await super().dispatch(request, *args, **kwargs)
+
+        # A stale cached page must not get the validators of the current content
+        if response.get("X-Page-Cache") in UNVALIDATED_PAGE_CACHE_STATUSES:
+            return response
+        if request.method in ("GET", "HEAD"):
+            if last_modified and not response.has_header("Last-Modified"):
+                response.headers["Last-Modified"] = http_date(last_modified)
+            if etag:
+                response.headers.setdefault("ETag", etag)
+        return response
+
+
+class AsyncAnonymousPageCacheMixin:
+    """Async counterpart of `AnonymousPageCacheMixin`, sharing its cache."""
+
+    page_cache_query_params = ()
+
+    async def dispatch(self, request, *args, **kwargs):
+        user = await request.auser()
+        if request.method not in ("GET", "HEAD") or user.is_authenticated:
+            return await super().dispatch(request, *args, **kwargs)
+
+        return await aserve_cached_page(
+            request,
+            lambda: super(AsyncAnonymousPageCacheMixin, self).dispatch(
+                request, *args, **kwargs
+            ),
+            settings.ANONYMOUS_PAGE_CACHE_TIMEOUT,
+            self.page_cache_query_params,
+        )
+
+
+class AsyncPostListView(AsyncConditionalGetMixin, AsyncAnonymousPageCacheMixin, View):
+    """Async `PostListView`, enabled with ASYNC_READ_VIEWS under ASGI."""
+
+    template_name = "webapp/index.html"
+    page_cache_query_params = ("after",)
+    etag_func = staticmethod(apost_list_etag)
+    last_modified_func = staticmethod(apost_list_last_modified)
+
+    async def get(self, request):
+        posts = [post async for post in _post_list_page(request)]
+        context = _post_list_context(request, posts)
+        await aprefetch_media_urls(post.cover_image for post in context["object_list"])
+
+        context["view"] = self
+        return await sync_to_async(render)(request, self.template_name, context)
+
+
+class AsyncPostListPageView(AsyncPostListView):
+    """Async `PostListPageView`, enabled with ASYNC_READ_VIEWS under ASGI."""
+
+    template_name = "includes/post_cards.html"
+
+
+class DirectUploadView(SuperuserRequiredMixin, View):
+    """
+    Returns a presigned POST for uploading one image straight to the bucket,
+    so large images do not pass through the app server. The form is then
+    submitted with the returned `name` in a `<field>_key` field.
+    """
+
+    def post(self, request):
+        if not isinstance(default_storage, S3Storage):
+            return HttpResponseBadRequest("Direct uploads require S3 storage.")
+
+        content_type = request.POST.get("content_type", "")
+        if not content_type.startswith("image/"):
+            return HttpResponseBadRequest("Only images can be uploaded.")
+
+        return JsonResponse(
+            presigned_upload(
+                default_storage, request.POST.get("filename", ""), content_type
+            )
+        )
+
+
+class DirectUploadMixin:
+    """
+    Lets a form view accept the image of `direct_upload_field` as the name of
+    a finished direct upload, posted as `<field>_key`, instead of the file.
+    The upload is copied under `posts/` when the form is valid, and the
+    temporary upload is queued for deletion.
+    """
+
+    direct_upload_field = "cover_image"
+
+    def post(self, request, *args, **kwargs):
+        self.direct_upload_key = request.POST.get(f"{self.direct_upload_field}_key")
+        return super().post(request, *args, **kwargs)
 
+    def get_form(self, form_class=None):
+        form = super().get_form(form_class)
+        if getattr(self, "direct_upload_key", None):
+            # The upload is validated by `claim_direct_upload`, not by the form,
+            # which would download all of it
+            form.fields[self.direct_upload_field].required = False
+        return form
 
-class PostCreateView(SuperuserRequiredMixin, generic.CreateView):
+    def form_valid(self, form):
+        if self.direct_upload_key:
+            try:
+                direct_upload = claim_direct_upload(
+                    default_storage, self.direct_upload_key
+                )
+            except ValidationError as error:
+                return HttpResponseBadRequest(" ".join(error.messages))
+            setattr(form.instance, self.direct_upload_field, direct_upload)
+
+        response = super().form_valid(form)
+        if self.direct_upload_key:
+            PendingMediaDeletion.objects.create(name=self.direct_upload_key)
+        return response
+
+
+class PostCreateView(SuperuserRequiredMixin, DirectUploadMixin, generic.CreateView):
     model = Post
     fields = ["cover_image", "cover_title", "cover_description"]
     template_name = "webapp/post_create.html"
     success_url = reverse_lazy("webapp:index")
 
 
-class PostUpdateView(SuperuserRequiredMixin, generic.UpdateView):
+class PostUpdateView(SuperuserRequiredMixin, DirectUploadMixin, generic.UpdateView):
     model = Post
     fields = ["cover_image", "cover_title", "cover_description"]
     template_name = "webapp/post_update.html"
@@ -58,6 +491,7 @@ class PostDeleteView(SuperuserRequiredMixin, generic.DeleteView):
 
 
 class PostChangePositionView(SuperuserRequiredMixin, View):
+    @transaction.atomic
     def post(self, request):
         post_position = request.POST.get("post_position")
         position_direction = request.POST.get("position_direction")
@@ -67,11 +501,14 @@ class PostChangePositionView(SuperuserRequiredMixin, View):
                 "Both 'post_position' and 'position_direction' are required."
             )
 
-        post = get_object_or_404(Post, position=post_position)
+        post = get_object_or_404(
+            Post.objects.select_for_update(), position=post_position
+        )
 
         if position_direction == "left":
             next_post = (
-                Post.objects.filter(position__gt=post.position)
+                Post.objects.select_for_update()
+                .filter(position__gt=post.position)
                 .order_by("position")
                 .first()
             )
@@ -85,7 +522,8 @@ class PostChangePositionView(SuperuserRequiredMixin, View):
 
         if position_direction == "right":
             next_post = (
-                Post.objects.filter(position__lt=post.position)
+                Post.objects.select_for_update()
+                .filter(position__lt=post.position)
                 .order_by("-position")
                 .first()
             )
@@ -100,62 +538,423 @@ class PostChangePositionView(SuperuserRequiredMixin, View):
         return redirect("webapp:index")
 
 
+def _post_order_version(post_ids: list[int]) -> str:
+    return hashlib.md5(",".join(map(str, post_ids)).encode()).hexdigest()
+
+
+class PostReorderView(SuperuserRequiredMixin, View):
+    """
+    Returns the order of all posts with its version, and applies a complete
+    new order in a single UPDATE if nobody changed the order in the meantime.
+    """
+
+    def get(self, request):
+        post_ids = list(
+            Post.objects.order_by("-position", "-id").values_list("id", flat=True)
+        )
+        return JsonResponse(
+            {"post_ids": post_ids, "order_version": _post_order_version(post_ids)}
+        )
+
+    def post(self, request):
+        try:
+            data = json.loads(request.body)
+            post_ids = [int(post_id) for post_id in data["post_ids"]]
+            order_version = str(data["order_version"])
+        except (ValueError, KeyError, TypeError):
+            return HttpResponseBadRequest(
+                "Both 'post_ids' and 'order_version' are required."
+            )
+
+        with transaction.atomic():
+            # Locks every post, so concurrent reorders are applied one at a time
+            current_post_ids = list(
+                Post.objects.select_for_update()
+                .order_by("-position", "-id")
+                .values_list("id", flat=True)
+            )
+            current_order_version = _post_order_version(current_post_ids)
+
+            if order_version != current_order_version:
+                return JsonResponse(
+                    {
+                        "post_ids": current_post_ids,
+                        "order_version": current_order_version,
+                    },
+                    status=409,
+                )
+            if sorted(post_ids) != sorted(current_post_ids):
+                return HttpResponseBadRequest(
+                    "'post_ids' must contain every post exactly once."
+                )
+
+            # The first post gets the highest position, as posts are shown newest first
+            Post.objects.filter(pk__in=post_ids).update(
+                position=Case(
+                    *[
+                        When(pk=post_id, then=Value(len(post_ids) - index))
+                        for index, post_id in enumerate(post_ids)
+                    ]
+                ),
+                # The post list validators are based on the latest `updated_at`
+                updated_at=now(),
+            )
+
+        # `update()` sends no signals, so the post list is invalidated here, once
+        transaction.on_commit(bump_posts_version)
+
+        return JsonResponse(
+            {"post_ids": post_ids, "order_version": _post_order_version(post_ids)}
+        )
+
+
+@method_decorator(
+    condition(etag_func=post_detail_etag, last_modified_func=post_detail_last_modified),
+    name="dispatch",
+)
 class PostDetailView(generic.DetailView):
     model = Post
     template_name = "webapp/post_detail.html"
 
     def get_queryset(self):
-        return Post.objects.prefetch_related(
-            "comments__author", "blocks__content_object", "tags"
-        )
+        if not self.request.user.is_authenticated:
+            # Anonymous readers get cached fragments, see `get_context_data`
+            return Post.objects.all()
+
+        return Post.objects.prefetch_related("blocks", "blocks__gallery_images", "tags")
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+
+        if not self.request.user.is_authenticated:
+            post_version = get_post_version(self.object.pk)
+
+            # Prefetch only what is needed to render the fragments missing in cache
+            lookups = [
+                lookup
+                for fragment in missing_post_fragments(self.object.pk, post_version)
+                for lookup in POST_FRAGMENTS[fragment]
+            ]
+            if lookups:
+                prefetch_related_objects([self.object], *lookups)
+
+            context["post_version"] = post_version
+            context["fragment_cache_timeout"] = settings.POST_FRAGMENT_CACHE_TIMEOUT
+
+        return context
+
+
+class AsyncPostDetailView(AsyncConditionalGetMixin, View):
+    """Async `PostDetailView`, enabled with ASYNC_READ_VIEWS under ASGI."""
+
+    template_name = "webapp/post_detail.html"
+    etag_func = staticmethod(apost_detail_etag)
+    last_modified_func = staticmethod(apost_detail_last_modified)
+
+    async def get(self, request, pk):
+        lookups = [
+            lookup for fragment in POST_FRAGMENTS.values() for lookup in fragment
+        ]
+        try:
+            if request.user.is_authenticated:
+                post = await Post.objects.prefetch_related(*lookups).aget(pk=pk)
+            else:
+                post = await Post.objects.aget(pk=pk)
+        except Post.DoesNotExist:
+            raise Http404(_("No post found matching the query"))
+
+        context = {"post": post, "object": post, "view": self}
+
+        if not request.user.is_authenticated:
+            post_version = await aget_post_version(post.pk)
+
+            # Prefetch only what is needed to render the fragments missing in cache
+            lookups = [
+                lookup
+                for fragment in await amissing_post_fragments(post.pk, post_version)
+                for lookup in POST_FRAGMENTS[fragment]
+            ]
+            if lookups:
+                await aprefetch_related_objects([post], *lookups)
+
+            context["post_version"] = post_version
+            context["fragment_cache_timeout"] = settings.POST_FRAGMENT_CACHE_TIMEOUT
+
+        media = [post.cover_image]
+        if "blocks" in lookups:
+            for block in post.blocks.all():
+                if block.image:
+                    media.append(block.image.image)
+                media += [image.image for image in block.gallery_images.all()]
+        await aprefetch_media_urls(media)
+
+        return await sync_to_async(render)(request, self.template_name, context)
+
+
+def _create_block(post: Post, block_number: int | None, block_fields: dict) -> Block:
+    """
+    Appends a block to the post, or inserts it as `block_number`, counted from 1.
+    """
+    if block_number:
+        block_position = Block.objects.position_at(post.id, block_number - 1)
+    else:
+        block_position = Block.objects.next_position(post.id)
+
+    return Block.objects.create(
+        post=post, block_position=block_position, **block_fields
+    )
 
 
 class BlockCreateView(SuperuserRequiredMixin, View):
+    """
+    Appends a block to the post, or inserts it as the optional `block_number`,
+    counted from 1.
+    """
+
+    @transaction.atomic
     def post(self, request, pk):
         post = get_object_or_404(Post, id=pk)
 
+        block_number = request.POST.get("block_number")
+        if block_number and not block_number.isdigit():
+            return HttpResponseBadRequest("'block_number' must be a number.")
+
         text = request.POST.get("text")
         image = request.FILES.get("image")
+        image_key = request.POST.get("image_key")
+        gallery_images = request.FILES.getlist("gallery_images")
         space = request.POST.get("space_number")
+        gallery = []
+
+        if not image and image_key:
+            try:
+                image = claim_direct_upload(default_storage, image_key)
+            except ValidationError as error:
+                return HttpResponseBadRequest(" ".join(error.messages))
+            # Copied under `posts/` by `claim_direct_upload`
+            PendingMediaDeletion.objects.create(name=image_key)
 
         if text:
-            new_object = Text.objects.create(
-                text=text,
-                text_type=request.POST.get("text_type"),
-                text_alignment=request.POST.get("text_alignment"),
-            )
+            block_fields = {
+                "block_type": Block.BlockType.TEXT,
+                "text": text,
+                "text_type": request.POST.get("text_type"),
+                "text_alignment": request.POST.get("text_alignment"),
+            }
 
         elif image:
-            new_object = Image.objects.create(
-                image=image,
-                image_size=request.POST.get("image_size"),
-                image_alignment=request.POST.get("image_alignment"),
-                post=post,
-            )
+            block_fields = {
+                "block_type": Block.BlockType.IMAGE,
+                "image": Image.objects.create(
+                    image=image,
+                    image_size=request.POST.get("image_size"),
+                    image_alignment=request.POST.get("image_alignment"),
+                    post=post,
+                ),
+            }
+
+        elif gallery_images:
+            try:
+                gallery = [
+                    Image(
+                        image=forms.ImageField().clean(gallery_image),
+                        image_size=100,
+                        image_alignment="text-center",
+                        post=post,
+                    )
+                    for gallery_image in gallery_images
+                ]
+            except ValidationError as error:
+                return HttpResponseBadRequest(" ".join(error.messages))
+
+            # Files are stored concurrently before any row is written
+            store_images(gallery, "image", settings.GALLERY_UPLOAD_WORKERS)
+            block_fields = {"block_type": Block.BlockType.GALLERY}
 
         elif space:
-            new_object = Space.objects.create(space_number=int(space))
+            block_fields = {
+                "block_type": Block.BlockType.SPACE,
+                "space_number": int(space),
+            }
 
         else:
             return redirect("webapp:post_detail", pk=post.id)
 
-        # Create new block associated with the new object
-        object_type = ContentType.objects.get_for_model(new_object)
-        max_position = Block.objects.filter(post=post).aggregate(Max("block_position"))
-        block_position = (
-            max_position["block_position__max"] + 1
-            if max_position["block_position__max"]
-            else 1
+        block = _create_block(
+            post, int(block_number) if block_number else None, block_fields
         )
 
-        Block.objects.create(
+        if gallery:
+            for gallery_image in gallery:
+                gallery_image.gallery = block
+            Image.objects.bulk_create(gallery)
+            # `bulk_create` sends no `post_save`, so the cached post is invalidated here
+            touch_post(post.id)
+
+        return redirect("webapp:post_detail", pk=post.id)
+
+
+def _upload_session_status(session: UploadSession) -> dict:
+    return {
+        "id": session.id,
+        "offset": session.offset,
+        "size": session.size,
+        "chunk_size": session.chunk_size,
+        "url": reverse("webapp:upload_session", args=[session.id]),
+        "commit_url": reverse("webapp:upload_session_commit", args=[session.id]),
+    }
+
+
+class UploadSessionCreateView(SuperuserRequiredMixin, View):
+    """
+    Starts a resumable upload of a block image of `size` bytes. The image is
+    then sent in chunks to the session URL, see `UploadSessionView`, and the
+    block is created by a POST to the commit URL of the session.
+    """
+
+    def post(self, request, pk):
+        post = get_object_or_404(Post, id=pk)
+
+        size = request.POST.get("size", "")
+        max_size = settings.RESUMABLE_UPLOAD_MAX_SIZE
+        if not size.isdigit() or not 0 < int(size) <= max_size:
+            return HttpResponseBadRequest(
+                f"'size' must be between 1 and {max_size}."
+            )
+
+        image_size = request.POST.get("image_size", "")
+        if not image_size.isdigit():
+            return HttpResponseBadRequest("'image_size' must be a number.")
+
+        block_number = request.POST.get("block_number")
+        if block_number and not block_number.isdigit():
+            return HttpResponseBadRequest("'block_number' must be a number.")
+
+        content_type = request.POST.get("content_type", "")
+        if not content_type.startswith("image/"):
+            return HttpResponseBadRequest("Only images can be uploaded.")
+
+        session = UploadSession(
             post=post,
-            object_type=object_type,
-            object_id=new_object.id,
-            block_position=block_position,
+            size=int(size),
+            chunk_size=upload_chunk_size(default_storage),
+            image_size=int(image_size),
+            image_alignment=request.POST.get("image_alignment", ""),
+            block_number=int(block_number) if block_number else None,
+        )
+        session.name = direct_upload_name(
+            request.POST.get("filename", ""), session.id.hex
+        )
+        session.upload_id = start_multipart_upload(
+            default_storage, session.name, content_type
         )
+        session.save()
+
+        return JsonResponse(_upload_session_status(session), status=201)
+
+
+class UploadSessionView(SuperuserRequiredMixin, View):
+    """
+    GET reports how many bytes of the upload were received, so an interrupted
+    upload is resumed from there. PUT appends the chunk in the request body
+    at the `Upload-Offset` header, and DELETE cancels the upload.
+    Every chunk except the last one must be `chunk_size` bytes long.
+    """
+
+    def get(self, request, session_id):
+        session = get_object_or_404(UploadSession, id=session_id)
+        return JsonResponse(_upload_session_status(session))
+
+    def put(self, request, session_id):
+        session = get_object_or_404(UploadSession, id=session_id)
+
+        offset = request.headers.get("Upload-Offset", "")
+        if not offset.isdigit():
+            return HttpResponseBadRequest("'Upload-Offset' must be a number.")
+        # A retried chunk that was already received, or a chunk sent too early
+        if int(offset) != session.offset or session.offset == session.size:
+            return JsonResponse(_upload_session_status(session), status=409)
+
+        # Reads at most one chunk, so memory use does not grow with the file size
+        chunk_length = min(session.chunk_size, session.size - session.offset)
+        content = request.read(chunk_length + 1)
+        if len(content) != chunk_length:
+            return HttpResponseBadRequest(f"The chunk must be {chunk_length} bytes.")
+
+        # The chunk is uploaded outside of the transaction, so a slow upload
+        # does not hold the lock. Uploading a part again replaces it.
+        part = upload_part(
+            default_storage,
+            session.name,
+            session.upload_id,
+            session.offset // session.chunk_size + 1,
+            content,
+        )
+        with transaction.atomic():
+            session = get_object_or_404(
+                UploadSession.objects.select_for_update(), id=session_id
+            )
+            if session.offset == int(offset):
+                session.parts.append(part)
+                session.offset += len(content)
+                session.save(update_fields=["parts", "offset", "updated_at"])
 
-        return redirect("webapp:post_detail", pk=post.id)
+        return JsonResponse(_upload_session_status(session))
+
+    @transaction.atomic
+    def delete(self, request, session_id):
+        session = get_object_or_404(
+            UploadSession.objects.select_for_update(), id=session_id
+        )
+        abort_multipart_upload(
+            default_storage, session.name, session.upload_id, session.parts
+        )
+        session.delete()
+        return HttpResponse(status=204)
+
+
+class UploadSessionCommitView(SuperuserRequiredMixin, View):
+    """
+    Joins the chunks of a finished upload and creates its image block.
+    """
+
+    @transaction.atomic
+    def post(self, request, session_id):
+        session = get_object_or_404(
+            UploadSession.objects.select_for_update().select_related("post"),
+            id=session_id,
+        )
+        if session.offset != session.size:
+            return JsonResponse(_upload_session_status(session), status=409)
+
+        # The chunks are already joined if a previous commit was rolled back
+        if not default_storage.exists(session.name):
+            complete_multipart_upload(
+                default_storage, session.name, session.upload_id, session.parts
+            )
+        # Copied under `posts/` by `claim_direct_upload`
+        PendingMediaDeletion.objects.create(name=session.name)
+        session.delete()
+
+        try:
+            image = claim_direct_upload(
+                default_storage, session.name, settings.RESUMABLE_UPLOAD_MAX_SIZE
+            )
+        except ValidationError as error:
+            return HttpResponseBadRequest(" ".join(error.messages))
+
+        block_fields = {
+            "block_type": Block.BlockType.IMAGE,
+            "image": Image.objects.create(
+                image=image,
+                image_size=session.image_size,
+                image_alignment=session.image_alignment,
+                post=session.post,
+            ),
+        }
+        _create_block(session.post, session.block_number, block_fields)
+
+        return redirect("webapp:post_detail", pk=session.post.id)
 
 
 class BlockDeleteView(SuperuserRequiredMixin, View):
@@ -167,16 +966,17 @@ class BlockDeleteView(SuperuserRequiredMixin, View):
 
         block = get_object_or_404(Block, id=block_id)
 
-        # Delete the content object first
-        block.content_object.delete()
-
-        # Delete the Block association
-        block.delete()
+        # Deleting the image also deletes its block
+        if block.image:
+            block.image.delete()
+        else:
+            block.delete()
 
         return redirect("webapp:post_detail", pk=pk)
 
 
 class BlockChangePositionView(SuperuserRequiredMixin, View):
+    @transaction.atomic
     def post(self, request, pk):
         post = get_object_or_404(Post, id=pk)
         block_id = request.POST.get("block_id")
@@ -188,6 +988,8 @@ class BlockChangePositionView(SuperuserRequiredMixin, View):
             )
 
         block = get_object_or_404(Block, id=block_id)
+        # Locks the positions of the blocks of the post
+        Block.objects.allocate_position(post.id, 0)
 
         if block_direction == "up":
             next_block = (
@@ -220,6 +1022,62 @@ class BlockChangePositionView(SuperuserRequiredMixin, View):
         return redirect("webapp:post_detail", pk=pk)
 
 
+class BlockMoveView(SuperuserRequiredMixin, View):
+    """
+    Moves a block to any `block_number` in the post, counted from 1. Only the
+    moved block is updated, unless its new neighbours have no gap left between them.
+    """
+
+    @transaction.atomic
+    def post(self, request, pk):
+        block_id = request.POST.get("block_id")
+        block_number = request.POST.get("block_number")
+
+        if not block_id or not block_number or not block_number.isdigit():
+            return HttpResponseBadRequest(
+                "Both 'block_id' and 'block_number' are required."
+            )
+
+        block = get_object_or_404(Block, id=block_id, post_id=pk)
+        block.block_position = Block.objects.position_at(
+            pk, int(block_number) - 1, exclude_id=block.id
+        )
+        block.save(update_fields=["block_position"])
+
+        return redirect("webapp:post_detail", pk=pk)
+
+
+class BlockReorderView(SuperuserRequiredMixin, View):
+    """
+    Applies a complete new order of the blocks of a post in a single UPDATE.
+    """
+
+    def post(self, request, pk):
+        try:
+            data = json.loads(request.body)
+            block_ids = [int(block_id) for block_id in data["block_ids"]]
+        except (ValueError, KeyError, TypeError):
+            return HttpResponseBadRequest("'block_ids' is required.")
+
+        post = get_object_or_404(Post, id=pk)
+
+        with transaction.atomic():
+            # Locks the blocks, so concurrent reorders are applied one at a time
+            current_block_ids = list(
+                Block.objects.select_for_update(of=("self",))
+                .filter(post=post)
+                .values_list("id", flat=True)
+            )
+            if sorted(block_ids) != sorted(current_block_ids):
+                return HttpResponseBadRequest(
+                    "'block_ids' must contain every block of the post exactly once."
+                )
+
+            Block.objects.reorder(post.id, block_ids)
+
+        return JsonResponse({"block_ids": block_ids})
+
+
 class TagCreateView(SuperuserRequiredMixin, View):
     def post(self, request, pk):
         post = get_object_or_404(Post, id=pk)
@@ -237,7 +1095,71 @@ class TagDeleteView(SuperuserRequiredMixin, View):
         return redirect("webapp:post_detail", pk=pk)
 
 
+def _comment_page(request, pk):
+    """
+    Returns the comments of the post after the `after` cursor, plus one
+    to tell whether another page follows, using keyset pagination on
+    (created_at, id) like `_post_list_page`.
+    """
+    queryset = (
+        Comment.objects.filter(post_id=pk)
+        .select_related("author")
+        .order_by("created_at", "id")
+    )
+
+    cursor = request.GET.get("after")
+    if cursor:
+        try:
+            created_at, comment_id = cursor.rsplit("_", 1)
+            created_at, comment_id = datetime.fromisoformat(created_at), int(comment_id)
+        except ValueError:
+            raise Http404(_("Invalid page."))
+        queryset = queryset.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=comment_id)
+        )
+
+    return queryset[: settings.COMMENTS_PER_PAGE + 1]
+
+
+@method_decorator(
+    condition(etag_func=post_detail_etag, last_modified_func=post_detail_last_modified),
+    name="dispatch",
+)
+class CommentListView(generic.ListView):
+    """Renders a page of comments, loaded below the post by a script."""
+
+    template_name = "includes/post_comments.html"
+    context_object_name = "comments"
+
+    def get_queryset(self):
+        # Set by `post_detail_last_modified` during the conditional GET check
+        if self.request.post_updated_at is None:
+            raise Http404(_("No post found matching the query"))
+        return _comment_page(self.request, self.kwargs["pk"])
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+
+        comments = list(self.object_list)
+        next_cursor = None
+        if len(comments) > settings.COMMENTS_PER_PAGE:
+            comments = comments[: settings.COMMENTS_PER_PAGE]
+            next_cursor = f"{comments[-1].created_at.isoformat()}_{comments[-1].id}"
+
+        context.update(
+            {
+                "post_id": self.kwargs["pk"],
+                "comments": comments,
+                "object_list": comments,
+                "cursor": self.request.GET.get("after"),
+                "next_cursor": next_cursor,
+            }
+        )
+        return context
+
+
 class CommentCreateView(LoginRequiredCustomMixin, View):
+    @transaction.atomic
     def post(self, request, pk):
         post = get_object_or_404(Post, pk=pk)
         current_user = request.user
@@ -278,6 +1200,7 @@ class MessageCreateView(generic.CreateView):
     form_class = MessageForm
     success_url = reverse_lazy("webapp:send_message")
 
+    @transaction.atomic
     def form_valid(self, form):
         messages.success(self.request, "success")
         return super().form_valid(form)